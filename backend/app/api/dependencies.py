@@ -1,5 +1,5 @@
 from typing import Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.core.security import decode_token
 from app.models.user import User, UserRole
@@ -7,6 +7,7 @@ from app.core.config import settings
 
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 
 async def get_current_user(
@@ -101,7 +102,7 @@ async def get_current_teacher(
 
 
 async def get_optional_user(
-    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
 ) -> Optional[User]:
     """
     Dependency to get current user if authenticated, otherwise None
@@ -114,3 +115,40 @@ async def get_optional_user(
         return await get_current_user(credentials)
     except HTTPException:
         return None
+
+
+def client_address(request: Request) -> Optional[str]:
+    """
+    Address of the client that sent a request
+    
+    Behind a reverse proxy or load balancer listed in TRUSTED_PROXIES, the
+    address is taken from X-Forwarded-For: the last hop not added by a
+    trusted proxy (earlier hops can be forged by the client).
+    """
+    address = request.client.host if request.client else None
+    trusted = settings.trusted_proxies_list
+    if address not in trusted:
+        return address
+    forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(forwarded):
+        if hop not in trusted:
+            return hop
+    return forwarded[0] if forwarded else address
+
+
+async def get_client_key(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> str:
+    """
+    Dependency identifying the caller for per-user fairness (LLM gateway)
+    
+    The user ID when a valid token is sent (no database lookup), otherwise
+    the client address (see client_address). Users behind one NAT or proxy
+    only share a key when they aren't signed in.
+    """
+    if credentials:
+        payload = decode_token(credentials.credentials)
+        if payload and payload.get("sub"):
+            return f"user:{payload['sub']}"
+    return f"ip:{client_address(request) or 'unknown'}"
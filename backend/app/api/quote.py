@@ -1,32 +1,21 @@
 """
 API endpoint for generating motivational quotes using Gemini LLM
 """
-from fastapi import APIRouter, HTTPException
-from langchain_google_genai import ChatGoogleGenerativeAI
-from app.core.config import settings
+from fastapi import APIRouter, Depends
+from app.services.llm_registry import get_llm_registry
+from app.services.llm_gateway import get_llm_gateway, GatewayOverloaded
+from app.api.dependencies import get_client_key
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/quote", tags=["quote"])
 
+QUOTE_MODEL = "gemini-2.0-flash-exp"
+QUOTE_TEMPERATURE = 0.9  # Higher temperature for more creative/varied responses
 
-@router.get("/motivational")
-async def get_motivational_quote():
-    """
-    Generate a motivational quote for students/teachers using Gemini LLM.
-    Returns a different quote each time it's called.
-    """
-    try:
-        # Initialize Gemini LLM
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",
-            google_api_key=settings.GOOGLE_API_KEY,
-            temperature=0.9  # Higher temperature for more creative/varied responses
-        )
-        
-        # Prompt for generating motivational quotes
-        prompt = """Generate a short, inspiring motivational quote for students and teachers in education.
+# Prompt for generating motivational quotes
+QUOTE_PROMPT = """Generate a short, inspiring motivational quote for students and teachers in education.
 The quote should be:
 - Brief (1-2 sentences max)
 - Uplifting and positive
@@ -36,8 +25,20 @@ The quote should be:
 
 Just provide the quote itself, without any additional commentary or quotation marks."""
 
-        # Generate the quote
-        response = llm.invoke(prompt)
+
+@router.get("/motivational")
+async def get_motivational_quote(client_key: str = Depends(get_client_key)):
+    """
+    Generate a motivational quote for students/teachers using Gemini LLM.
+    Returns a different quote each time it's called.
+    """
+    try:
+        # Shared Gemini client
+        llm = get_llm_registry().get_llm(QUOTE_MODEL, QUOTE_TEMPERATURE)
+        
+        # Generate the quote (queued fairly per user under the shared LLM cap)
+        async with get_llm_gateway().slot(client_key, "quote"):
+            response = await llm.ainvoke(QUOTE_PROMPT)
         quote = response.content.strip()
         
         # Remove any quotation marks that might have been added
@@ -48,6 +49,8 @@ Just provide the quote itself, without any additional commentary or quotation ma
             "success": True
         }
         
+    except GatewayOverloaded:
+        raise
     except Exception as e:
         logger.error(f"Failed to generate motivational quote: {str(e)}")
         # Return a fallback quote if Gemini fails
@@ -9,14 +9,16 @@ from typing import List, Optional
 from datetime import datetime
 from beanie import PydanticObjectId
 from beanie.operators import In
-import shutil
 from pathlib import Path
 import os
 
-from app.models.material import Material, MaterialType
+from app.models.material import Material, MaterialType, VectorizationStatus
 from app.models.user import User
 from app.api.dependencies import get_current_user
-from app.services.rag_service import get_rag_service, RAGService
+from app.services.rag_service import get_rag_service, RAGService, material_metadata
+from app.services.ingestion_service import get_ingestion_service, IngestionService
+from app.services.content_store import get_content_store, ContentStore
+from app.services.uploads import UploadError
 
 
 router = APIRouter(prefix="/materials", tags=["Materials"])
@@ -32,7 +34,8 @@ async def upload_material(
     is_public: bool = Form(False),
     vectorize: bool = Form(True),  # Auto-vectorize for RAG
     current_user: User = Depends(get_current_user),
-    rag_service: RAGService = Depends(get_rag_service)
+    ingestion_service: IngestionService = Depends(get_ingestion_service),
+    content_store: ContentStore = Depends(get_content_store)
 ):
     """
     Upload a new study material (PDF)
@@ -52,23 +55,13 @@ async def upload_material(
             detail="Only PDF files are supported at this time"
         )
     
+    # Stream the upload to disk (deduplicated by content hash)
     try:
-        # Create uploads directory if it doesn't exist
-        uploads_dir = Path("./data/uploads")
-        uploads_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Generate unique filename
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        safe_filename = f"{timestamp}_{file.filename}"
-        file_path = uploads_dir / safe_filename
-        
-        # Save uploaded file
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Get file size
-        file_size = file_path.stat().st_size
-        
+        blob = await content_store.store(file)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    
+    try:        
         # Parse tags
         tags_list = [tag.strip() for tag in tags.split(",")] if tags else []
         
@@ -79,8 +72,10 @@ async def upload_material(
             course_id=course_id,
             teacher_id=str(current_user.id),
             type=MaterialType.PDF,
-            file_url=str(file_path),
-            file_size=file_size,
+            file_url=blob.file_path,
+            file_name=file.filename,
+            file_size=blob.file_size,
+            content_hash=blob.sha256,
             tags=tags_list,
             is_public=is_public,
             published_at=datetime.utcnow()
@@ -89,39 +84,37 @@ async def upload_material(
         # Save to database
         await material.insert()
         
-        # Vectorize for RAG if requested
-        vectorization_result = None
+        # Queue for RAG vectorization if requested (reuses existing vectors for known content)
+        job = None
         if vectorize:
             try:
-                vectorization_result = await rag_service.vectorize_material(
+                job = await ingestion_service.enqueue(
                     material_id=str(material.id),
-                    file_path=str(file_path),
-                    metadata={
-                        "title": title,
-                        "course_id": course_id,
-                        "uploaded_by": str(current_user.id),
-                        "filename": file.filename
-                    }
+                    file_path=blob.file_path,
+                    metadata=material_metadata(material),
+                    content_hash=blob.sha256
                 )
+                material = await Material.get(material.id)
             except Exception as e:
-                print(f"Warning: Vectorization failed: {str(e)}")
-                # Don't fail the upload if vectorization fails
+                print(f"Warning: Failed to queue vectorization: {str(e)}")
+                # Don't fail the upload if queueing fails
         
         return {
             "success": True,
             "material_id": str(material.id),
             "title": material.title,
-            "file_size": file_size,
-            "file_path": str(file_path),
-            "vectorized": vectorization_result is not None,
-            "vectorization_info": vectorization_result,
+            "file_size": blob.file_size,
+            "file_path": blob.file_path,
+            "content_hash": blob.sha256,
+            "vectorized": material.vectorization_status == VectorizationStatus.COMPLETED,
+            "vectorization_status": material.vectorization_status,
+            "vectorization_job_id": str(job.id) if job else material.vectorization_job_id,
             "message": "Material uploaded successfully"
         }
         
     except Exception as e:
-        # Clean up file if database insert fails
-        if file_path.exists():
-            file_path.unlink()
+        # Drop the file reference if the database insert fails
+        await content_store.release(blob.sha256)
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
@@ -174,7 +167,10 @@ async def get_materials(
                 "created_at": m.created_at.isoformat(),
                 "published_at": m.published_at.isoformat() if m.published_at else None,
                 "view_count": m.view_count,
-                "download_count": m.download_count
+                "download_count": m.download_count,
+                "vectorization_status": m.vectorization_status,
+                "vectorization_job_id": m.vectorization_job_id,
+                "num_chunks": m.num_chunks
             }
             for m in materials
         ],
@@ -217,7 +213,12 @@ async def get_material(
             "created_at": material.created_at.isoformat(),
             "published_at": material.published_at.isoformat() if material.published_at else None,
             "view_count": material.view_count,
-            "download_count": material.download_count
+            "download_count": material.download_count,
+            "vectorization_status": material.vectorization_status,
+            "vectorization_job_id": material.vectorization_job_id,
+            "vectorization_error": material.vectorization_error,
+            "num_chunks": material.num_chunks,
+            "vectorized_at": material.vectorized_at.isoformat() if material.vectorized_at else None
         }
         
     except Exception as e:
@@ -228,7 +229,8 @@ async def get_material(
 async def delete_material(
     material_id: str,
     current_user: User = Depends(get_current_user),
-    rag_service: RAGService = Depends(get_rag_service)
+    rag_service: RAGService = Depends(get_rag_service),
+    content_store: ContentStore = Depends(get_content_store)
 ):
     """
     Delete a material
@@ -247,20 +249,33 @@ async def delete_material(
                 detail="Only the teacher who uploaded this material can delete it"
             )
         
-        # Delete file from storage
-        if material.file_url:
-            file_path = Path(material.file_url)
-            if file_path.exists():
-                file_path.unlink()
+        # Delete from database
+        await material.delete()
+        rag_service.forget_material(material_id)
         
-        # Delete vector embeddings
         try:
-            await rag_service.delete_material_vectors(material_id)
+            await rag_service.course_indexes.remove_material(material_id, material.course_id)
         except Exception as e:
-            print(f"Warning: Failed to delete vectors: {str(e)}")
+            print(f"Warning: Failed to remove material from course index: {str(e)}")
         
-        # Delete from database
-        await material.delete()
+        if material.content_hash:
+            # Shared content: file and vectors go away with the last reference
+            try:
+                await content_store.release(material.content_hash)
+            except Exception as e:
+                print(f"Warning: Failed to release content: {str(e)}")
+        else:
+            # Delete file from storage
+            if material.file_url:
+                file_path = Path(material.file_url)
+                if file_path.exists():
+                    file_path.unlink()
+            
+            # Delete vector embeddings
+            try:
+                await rag_service.delete_material_vectors(material_id)
+            except Exception as e:
+                print(f"Warning: Failed to delete vectors: {str(e)}")
         
         return {
             "success": True,
@@ -273,6 +288,149 @@ async def delete_material(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.put("/{material_id}/file")
+async def replace_material_file(
+    material_id: str,
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    rag_service: RAGService = Depends(get_rag_service),
+    ingestion_service: IngestionService = Depends(get_ingestion_service),
+    content_store: ContentStore = Depends(get_content_store)
+):
+    """
+    Replace the PDF of a material (e.g. with a corrected version)
+    Vectors are updated incrementally: only changed chunks are re-embedded
+    """
+    material = await Material.get(PydanticObjectId(material_id))
+    
+    if not material:
+        raise HTTPException(status_code=404, detail="Material not found")
+    
+    # Check ownership
+    if current_user.role != "teacher" or str(material.teacher_id) != str(current_user.id):
+        raise HTTPException(
+            status_code=403,
+            detail="Only the teacher who uploaded this material can replace it"
+        )
+    
+    # Validate file type
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(
+            status_code=400,
+            detail="Only PDF files are supported at this time"
+        )
+    
+    old_hash = material.content_hash
+    old_file_url = material.file_url
+    old_store_id = await rag_service.resolve_store_id(material_id, refresh=True)
+    
+    try:
+        blob = await content_store.store(file)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    
+    if blob.sha256 == old_hash:
+        # Same content uploaded again: nothing changes
+        await content_store.release(blob.sha256)
+        return {
+            "success": True,
+            "material_id": material_id,
+            "content_hash": blob.sha256,
+            "vectorization_status": material.vectorization_status,
+            "message": "File unchanged"
+        }
+    
+    try:
+        vectorize = material.vectorization_status != VectorizationStatus.NOT_REQUESTED
+        if vectorize:
+            # Start the new content from the old chunks
+            await rag_service.seed_vector_store(old_store_id, blob.sha256)
+        
+        material.content_hash = blob.sha256
+        material.file_url = blob.file_path
+        material.file_name = file.filename
+        material.file_size = blob.file_size
+        material.updated_at = datetime.utcnow()
+        await material.save()
+        rag_service.forget_material(material_id)
+        
+        job = None
+        if vectorize:
+            job = await ingestion_service.enqueue(
+                material_id=material_id,
+                file_path=blob.file_path,
+                metadata=material_metadata(material),
+                content_hash=blob.sha256
+            )
+            material = await Material.get(material.id)
+    except Exception as e:
+        await content_store.release(blob.sha256)
+        raise HTTPException(status_code=500, detail=f"Replace failed: {str(e)}")
+    
+    # Drop the old content (freed if no other material shares it)
+    try:
+        if old_hash:
+            await content_store.release(old_hash)
+        else:
+            if old_file_url and Path(old_file_url).exists():
+                Path(old_file_url).unlink()
+            await rag_service.delete_material_vectors(old_store_id)
+    except Exception as e:
+        print(f"Warning: Failed to release old content: {str(e)}")
+    
+    return {
+        "success": True,
+        "material_id": material_id,
+        "content_hash": blob.sha256,
+        "file_size": blob.file_size,
+        "vectorization_status": material.vectorization_status,
+        "vectorization_job_id": str(job.id) if job else material.vectorization_job_id,
+        "message": "Material file replaced successfully"
+    }
+
+
+@router.post("/{material_id}/revectorize")
+async def revectorize_material(
+    material_id: str,
+    current_user: User = Depends(get_current_user),
+    ingestion_service: IngestionService = Depends(get_ingestion_service)
+):
+    """
+    Re-vectorize a material with the current chunking settings
+    Only chunks that changed are re-embedded
+    """
+    material = await Material.get(PydanticObjectId(material_id))
+    
+    if not material:
+        raise HTTPException(status_code=404, detail="Material not found")
+    
+    # Check ownership
+    if current_user.role != "teacher" or str(material.teacher_id) != str(current_user.id):
+        raise HTTPException(
+            status_code=403,
+            detail="Only the teacher who uploaded this material can re-vectorize it"
+        )
+    
+    if not material.file_url:
+        raise HTTPException(status_code=400, detail="Material has no file to vectorize")
+    
+    job = await ingestion_service.enqueue(
+        material_id=material_id,
+        file_path=material.file_url,
+        metadata=material_metadata(material),
+        content_hash=material.content_hash,
+        force=True
+    )
+    
+    return {
+        "success": True,
+        "material_id": material_id,
+        "vectorization_status": job.status.value,
+        "vectorization_job_id": str(job.id),
+        "message": "Material queued for re-vectorization"
+    }
+
+
 @router.put("/{material_id}/increment-download")
 async def increment_download(
     material_id: str,
@@ -3,15 +3,22 @@ RAG API Routes
 Endpoints for vectorizing study materials and querying them
 """
 
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
-from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, AsyncIterator, Tuple, Dict, Any
 from pydantic import BaseModel
-import shutil
 from pathlib import Path
+import asyncio
+import json
 import uuid
 
 from app.services.rag_service import get_rag_service, RAGService
-from app.api.dependencies import get_current_user
+from app.services.ingestion_service import get_ingestion_service, IngestionService
+from app.services.content_store import get_content_store, ContentStore
+from app.services.uploads import stream_pdf_upload, UploadError
+from app.services.llm_gateway import GatewayOverloaded
+from app.core.config import settings
+from app.api.dependencies import get_current_user, get_client_key
 from app.models.user import User
 
 
@@ -33,8 +40,16 @@ class QueryRequest(BaseModel):
     temperature: float = 0.3  # Creativity level: 0.0 (precise) to 1.0 (creative)
 
 
+class BatchQueryRequest(BaseModel):
+    material_id: str
+    queries: List[str]
+    num_results: int = 5
+    temperature: float = 0.3  # Creativity level: 0.0 (precise) to 1.0 (creative)
+
+
 class MultiQueryRequest(BaseModel):
-    material_ids: List[str]
+    material_ids: List[str] = []
+    course_id: Optional[str] = None  # Query the whole course when material_ids is empty
     query: str
     num_results: int = 3
     temperature: float = 0.3  # Creativity level: 0.0 (precise) to 1.0 (creative)
@@ -43,11 +58,23 @@ class MultiQueryRequest(BaseModel):
 class VectorizeResponse(BaseModel):
     success: bool
     material_id: str
-    num_chunks: int
-    total_characters: int
+    job_id: str
+    vectorization_status: str
     message: str
 
 
+class JobResponse(BaseModel):
+    job_id: str
+    material_id: str
+    status: str
+    attempts: int
+    error: Optional[str] = None
+    result: Optional[dict] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+
+
 class QueryResponse(BaseModel):
     success: bool
     answer: str
@@ -56,15 +83,57 @@ class QueryResponse(BaseModel):
     error: Optional[str] = None
 
 
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """One server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_sse(
+    http_request: Request,
+    events: AsyncIterator[Tuple[str, Dict[str, Any]]]
+) -> StreamingResponse:
+    """
+    Send (event, data) pairs from a RAG stream as server-sent events
+
+    A query that fails before streaming starts (e.g. material not
+    vectorized) is a plain 404 like the non-streaming endpoints. When the
+    client disconnects the stream is closed, which cancels the upstream
+    generation.
+    """
+    first = await events.__anext__()
+    if first[0] == "error":
+        await events.aclose()
+        raise HTTPException(status_code=404, detail=first[1].get("error"))
+
+    async def body():
+        try:
+            yield format_sse(*first)
+            async for event, data in events:
+                if await http_request.is_disconnected():
+                    break
+                yield format_sse(event, data)
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Don't let a proxy buffer tokens
+        }
+    )
+
+
 # Endpoints
 @router.post("/vectorize", response_model=VectorizeResponse)
 async def vectorize_material(
     request: VectorizeRequest,
     current_user: User = Depends(get_current_user),
-    rag_service: RAGService = Depends(get_rag_service)
+    ingestion_service: IngestionService = Depends(get_ingestion_service)
 ):
     """
-    Vectorize a study material for RAG
+    Queue a study material for vectorization
     Only teachers can vectorize materials
     """
     # Check if user is a teacher
@@ -82,19 +151,19 @@ async def vectorize_material(
             "uploaded_by": str(current_user.id)
         }
         
-        # Vectorize the material
-        result = await rag_service.vectorize_material(
+        # Queue the material for background vectorization
+        job = await ingestion_service.enqueue(
             material_id=request.material_id,
             file_path=request.file_path,
             metadata=metadata
         )
         
         return VectorizeResponse(
-            success=result["success"],
-            material_id=result["material_id"],
-            num_chunks=result["num_chunks"],
-            total_characters=result["total_characters"],
-            message=f"Successfully vectorized {request.material_id}"
+            success=True,
+            material_id=request.material_id,
+            job_id=str(job.id),
+            vectorization_status=job.status.value,
+            message=f"Queued {request.material_id} for vectorization"
         )
         
     except Exception as e:
@@ -108,10 +177,10 @@ async def upload_and_vectorize(
     title: Optional[str] = Form(None),
     course_id: Optional[str] = Form(None),
     current_user: User = Depends(get_current_user),
-    rag_service: RAGService = Depends(get_rag_service)
+    ingestion_service: IngestionService = Depends(get_ingestion_service)
 ):
     """
-    Upload a PDF file and vectorize it in one step
+    Upload a PDF file and queue it for vectorization in one step
     Only teachers can upload and vectorize materials
     """
     # Check if user is a teacher
@@ -128,16 +197,15 @@ async def upload_and_vectorize(
             detail="Only PDF files are supported"
         )
     
+    # Stream the upload to a temporary file, then move it into place
+    uploads_dir = Path(settings.UPLOAD_DIR)
+    try:
+        streamed = await stream_pdf_upload(file, uploads_dir)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    file_path = await streamed.finalize(uploads_dir / f"{material_id}_{Path(file.filename).name}")
+    
     try:
-        # Create uploads directory if it doesn't exist
-        uploads_dir = Path("./data/uploads")
-        uploads_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Save uploaded file
-        file_path = uploads_dir / f"{material_id}_{file.filename}"
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
         # Prepare metadata
         metadata = {
             "title": title or file.filename,
@@ -146,8 +214,8 @@ async def upload_and_vectorize(
             "filename": file.filename
         }
         
-        # Vectorize the material
-        result = await rag_service.vectorize_material(
+        # Queue the material for background vectorization
+        job = await ingestion_service.enqueue(
             material_id=material_id,
             file_path=str(file_path),
             metadata=metadata
@@ -155,15 +223,15 @@ async def upload_and_vectorize(
         
         return {
             "success": True,
-            "material_id": result["material_id"],
-            "num_chunks": result["num_chunks"],
-            "total_characters": result["total_characters"],
+            "material_id": material_id,
+            "job_id": str(job.id),
+            "vectorization_status": job.status.value,
             "file_path": str(file_path),
-            "message": "File uploaded and vectorized successfully"
+            "message": "File uploaded and queued for vectorization"
         }
         
     except Exception as e:
-        # Clean up file if vectorization fails
+        # Clean up file if queueing fails
         if file_path.exists():
             file_path.unlink()
         raise HTTPException(status_code=500, detail=str(e))
@@ -173,6 +241,7 @@ async def upload_and_vectorize(
 async def query_material(
     request: QueryRequest,
     current_user: User = Depends(get_current_user),
+    client_key: str = Depends(get_client_key),
     rag_service: RAGService = Depends(get_rag_service)
 ):
     """
@@ -184,7 +253,8 @@ async def query_material(
             material_id=request.material_id,
             query=request.query,
             num_results=request.num_results,
-            temperature=request.temperature
+            temperature=request.temperature,
+            user_id=client_key
         )
         
         if not result["success"]:
@@ -197,16 +267,39 @@ async def query_material(
             material_id=result["material_id"]
         )
         
-    except HTTPException:
+    except (HTTPException, GatewayOverloaded):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/query/stream")
+async def stream_query_material(
+    request: QueryRequest,
+    http_request: Request,
+    current_user: User = Depends(get_current_user),
+    client_key: str = Depends(get_client_key),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """
+    Query a specific study material, streaming the answer as server-sent events
+    Events: sources, then token (repeated), then done; error if generation fails
+    """
+    events = rag_service.stream_query_material(
+        material_id=request.material_id,
+        query=request.query,
+        num_results=request.num_results,
+        temperature=request.temperature,
+        user_id=client_key
+    )
+    return await stream_sse(http_request, events)
+
+
 @router.post("/query-multiple", response_model=QueryResponse)
 async def query_multiple_materials(
     request: MultiQueryRequest,
     current_user: User = Depends(get_current_user),
+    client_key: str = Depends(get_client_key),
     rag_service: RAGService = Depends(get_rag_service)
 ):
     """
@@ -218,7 +311,9 @@ async def query_multiple_materials(
             material_ids=request.material_ids,
             query=request.query,
             num_results=request.num_results,
-            temperature=request.temperature
+            temperature=request.temperature,
+            course_id=request.course_id,
+            user_id=client_key
         )
         
         if not result["success"]:
@@ -230,17 +325,80 @@ async def query_multiple_materials(
             sources=result["sources"]
         )
         
-    except HTTPException:
+    except (HTTPException, GatewayOverloaded):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/query-multiple/stream")
+async def stream_query_multiple_materials(
+    request: MultiQueryRequest,
+    http_request: Request,
+    current_user: User = Depends(get_current_user),
+    client_key: str = Depends(get_client_key),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """
+    Query multiple study materials, streaming the answer as server-sent events
+    Events: sources, then token (repeated), then done; error if generation fails
+    """
+    events = rag_service.stream_query_multiple_materials(
+        material_ids=request.material_ids,
+        query=request.query,
+        num_results=request.num_results,
+        temperature=request.temperature,
+        course_id=request.course_id,
+        user_id=client_key
+    )
+    return await stream_sse(http_request, events)
+
+
+@router.post("/query-batch")
+async def query_batch(
+    request: BatchQueryRequest,
+    http_request: Request,
+    current_user: User = Depends(get_current_user),
+    client_key: str = Depends(get_client_key),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """
+    Ask many questions about one study material, streaming each answer as
+    server-sent events as soon as it is ready
+    Events: batch, then result (one per question, in completion order, with
+    its index in queries), then done
+    Only teachers can send question batches
+    """
+    if current_user.role != "teacher":
+        raise HTTPException(
+            status_code=403,
+            detail="Only teachers can send question batches"
+        )
+    
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No questions given")
+    if len(request.queries) > settings.RAG_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.RAG_BATCH_MAX_QUESTIONS} questions per batch"
+        )
+    
+    events = rag_service.query_batch(
+        material_id=request.material_id,
+        queries=request.queries,
+        num_results=request.num_results,
+        temperature=request.temperature,
+        user_id=client_key
+    )
+    return await stream_sse(http_request, events)
+
+
 @router.delete("/material/{material_id}")
 async def delete_material_vectors(
     material_id: str,
     current_user: User = Depends(get_current_user),
-    rag_service: RAGService = Depends(get_rag_service)
+    rag_service: RAGService = Depends(get_rag_service),
+    content_store: ContentStore = Depends(get_content_store)
 ):
     """
     Delete vector embeddings for a material
@@ -253,8 +411,21 @@ async def delete_material_vectors(
             detail="Only teachers can delete material vectors"
         )
     
+    store_id = await rag_service.resolve_store_id(material_id, refresh=True)
+    if store_id != material_id:
+        # Content-addressed material: the vector store may be shared
+        blob = await content_store.get(store_id)
+        if blob is not None and blob.ref_count > 1:
+            raise HTTPException(
+                status_code=409,
+                detail="Material vectors are shared with other materials"
+            )
+    
     try:
-        success = await rag_service.delete_material_vectors(material_id)
+        success = await rag_service.delete_material_vectors(store_id)
+        await rag_service.course_indexes.remove_material(material_id)
+        if store_id != material_id:
+            await content_store.reset_vectorization(store_id)
         
         if success:
             return {"success": True, "message": "Material vectors deleted successfully"}
@@ -265,15 +436,92 @@ async def delete_material_vectors(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/courses/{course_id}/reindex")
+async def reindex_course(
+    course_id: str,
+    current_user: User = Depends(get_current_user),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """
+    Rebuild a course index from the course's vectorized materials
+    Only teachers can rebuild course indexes
+    """
+    if current_user.role != "teacher":
+        raise HTTPException(
+            status_code=403,
+            detail="Only teachers can rebuild course indexes"
+        )
+    
+    try:
+        return {"success": True, **await rag_service.rebuild_course_index(course_id)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_ingestion_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    ingestion_service: IngestionService = Depends(get_ingestion_service)
+):
+    """
+    Get the status of a vectorization job
+    """
+    job = await ingestion_service.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return JobResponse(
+        job_id=str(job.id),
+        material_id=job.material_id,
+        status=job.status.value,
+        attempts=job.attempts,
+        error=job.error,
+        result=job.result,
+        created_at=job.created_at.isoformat(),
+        started_at=job.started_at.isoformat() if job.started_at else None,
+        finished_at=job.finished_at.isoformat() if job.finished_at else None
+    )
+
+
+@router.get("/stats")
+async def rag_stats(
+    current_user: User = Depends(get_current_user),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """Get RAG cache statistics"""
+    return rag_service.get_stats()
+
+
+@router.get("/stats/vector-stores")
+async def vector_store_stats(
+    current_user: User = Depends(get_current_user),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """Get memory use and eviction counters of the loaded vector stores"""
+    return rag_service.vector_stores.stats()
+
+
+@router.get("/stats/query-executor")
+async def query_executor_stats(
+    current_user: User = Depends(get_current_user),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """Get queue depth, wait times and saturation of the query thread pool"""
+    return rag_service.query_executor.stats()
+
+
 @router.get("/health")
 async def rag_health_check():
     """Check if RAG service is running"""
     try:
-        rag_service = get_rag_service()
+        # Off the event loop: the first call loads the models
+        rag_service = await asyncio.to_thread(get_rag_service)
         return {
             "status": "healthy",
             "model": rag_service.model_name,
-            "embedding_model": rag_service.embedding_model_name
+            "embedding_model": rag_service.embedding_model_name,
+            "embedding_backend": rag_service.embedding_backend.backend_name
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
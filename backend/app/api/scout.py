@@ -1,10 +1,11 @@
 """
 API endpoint for Scout Assistant - AI-powered chat for navigation and help
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends
 from pydantic import BaseModel
-from langchain_google_genai import ChatGoogleGenerativeAI
-from app.core.config import settings
+from app.services.llm_registry import get_llm_registry
+from app.services.llm_gateway import get_llm_gateway, GatewayOverloaded
+from app.api.dependencies import get_client_key
 import logging
 
 logger = logging.getLogger(__name__)
@@ -160,22 +161,11 @@ APP_STRUCTURE = """
 """
 
 
-@router.post("/chat")
-async def scout_chat(request: ScoutChatRequest):
-    """
-    Scout Assistant chat endpoint - helps users navigate the dashboard
-    and answer questions about assignments, courses, materials, etc.
-    """
-    try:
-        # Initialize Gemini LLM
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",
-            google_api_key=settings.GOOGLE_API_KEY,
-            temperature=0.7  # Balanced for helpful responses
-        )
-        
-        # Create system prompt for Scout with app structure
-        system_prompt = f"""You are Scout, a friendly and helpful navigation assistant for the EduDash educational platform.
+SCOUT_MODEL = "gemini-2.0-flash-exp"
+SCOUT_TEMPERATURE = 0.7  # Balanced for helpful responses
+
+# System prompt for Scout with app structure (built once)
+SCOUT_SYSTEM_PROMPT = f"""You are Scout, a friendly and helpful navigation assistant for the EduDash educational platform.
 
 Your PRIMARY role is to help users NAVIGATE the platform and find the right pages/features.
 
@@ -207,8 +197,19 @@ EXAMPLE RESPONSES:
 
 Remember: You're a NAVIGATOR, not a data provider. Guide users to the right pages where they can see their actual data!"""
 
+
+@router.post("/chat")
+async def scout_chat(request: ScoutChatRequest, client_key: str = Depends(get_client_key)):
+    """
+    Scout Assistant chat endpoint - helps users navigate the dashboard
+    and answer questions about assignments, courses, materials, etc.
+    """
+    try:
+        # Shared Gemini client
+        llm = get_llm_registry().get_llm(SCOUT_MODEL, SCOUT_TEMPERATURE)
+        
         # Build conversation context
-        messages = [{"role": "system", "content": system_prompt}]
+        messages = [{"role": "system", "content": SCOUT_SYSTEM_PROMPT}]
         
         # Add conversation history (limit to last 6 exchanges for context)
         for msg in request.conversation_history[-12:]:
@@ -226,7 +227,9 @@ Remember: You're a NAVIGATOR, not a data provider. Guide users to the right page
             for m in messages
         ])
         
-        response = llm.invoke(full_prompt)
+        # Queued fairly per user under the shared LLM cap
+        async with get_llm_gateway().slot(client_key, "scout"):
+            response = await llm.ainvoke(full_prompt)
         answer = response.content.strip()
         
         return {
@@ -234,6 +237,8 @@ Remember: You're a NAVIGATOR, not a data provider. Guide users to the right page
             "success": True
         }
         
+    except GatewayOverloaded:
+        raise
     except Exception as e:
         logger.error(f"Scout chat error: {str(e)}")
         # Return helpful fallback
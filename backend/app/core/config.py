@@ -53,15 +53,80 @@ class Settings(BaseSettings):
     
     # RAG Settings
     RAG_MODEL: str = "gemini-2.0-flash-exp"
+    LLM_CLIENT_POOL_SIZE: int = 16  # Shared Gemini clients kept, one per (model, temperature, max tokens)
+    LLM_MAX_CONCURRENCY: int = 16  # Concurrent Gemini calls per worker; the rest queue fairly per user
+    LLM_MAX_QUEUE: int = 200  # Queued Gemini calls before new ones get 429 + Retry-After
+    LLM_MAX_QUEUE_PER_USER: int = 10  # One user can't take over the whole queue
+    LLM_QUEUE_TIMEOUT: float = 30.0  # Seconds a call may wait for a slot before it gets 429
+    TRUSTED_PROXIES: str = ""  # Comma-separated reverse proxy / load balancer addresses whose X-Forwarded-For is trusted
+    RAG_BATCH_MAX_QUESTIONS: int = 50  # Questions per /query-batch request
+    RAG_BATCH_CONCURRENCY: int = 4  # Gemini calls one batch has in flight (keep under LLM_MAX_QUEUE_PER_USER)
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    RAG_WARMUP_ON_STARTUP: bool = True  # Load models in the background at startup; /ready waits for it
+    EMBEDDING_BACKEND: str = "sentence-transformers"  # or "onnx-int8" (see benchmark_embeddings.py)
+    ONNX_MODEL_DIR: str = "./data/onnx_models"
+    ONNX_NUM_THREADS: int = 0  # 0 = one per CPU core
     VECTOR_STORE_PATH: str = "./data/vector_store"
+    VECTOR_STORE_CACHE_MB: int = 1024  # Memory budget for loaded vector stores and course indexes (LRU eviction)
+    STORE_ID_CACHE_TTL: float = 30.0  # Seconds a worker trusts its material -> store mapping (files are replaced by any worker)
+    VECTOR_STORE_MMAP: bool = True  # Memory-map index files for queries (shared between workers)
+    ANN_TARGET_RECALL: float = 0.95  # recall@10 that HNSW/IVF search parameters are tuned to
+    ANN_FLAT_MAX_VECTORS: int = 20000  # Exact (flat) index below this many vectors
+    ANN_IVF_MIN_VECTORS: int = 1000000  # HNSW below this, IVF from here on
+    ANN_HNSW_M: int = 32
+    VECTOR_STORE_ENCODING: str = "float32"  # "fp16", "int8" or "pq" to shrink material stores (see benchmark_vector_storage.py)
+    VECTOR_STORE_PQ_M: int = 48  # PQ bytes per vector, must divide the embedding dimension (stores under ~10k vectors use int8)
+    VECTOR_STORE_RERANK: bool = False  # Keep float32 copies too and re-rank compressed-search candidates exactly
+    DOCSTORE_COMPRESSION: str = "none"  # Chunk text blocks on disk: "none" or "zstd" (needs zstandard)
+    HYBRID_SEARCH_ENABLED: bool = True  # Fuse BM25 (exact terms like "22ADC09", "TCP/IP") with vector search
+    HYBRID_LEXICAL_WEIGHT: float = 0.3  # Share of the BM25 score in the fused score (0 = vector only, 1 = BM25 only)
+    HYBRID_CANDIDATES: int = 50  # Chunks taken from each search before fusion
+    CONTEXT_TOKEN_BUDGET: int = 3000  # Max tokens of retrieved context per prompt, 0 = unlimited
+    CONTEXT_MMR_LAMBDA: float = 0.7  # Relevance vs. novelty when picking passages (1 = relevance only)
+    CONTEXT_DUPLICATE_THRESHOLD: float = 0.9  # Drop passages with this share of their terms in an already picked one
+    CONTEXT_TOKENIZER: str = "cl100k_base"  # tiktoken encoding used to count context tokens
+    RAG_QUERY_WORKERS: int = 4  # Threads for query-time embedding and FAISS work, 0 = one per CPU core
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
+    EMBEDDING_BATCH_SIZE: int = 64  # Chunks per embedding forward pass
+    EMBEDDING_BATCH_MAX_WAIT_MS: int = 20  # Max time a chunk waits for its batch to fill
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "./data/embedding_cache.sqlite3"
+    QUERY_EMBEDDING_CACHE_MB: float = 16.0  # In-memory LRU of question embeddings, 0 = disabled
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_TTL: int = 3600  # Seconds a cached answer stays valid
+    ANSWER_CACHE_SIMILARITY: float = 0.95  # Cosine similarity for reusing the answer to a reworded question
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+    
+    # Upload Settings
+    UPLOAD_DIR: str = "./data/uploads"
+    MAX_UPLOAD_SIZE_MB: int = 50
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # Bytes per read/write while streaming uploads
+    
+    # PDF Extraction Settings
+    PDF_EXTRACTION_WORKERS: int = 0  # Process pool size, 0 = one per CPU core
+    PDF_PAGES_PER_TASK: int = 16  # Pages extracted per process pool task
+    
+    # Ingestion Queue Settings
+    INGESTION_WORKERS: int = 2  # Concurrent vectorization jobs
+    INGESTION_POLL_INTERVAL: float = 5.0  # Seconds between queue polls when idle
+    INGESTION_MAX_ATTEMPTS: int = 3
+    INGESTION_JOB_TIMEOUT: int = 300  # Seconds without a heartbeat before a processing job is considered abandoned
+    INGESTION_HEARTBEAT_INTERVAL: float = 30.0  # Seconds between heartbeats of a running job (well under the timeout)
+    
+    # Course Index Settings
+    COURSE_INDEX_ENABLED: bool = True  # One shared index per course for multi-material queries
+    COURSE_INDEX_COMPACT_RATIO: float = 0.2  # Compact once this fraction of vectors is deleted
+    COURSE_INDEX_COMPACTION_INTERVAL: float = 600.0  # Seconds between compaction sweeps
     
     @property
     def cors_origins_list(self) -> List[str]:
         return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
     
+    @property
+    def trusted_proxies_list(self) -> List[str]:
+        return [proxy.strip() for proxy in self.TRUSTED_PROXIES.split(",") if proxy.strip()]
+    
     class Config:
         env_file = str(BACKEND_DIR / ".env")
         case_sensitive = True
@@ -7,6 +7,8 @@ from app.models.material import Material
 from app.models.course import Course
 from app.models.submission import Submission
 from app.models.performance import Performance
+from app.models.ingestion_job import IngestionJob
+from app.models.content_blob import ContentBlob
 
 
 class Database:
@@ -34,7 +36,9 @@ async def connect_to_mongo():
                 Material,
                 Course,
                 Submission,
-                Performance
+                Performance,
+                IngestionJob,
+                ContentBlob
             ]
         )
         print("✅ Connected to MongoDB successfully")
@@ -1,13 +1,37 @@
+import asyncio
+import time
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.core.config import settings
 from app.core.database import connect_to_mongo, close_mongo_connection
 from app.core.firebase import get_firebase_admin
+from app.services.ingestion_service import get_ingestion_service
+from app.services.rag_service import get_rag_service
+from app.services.llm_gateway import get_llm_gateway, GatewayOverloaded
 from app.api.routes import auth, rag, materials, assignments
+from app.api.dependencies import get_current_user
+from app.models.user import User
 from app.api import quote, scout
 
 
+async def warm_up_rag_service(app: FastAPI):
+    """
+    Build the RAG service and exercise its models off the event loop
+    /ready reports not-ready until this finishes
+    """
+    try:
+        started = time.perf_counter()
+        rag_service = await asyncio.to_thread(get_rag_service)
+        await asyncio.to_thread(rag_service.warm_up)
+        app.state.ready = True
+        print(f"✅ RAG service warmed up in {time.perf_counter() - started:.1f}s")
+    except Exception as e:
+        app.state.warmup_error = str(e)
+        print(f"⚠️  RAG warm-up failed: {str(e)}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
@@ -28,12 +52,26 @@ async def lifespan(app: FastAPI):
     # Connect to MongoDB
     await connect_to_mongo()
     
+    # Start background vectorization queue
+    ingestion_service = get_ingestion_service()
+    await ingestion_service.start()
+    
+    # Load embedding model and LLM client before routing traffic here
+    app.state.ready = not settings.RAG_WARMUP_ON_STARTUP
+    app.state.warmup_error = None
+    warmup_task = None
+    if settings.RAG_WARMUP_ON_STARTUP:
+        warmup_task = asyncio.create_task(warm_up_rag_service(app))
+    
     print("✅ Application started successfully")
     
     yield
     
     # Shutdown
     print("🔄 Shutting down...")
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await ingestion_service.stop()
     await close_mongo_connection()
     print("👋 Shutdown complete")
 
@@ -60,6 +98,16 @@ app.add_middleware(
 )
 
 
+# Gemini-backed endpoints shed load when the LLM gateway queue is full
+@app.exception_handler(GatewayOverloaded)
+async def gateway_overloaded_handler(request: Request, exc: GatewayOverloaded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
 # Include routers
 app.include_router(auth.router, prefix="/api")
 app.include_router(rag.router, prefix="/api")
@@ -82,6 +130,38 @@ async def health_check():
     }
 
 
+# Readiness endpoint (for load balancers)
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness check endpoint
+    Returns 503 until the RAG models are loaded and warmed up
+    """
+    if not app.state.ready:
+        return JSONResponse(
+            status_code=503,
+            content={
+                "status": "failed" if app.state.warmup_error else "warming_up",
+                "error": app.state.warmup_error
+            }
+        )
+    
+    return {
+        "status": "ready",
+        "service": settings.PROJECT_NAME
+    }
+
+
+# LLM admission control metrics
+@app.get("/llm-gateway/stats")
+async def llm_gateway_stats(current_user: User = Depends(get_current_user)):
+    """
+    Concurrency, queue depth, rejections and wait/call time histograms
+    of the Gemini-backed endpoints
+    """
+    return get_llm_gateway().stats()
+
+
 # Root endpoint
 @app.get("/")
 async def root():
@@ -91,7 +171,8 @@ async def root():
     return {
         "message": "Educational Dashboard API",
         "docs": "/api/docs",
-        "health": "/health"
+        "health": "/health",
+        "ready": "/ready"
     }
 
 
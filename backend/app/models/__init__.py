@@ -1,9 +1,11 @@
 from .user import User, UserRole
 from .assignment import Assignment, AssignmentStatus
-from .material import Material, MaterialType
+from .material import Material, MaterialType, VectorizationStatus
 from .course import Course
 from .submission import Submission, SubmissionStatus
 from .performance import Performance
+from .ingestion_job import IngestionJob, IngestionJobStatus
+from .content_blob import ContentBlob
 
 __all__ = [
     "User",
@@ -12,8 +14,12 @@ __all__ = [
     "AssignmentStatus",
     "Material",
     "MaterialType",
+    "VectorizationStatus",
     "Course",
     "Submission",
     "SubmissionStatus",
-    "Performance"
+    "Performance",
+    "IngestionJob",
+    "IngestionJobStatus",
+    "ContentBlob"
 ]
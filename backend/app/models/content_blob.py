@@ -0,0 +1,40 @@
+from datetime import datetime
+from typing import Optional
+from beanie import Document
+from pydantic import Field
+
+from .material import VectorizationStatus
+
+
+class ContentBlob(Document):
+    sha256: str = Field(..., index=True, unique=True)
+    file_path: str
+    file_size: int  # in bytes
+    ref_count: int = Field(default=0)  # Materials referencing this content
+    
+    # Shared vector store (stored as {sha256}.faiss)
+    vectorization_status: VectorizationStatus = Field(default=VectorizationStatus.NOT_REQUESTED)
+    vectorization_job_id: Optional[str] = None
+    num_chunks: Optional[int] = None
+    page_count: Optional[int] = None
+    
+    # Dates
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    class Settings:
+        name = "content_blobs"
+        indexes = [
+            "sha256",
+        ]
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "sha256": "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08",
+                "file_path": "data/uploads/9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08.pdf",
+                "file_size": 482113,
+                "ref_count": 2,
+                "vectorization_status": "completed"
+            }
+        }
@@ -0,0 +1,49 @@
+from datetime import datetime
+from typing import Optional
+from enum import Enum
+from beanie import Document
+from pydantic import Field
+
+
+class IngestionJobStatus(str, Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class IngestionJob(Document):
+    material_id: str = Field(..., index=True)
+    content_hash: Optional[str] = None  # Set for content-addressed uploads; vectors are stored under it
+    file_path: str
+    metadata: dict = Field(default_factory=dict)  # Chunk metadata (title, course_id, ...)
+
+    # Processing state
+    status: IngestionJobStatus = Field(default=IngestionJobStatus.PENDING)
+    attempts: int = Field(default=0)
+    error: Optional[str] = None
+    result: Optional[dict] = None  # Vectorization summary (num_chunks, ...)
+
+    # Dates
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)  # Also the heartbeat of a processing job
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Settings:
+        name = "ingestion_jobs"
+        indexes = [
+            "material_id",
+            "status",
+            ("status", "created_at"),  # Queue ordering
+        ]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "material_id": "68fdb1b4961f098f73d229ea",
+                "file_path": "data/uploads/20251026_054251_SE Unit-1.pdf",
+                "metadata": {"title": "SE Unit 1", "course_id": "COURSE001"},
+                "status": "pending"
+            }
+        }
@@ -14,6 +14,14 @@ class MaterialType(str, Enum):
     OTHER = "other"
 
 
+class VectorizationStatus(str, Enum):
+    NOT_REQUESTED = "not_requested"
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
 class Material(Document):
     title: str
     description: Optional[str] = None
@@ -23,8 +31,10 @@ class Material(Document):
     # Material details
     type: MaterialType
     file_url: Optional[str] = None
+    file_name: Optional[str] = None  # Uploaded filename (file_url is named after the content)
     external_link: Optional[str] = None
     content: Optional[str] = None  # For embedded content
+    content_hash: Optional[str] = Field(default=None, index=True)  # SHA-256 of the uploaded file
     
     # Metadata
     file_size: Optional[int] = None  # in bytes
@@ -39,6 +49,13 @@ class Material(Document):
     is_public: bool = Field(default=False)
     accessible_to: list[str] = Field(default_factory=list)  # Student IDs
     
+    # RAG vectorization
+    vectorization_status: VectorizationStatus = Field(default=VectorizationStatus.NOT_REQUESTED)
+    vectorization_job_id: Optional[str] = None
+    vectorization_error: Optional[str] = None
+    num_chunks: Optional[int] = None
+    vectorized_at: Optional[datetime] = None
+    
     # Dates
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -55,6 +72,7 @@ class Material(Document):
             "teacher_id",
             "type",
             "tags",
+            "content_hash",
         ]
     
     class Config:
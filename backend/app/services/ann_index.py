@@ -0,0 +1,339 @@
+"""
+ANN Index Selection
+Builds a flat, HNSW or IVF FAISS index depending on the number of vectors, tuned
+to a target recall, and reports the recall/latency it measured. Vectors can be
+stored at reduced precision (fp16, int8 or product-quantized), optionally with
+full-precision copies for exact re-ranking of the top candidates.
+"""
+
+import itertools
+import math
+import time
+from typing import Dict, Any, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from app.core.config import settings
+
+
+RECALL_K = 10
+SAMPLE_QUERIES = 200
+
+# Filtered searches over at most this many vectors are done exactly
+EXACT_SUBSET_MAX = 20000
+
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH_STEPS = [16, 32, 64, 128, 256, 512]
+
+# Storage encodings -> index_factory code descriptors ("pq" adds the subquantizer count)
+ENCODINGS = {
+    "float32": "Flat",
+    "fp16": "SQfp16",
+    "int8": "SQ8",
+    "pq": "PQ"
+}
+# 8-bit PQ codebooks need ~39 training points per centroid; smaller stores use int8
+PQ_MIN_VECTORS = 39 * 256
+# Candidates fetched per result before exact re-ranking
+REFINE_K_FACTOR_STEPS = [2, 4, 8, 16]
+
+
+def choose_index_type(num_vectors: int) -> str:
+    """Index type for a store of this size"""
+    if num_vectors < settings.ANN_FLAT_MAX_VECTORS:
+        return "flat"
+    if num_vectors < settings.ANN_IVF_MIN_VECTORS:
+        return "hnsw"
+    return "ivf"
+
+
+def _base_index(index: faiss.Index) -> faiss.Index:
+    """The searched index, without a re-ranking wrapper"""
+    if isinstance(index, faiss.IndexRefine):
+        return faiss.downcast_index(index.base_index)
+    return index
+
+
+def _ivf(index: faiss.Index) -> Optional[faiss.IndexIVF]:
+    try:
+        return faiss.extract_index_ivf(index)
+    except Exception:
+        return None
+
+
+def index_type_of(index: faiss.Index) -> str:
+    if isinstance(_base_index(index), faiss.IndexHNSW):
+        return "hnsw"
+    if _ivf(index) is not None:
+        return "ivf"
+    return "flat"
+
+
+def has_exact_vectors(index: faiss.Index) -> bool:
+    """True if the index can give back its vectors at full precision"""
+    if isinstance(index, faiss.IndexRefine):
+        return True
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    return isinstance(index, (faiss.IndexFlat, faiss.IndexIVFFlat))
+
+
+def code_bytes_per_vector(index: faiss.Index) -> int:
+    """Bytes stored per vector (codes only, not graph links or lists overhead)"""
+    if isinstance(index, faiss.IndexRefine):
+        return (
+            code_bytes_per_vector(faiss.downcast_index(index.base_index))
+            + code_bytes_per_vector(faiss.downcast_index(index.refine_index))
+        )
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    try:
+        return index.sa_code_size()
+    except Exception:
+        return index.d * 4  # float32 vectors
+
+
+def reconstruct_vectors(index: faiss.Index, positions: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Read stored vectors back from any index built here
+
+    Compressed indexes without a re-ranking copy give back decoded
+    (approximate) vectors.
+
+    Args:
+        index: The index
+        positions: Positions to read (default: all, in order)
+    """
+    if index.ntotal == 0 or (positions is not None and len(positions) == 0):
+        return np.zeros((0, index.d), dtype=np.float32)
+    if positions is None:
+        return index.reconstruct_n(0, index.ntotal)
+    return index.reconstruct_batch(np.asarray(positions, dtype=np.int64))
+
+
+def _sample_queries(vectors: np.ndarray) -> np.ndarray:
+    """Queries near the data: stored vectors with noise, renormalized"""
+    rng = np.random.default_rng(0)
+    sample = vectors[rng.choice(len(vectors), size=min(SAMPLE_QUERIES, len(vectors)), replace=False)]
+    queries = sample + rng.normal(scale=0.05, size=sample.shape).astype(np.float32)
+    queries /= np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+    return queries.astype(np.float32)
+
+
+def _measure(index: faiss.Index, queries: np.ndarray, truth: np.ndarray, k: int) -> Tuple[float, float]:
+    """(recall@k against the exact neighbours, milliseconds per query)"""
+    started = time.perf_counter()
+    _, found = index.search(queries, k)
+    latency_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    recall = np.mean([
+        len(set(found_row).intersection(truth_row)) / len(truth_row)
+        for found_row, truth_row in zip(found, truth)
+    ])
+    return float(recall), latency_ms
+
+
+def build_index(
+    vectors: np.ndarray,
+    target_recall: float,
+    encoding: str = "float32",
+    rerank: bool = False
+) -> Tuple[faiss.Index, Dict[str, Any]]:
+    """
+    Build the index chosen for this many vectors and tune its search parameters
+
+    HNSW efSearch or IVF nprobe (and, with re-ranking, the number of
+    candidates re-ranked) is raised until recall@10 on sample queries
+    (measured against an exact search) reaches target_recall.
+
+    Args:
+        vectors: float32 vectors, in store position order
+        target_recall: Minimum recall@10
+        encoding: How vectors are stored: "float32", "fp16", "int8" or "pq"
+        rerank: Also keep float32 copies and re-rank the top candidates
+            exactly (no effect for float32)
+
+    Returns:
+        (index, report for the store manifest)
+    """
+    if encoding not in ENCODINGS:
+        raise Exception(f"Unknown vector encoding '{encoding}'")
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    num_vectors, dimension = vectors.shape
+    index_type = choose_index_type(num_vectors)
+    if num_vectors == 0:
+        encoding = "float32"
+    elif encoding == "pq" and num_vectors < PQ_MIN_VECTORS:
+        encoding = "int8"
+    rerank = rerank and encoding != "float32"
+
+    started = time.perf_counter()
+    flat = faiss.IndexFlatL2(dimension)
+    flat.add(vectors)
+
+    params: Dict[str, Any] = {}
+    training_size = num_vectors
+    if index_type == "hnsw":
+        description = f"HNSW{settings.ANN_HNSW_M},"
+        params = {"M": settings.ANN_HNSW_M, "ef_construction": HNSW_EF_CONSTRUCTION}
+    elif index_type == "ivf":
+        nlist = 2 ** round(math.log2(4 * math.sqrt(num_vectors)))
+        description = f"IVF{nlist},"
+        training_size = nlist * 64
+        params = {"nlist": nlist}
+    else:
+        description = ""
+
+    description += ENCODINGS[encoding]
+    if encoding == "pq":
+        if dimension % settings.VECTOR_STORE_PQ_M:
+            raise Exception(
+                f"VECTOR_STORE_PQ_M ({settings.VECTOR_STORE_PQ_M}) must divide "
+                f"the embedding dimension ({dimension})"
+            )
+        description += str(settings.VECTOR_STORE_PQ_M)
+        training_size = max(training_size, PQ_MIN_VECTORS)
+        params["pq_m"] = settings.VECTOR_STORE_PQ_M
+    if rerank:
+        description += ",RFlat"
+
+    if description == "Flat":
+        index = flat
+    else:
+        index = faiss.index_factory(dimension, description, faiss.METRIC_L2)
+        if index_type == "hnsw":
+            _base_index(index).hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        if not index.is_trained:
+            rng = np.random.default_rng(0)
+            training = vectors[rng.choice(num_vectors, size=min(num_vectors, training_size), replace=False)]
+            index.train(training)
+        index.add(vectors)
+        if index_type == "ivf":
+            # Lets reconstruct() read vectors back (course indexes, re-ranking, rebuilds)
+            _ivf(index).make_direct_map()
+    build_seconds = time.perf_counter() - started
+
+    report: Dict[str, Any] = {
+        "type": index_type,
+        "encoding": encoding,
+        "rerank": rerank,
+        "exact_vectors": has_exact_vectors(index),
+        "bytes_per_vector": code_bytes_per_vector(index),
+        "num_vectors": num_vectors,
+        "target_recall": target_recall,
+        "build_seconds": round(build_seconds, 3)
+    }
+    if num_vectors == 0:
+        return index, {**report, **params}
+
+    k = min(RECALL_K, num_vectors)
+    queries = _sample_queries(vectors)
+    started = time.perf_counter()
+    _, truth = flat.search(queries, k)
+    flat_latency_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+    if index is flat:
+        recall, latency_ms = 1.0, flat_latency_ms
+    else:
+        if index_type == "hnsw":
+            steps = HNSW_EF_SEARCH_STEPS
+        elif index_type == "ivf":
+            steps = [nprobe for nprobe in (1, 2, 4, 8, 16, 32, 64, 128, 256) if nprobe <= params["nlist"]]
+        else:
+            steps = [None]
+        k_factors = REFINE_K_FACTOR_STEPS if rerank else [None]
+
+        # Cheapest search settings first; more re-ranking before a wider ANN search
+        for value, k_factor in itertools.product(steps, k_factors):
+            if index_type == "hnsw":
+                _base_index(index).hnsw.efSearch = value
+            elif index_type == "ivf":
+                _ivf(index).nprobe = value
+            if k_factor is not None:
+                index.k_factor = k_factor
+            recall, latency_ms = _measure(index, queries, truth, k)
+            if recall >= target_recall:
+                break
+
+        if index_type != "flat":
+            params["ef_search" if index_type == "hnsw" else "nprobe"] = value
+        if rerank:
+            params["k_factor"] = k_factor
+
+    report.update(params)
+    report.update({
+        "recall_at_10": round(recall, 4),
+        "latency_ms": round(latency_ms, 4),
+        "flat_latency_ms": round(flat_latency_ms, 4)
+    })
+    return index, report
+
+
+def optimize_vector_store(
+    vector_store: FAISS,
+    target_recall: float,
+    encoding: str = "float32",
+    rerank: bool = False
+) -> Dict[str, Any]:
+    """
+    Replace a store's index with the one chosen for its size (see build_index)
+
+    Positions are preserved, so the docstore mapping stays valid.
+
+    Returns:
+        The build report
+    """
+    index, report = build_index(reconstruct_vectors(vector_store.index), target_recall, encoding, rerank)
+    vector_store.index = index
+    return report
+
+
+def to_flat_index(vector_store: FAISS):
+    """Swap an ANN or compressed index for an exact one (same positions) so it can be edited in place"""
+    if isinstance(vector_store.index, faiss.IndexFlat):
+        return
+    vectors = reconstruct_vectors(vector_store.index)
+    flat = faiss.IndexFlatL2(vector_store.index.d)
+    flat.add(vectors)
+    vector_store.index = flat
+
+
+def search_subset(
+    index: faiss.Index,
+    query: np.ndarray,
+    k: int,
+    allowed: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Search only the vectors at the allowed positions
+
+    Flat indexes and small subsets are searched exactly; large subsets of an
+    ANN index use its own filtered search. Flat PQ has no filtered search, so
+    its subsets are always scanned from reconstructed vectors.
+
+    Returns:
+        (distances, positions) shaped like index.search
+    """
+    index_type = index_type_of(index)
+    scan = index_type != "flat" and len(allowed) <= EXACT_SUBSET_MAX
+    if scan or isinstance(_base_index(index), faiss.IndexPQ):
+        vectors = reconstruct_vectors(index, allowed)
+        distances = ((vectors - query[0]) ** 2).sum(axis=1)
+        top = np.argsort(distances)[:k]
+        return distances[top][None, :], allowed[top][None, :]
+
+    # The selector applies to the searched (base) index; a re-ranking
+    # wrapper takes it inside its own parameters
+    selector = faiss.IDSelectorBatch(allowed)
+    base = _base_index(index)
+    if index_type == "hnsw":
+        base_params = faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+    elif index_type == "ivf":
+        base_params = faiss.SearchParametersIVF(sel=selector, nprobe=_ivf(base).nprobe)
+    else:
+        base_params = faiss.SearchParameters(sel=selector)
+    params = base_params
+    if isinstance(index, faiss.IndexRefine):
+        params = faiss.IndexRefineSearchParameters(base_index_params=base_params, k_factor=index.k_factor)
+    return index.search(query, k, params=params)
@@ -0,0 +1,155 @@
+"""
+Answer Cache
+In-memory cache of RAG answers, matched exactly or by question embedding similarity
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Dict, Any, Iterable, Optional, Hashable, Tuple
+
+import numpy as np
+
+from app.services.embedding_cache import normalize_query
+
+
+@dataclass
+class _Entry:
+    query_vector: Optional[np.ndarray]
+    result: Dict[str, Any]
+    dependencies: frozenset  # Material and vector store IDs the answer was built from
+    expires_at: float
+
+
+class AnswerCache:
+    """
+    Thread-safe LRU cache of answers with a TTL
+
+    Answers are grouped by scope (the materials queried plus every parameter
+    that changes the answer). Within a scope, a question is matched exactly
+    first, then by cosine similarity of its embedding to earlier questions.
+    """
+
+    def __init__(self, ttl: float, similarity_threshold: float, max_entries: int):
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[Tuple[Hashable, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, scope: Hashable, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Exact lookup (case- and whitespace-insensitive)
+
+        Does not count a miss; follow up with get_similar().
+        """
+        key = (scope, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry.result
+
+    def get_similar(self, scope: Hashable, query_vector: List[float]) -> Optional[Dict[str, Any]]:
+        """
+        Near-duplicate lookup: the cached answer whose question embedding is
+        most similar, if above the threshold (vectors are unit length)
+        """
+        vector = np.asarray(query_vector, dtype=np.float32)
+        now = time.monotonic()
+        with self._lock:
+            best_key = None
+            best_similarity = self.similarity_threshold
+            for key, entry in list(self._entries.items()):
+                if key[0] != scope or entry.query_vector is None:
+                    continue
+                if entry.expires_at <= now:
+                    del self._entries[key]
+                    continue
+                similarity = float(np.dot(entry.query_vector, vector))
+                if similarity >= best_similarity:
+                    best_key, best_similarity = key, similarity
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.similar_hits += 1
+            return self._entries[best_key].result
+
+    def put(
+        self,
+        scope: Hashable,
+        query: str,
+        query_vector: Optional[List[float]],
+        result: Dict[str, Any],
+        dependencies: Iterable[str]
+    ):
+        """
+        Cache an answer
+
+        Args:
+            scope: Materials and parameters the answer applies to
+            query: The question
+            query_vector: Its embedding, for near-duplicate matching
+            result: The answer to return on a hit
+            dependencies: IDs whose change invalidates the answer
+        """
+        entry = _Entry(
+            query_vector=None if query_vector is None else np.asarray(query_vector, dtype=np.float32),
+            result=result,
+            dependencies=frozenset(dependencies),
+            expires_at=time.monotonic() + self.ttl
+        )
+        key = (scope, normalize_query(query))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, ids: Iterable[str]) -> int:
+        """
+        Drop every answer built from any of the given material or store IDs
+
+        Returns:
+            Number of answers dropped
+        """
+        ids = set(ids)
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if not entry.dependencies.isdisjoint(ids)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.similar_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "similarity_threshold": self.similarity_threshold,
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,108 @@
+"""
+Bounded Executor
+Fixed-size thread pool for blocking query work (embedding, FAISS search, store
+loads) with queueing and saturation metrics
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, TypeVar
+
+
+T = TypeVar("T")
+
+
+class BoundedExecutor:
+    """
+    Runs blocking calls from async code on a dedicated pool of threads
+
+    Unlike asyncio.to_thread (the loop's shared default pool), the pool size
+    is fixed, so a burst of queries queues here instead of starving other
+    blocking work, and the queue is observable.
+    """
+
+    def __init__(self, max_workers: int, name: str):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.active = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.saturated_submissions = 0  # Submitted while every worker was busy
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Run func(*args, **kwargs) on the pool and wait for its result"""
+        submitted_at = time.perf_counter()
+
+        def task():
+            started_at = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.active += 1
+                wait = started_at - submitted_at
+                self.wait_seconds += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+            failed = False
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.completed += 1
+                    self.failed += failed
+                    self.run_seconds += time.perf_counter() - started_at
+
+        with self._lock:
+            self.submitted += 1
+            if self.active + self.queued >= self.max_workers:
+                self.saturated_submissions += 1
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+
+        future = self._executor.submit(task)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Caller gave up: drop the call if it hasn't started yet
+            if future.cancel():
+                with self._lock:
+                    self.queued -= 1
+            raise
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self.completed + self.active
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "active": self.active,
+                "queued": self.queued,
+                "peak_queued": self.peak_queued,
+                "utilization": self.active / self.max_workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "saturated_submissions": self.saturated_submissions,
+                "saturation_rate": self.saturated_submissions / self.submitted if self.submitted else 0.0,
+                "avg_wait_ms": self.wait_seconds / started * 1000 if started else 0.0,
+                "max_wait_ms": self.max_wait_seconds * 1000,
+                "avg_run_ms": self.run_seconds / self.completed * 1000 if self.completed else 0.0
+            }
@@ -0,0 +1,152 @@
+"""
+Content Store
+Content-addressed storage for uploaded files, shared between materials by reference counting
+"""
+
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from fastapi import UploadFile
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+from app.models.content_blob import ContentBlob
+from app.models.material import Material, VectorizationStatus
+from app.services.rag_service import get_rag_service
+from app.services.uploads import stream_pdf_upload, StreamedUpload
+
+
+class ContentStore:
+    """Stores each distinct upload once under its SHA-256 and tracks who references it"""
+
+    def __init__(self):
+        self.upload_path = Path(settings.UPLOAD_DIR)
+
+        # Ensure upload directory exists
+        self.upload_path.mkdir(parents=True, exist_ok=True)
+
+    def blob_path(self, sha256: str) -> Path:
+        """Final location of the file with this content hash"""
+        return self.upload_path / f"{sha256}.pdf"
+
+    async def store(self, upload: UploadFile) -> ContentBlob:
+        """
+        Store an upload and take a reference on its content
+
+        The upload is streamed to a temporary file while its SHA-256 is
+        computed. If the content is already known the temporary file is
+        discarded and the existing blob is shared.
+
+        Args:
+            upload: The uploaded file
+
+        Returns:
+            The referenced ContentBlob
+
+        Raises:
+            UploadError: The file is not a PDF or is too large
+        """
+        streamed = await stream_pdf_upload(upload, self.upload_path)
+        try:
+            return await self.acquire(streamed)
+        finally:
+            await streamed.discard()
+
+    async def acquire(self, streamed: StreamedUpload) -> ContentBlob:
+        """
+        Take a reference on content, moving the upload into place if it is new
+
+        Args:
+            streamed: Fully written temporary upload
+
+        Returns:
+            The referenced ContentBlob
+        """
+        now = datetime.utcnow()
+        sha256 = streamed.sha256
+        final_path = self.blob_path(sha256)
+
+        raw = await ContentBlob.get_motor_collection().find_one_and_update(
+            {"sha256": sha256},
+            {
+                "$inc": {"ref_count": 1},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {
+                    "file_path": str(final_path),
+                    "file_size": streamed.size,
+                    "vectorization_status": "not_requested",
+                    "vectorization_job_id": None,
+                    "num_chunks": None,
+                    "page_count": None,
+                    "created_at": now
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+        if raw["ref_count"] == 1 or not final_path.exists():
+            # First reference (or the stored copy went missing): keep this upload
+            await streamed.finalize(final_path)
+
+        return await ContentBlob.get(raw["_id"])
+
+    async def get(self, sha256: str) -> Optional[ContentBlob]:
+        """Get the blob for a content hash"""
+        return await ContentBlob.find_one(ContentBlob.sha256 == sha256)
+
+    async def reset_vectorization(self, sha256: str):
+        """Mark content, and every material sharing it, as no longer vectorized"""
+        fields = {
+            "vectorization_status": VectorizationStatus.NOT_REQUESTED.value,
+            "vectorization_job_id": None,
+            "num_chunks": None,
+            "updated_at": datetime.utcnow()
+        }
+        await ContentBlob.find_one(ContentBlob.sha256 == sha256).update({"$set": fields})
+        await Material.find(Material.content_hash == sha256).update({"$set": fields})
+
+    async def release(self, sha256: str) -> bool:
+        """
+        Drop a reference; the file and vector store are deleted with the last one
+
+        Args:
+            sha256: Content hash of the material being removed
+
+        Returns:
+            True if the content was freed
+        """
+        collection = ContentBlob.get_motor_collection()
+        raw = await collection.find_one_and_update(
+            {"sha256": sha256},
+            {"$inc": {"ref_count": -1}, "$set": {"updated_at": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if raw is None or raw["ref_count"] > 0:
+            return False
+
+        # Only delete if no new reference raced in
+        deleted = await collection.delete_one({"_id": raw["_id"], "ref_count": {"$lte": 0}})
+        if deleted.deleted_count == 0:
+            return False
+
+        file_path = Path(raw["file_path"])
+        if file_path.exists():
+            file_path.unlink()
+
+        rag_service = await asyncio.to_thread(get_rag_service)
+        await rag_service.delete_material_vectors(sha256)
+        return True
+
+
+# Singleton instance
+_content_store = None
+
+def get_content_store() -> ContentStore:
+    """Get or create content store singleton"""
+    global _content_store
+    if _content_store is None:
+        _content_store = ContentStore()
+    return _content_store
@@ -0,0 +1,254 @@
+"""
+Context Packer
+Turns retrieved chunks into the context sent to the LLM: overlapping
+neighbours are merged, near-duplicates dropped (MMR) and the rest packed
+into a token budget, so prompt size stays bounded however many chunks
+were retrieved
+"""
+
+import math
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+import tiktoken
+from langchain_core.documents import Document
+
+from app.services.lexical_index import tokenize
+
+
+# Shortest shared text that counts as splitter overlap rather than coincidence
+MIN_OVERLAP_CHARS = 20
+
+# Separator the "stuff" chain puts between documents
+DOCUMENT_SEPARATOR = "\n\n"
+
+
+def merge_overlap(first: str, second: str, max_overlap: int) -> Optional[str]:
+    """
+    first + second without the text they share, if second starts where
+    first ends (as neighbouring chunks of the text splitter do)
+
+    Returns:
+        The merged text, or None if they don't overlap
+    """
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return None
+    tail_start = max(0, len(first) - max_overlap)
+    start = first.find(probe, tail_start)
+    while start != -1:
+        if second.startswith(first[start:]):
+            return first + second[len(first) - start:]
+        start = first.find(probe, start + 1)
+    return None
+
+
+class ContextPacker:
+    """
+    Packs ranked chunks into a token budget
+
+    1. Chunks of the same material and page whose text overlaps (the
+       splitter repeats up to CHUNK_OVERLAP characters between neighbours)
+       are merged into one passage, ranked as its best chunk.
+    2. Passages are picked by maximal marginal relevance: relevance from
+       the retrieval rank, redundancy as the cosine similarity of term
+       counts to passages already picked. Near-duplicates (the same
+       paragraph in two materials, repeated slides), whose terms are mostly
+       covered by one picked passage, are dropped outright.
+    3. Picked passages are added while they fit the token budget, counted
+       with tiktoken.
+    """
+
+    def __init__(
+        self,
+        token_budget: int,
+        mmr_lambda: float,
+        duplicate_threshold: float,
+        max_overlap: int,
+        encoding_name: str = "cl100k_base"
+    ):
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.max_overlap = max_overlap
+        try:
+            self.encoding = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            # The BPE file is downloaded on first use; estimate until it's available
+            print(f"⚠️  tiktoken encoding {encoding_name} unavailable ({str(e)}); estimating tokens from length")
+            self.encoding = None
+
+        # Totals across pack() calls
+        self._lock = threading.Lock()
+        self.packs = 0
+        self.chunks_retrieved = 0
+        self.chunks_merged = 0
+        self.duplicates_dropped = 0
+        self.over_budget_dropped = 0
+        self.context_tokens = 0
+
+    def count_tokens(self, text: str) -> int:
+        if self.encoding is None:
+            return math.ceil(len(text) / 4)
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        if self.encoding is None:
+            return text[:max_tokens * 4]
+        return self.encoding.decode(self.encoding.encode(text, disallowed_special=())[:max_tokens])
+
+    def _merge_neighbours(self, hits: List[Tuple[Document, float]]) -> List[Tuple[Document, float]]:
+        """(passage, score of its best chunk) pairs, best first"""
+        passages: List[List[Any]] = []  # [text, best hit]
+        by_page: Dict[Tuple, List[List[Any]]] = {}
+        for doc, score in hits:
+            key = (doc.metadata.get("material_id"), doc.metadata.get("page"))
+            text = doc.page_content
+            merged_into = None
+            for passage in by_page.get(key, []):
+                if text in passage[0]:
+                    merged_into = passage
+                    break
+                combined = merge_overlap(passage[0], text, self.max_overlap) or merge_overlap(text, passage[0], self.max_overlap)
+                if combined is not None:
+                    passage[0] = combined
+                    merged_into = passage
+                    break
+            if merged_into is None:
+                passage = [text, (doc, score)]
+                passages.append(passage)
+                by_page.setdefault(key, []).append(passage)
+            else:
+                # Merging can make two passages of the page overlap in turn
+                self._absorb(merged_into, by_page[key], passages)
+
+        return [
+            (Document(page_content=text, metadata=dict(best[0].metadata)), best[1])
+            for text, best in passages
+        ]
+
+    def _absorb(self, passage: List[Any], page_passages: List[List[Any]], passages: List[List[Any]]):
+        """Merge other passages of the same page with passage while they overlap it"""
+        changed = True
+        while changed:
+            changed = False
+            for other in page_passages:
+                if other is passage:
+                    continue
+                combined = (
+                    passage[0] if other[0] in passage[0] else
+                    other[0] if passage[0] in other[0] else
+                    merge_overlap(passage[0], other[0], self.max_overlap)
+                    or merge_overlap(other[0], passage[0], self.max_overlap)
+                )
+                if combined is not None:
+                    # The better ranked of the two (the earlier one) survives
+                    keep, drop = (passage, other) if passages.index(passage) < passages.index(other) else (other, passage)
+                    keep[0] = combined
+                    page_passages.remove(drop)
+                    passages.remove(drop)
+                    passage = keep
+                    changed = True
+                    break
+
+    @staticmethod
+    def _term_vector(text: str) -> Tuple[Counter, float]:
+        counts = Counter(tokenize(text))
+        return counts, math.sqrt(sum(count * count for count in counts.values())) or 1.0
+
+    @staticmethod
+    def _similarity(a: Tuple[Counter, float], b: Tuple[Counter, float]) -> Tuple[float, float]:
+        """(cosine similarity, share of a's terms also in b)"""
+        small, large = (a, b) if len(a[0]) <= len(b[0]) else (b, a)
+        dot = 0
+        shared = 0
+        for term, count in small[0].items():
+            other = large[0].get(term, 0)
+            dot += count * other
+            shared += min(count, other)
+        return dot / (a[1] * b[1]), shared / max(sum(a[0].values()), 1)
+
+    def pack(self, hits: List[Tuple[Document, float]]) -> Tuple[List[Tuple[Document, float]], Dict[str, Any]]:
+        """
+        Build the context for ranked hits
+
+        Args:
+            hits: (chunk, retrieval score) pairs, best first
+
+        Returns:
+            (passage, score of its best chunk) pairs in the order they go
+            into the prompt, and packing stats
+        """
+        passages = self._merge_neighbours(hits)
+        vectors = [self._term_vector(doc.page_content) for doc, _ in passages]
+        # Relevance from the retrieval order, which means the same for
+        # L2 distances (lower is better) and fused scores (higher is better)
+        relevance = [1 - rank / max(len(passages), 1) for rank in range(len(passages))]
+
+        selected: List[int] = []
+        redundancy = [0.0] * len(passages)
+        coverage = [0.0] * len(passages)
+        remaining = list(range(len(passages)))
+        duplicates = 0
+        over_budget = 0
+        used_tokens = 0
+        while remaining:
+            best = max(
+                remaining,
+                key=lambda i: self.mmr_lambda * relevance[i] - (1 - self.mmr_lambda) * redundancy[i]
+            )
+            remaining.remove(best)
+            if coverage[best] >= self.duplicate_threshold:
+                duplicates += 1
+                continue
+
+            doc = passages[best][0]
+            tokens = self.count_tokens(doc.page_content) + (self.count_tokens(DOCUMENT_SEPARATOR) if selected else 0)
+            if self.token_budget and used_tokens + tokens > self.token_budget:
+                if selected:
+                    # Smaller passages further down may still fit
+                    over_budget += 1
+                    continue
+                # The best passage alone is over budget: send what fits of it
+                doc.page_content = self._truncate(doc.page_content, self.token_budget)
+                tokens = self.count_tokens(doc.page_content)
+
+            selected.append(best)
+            used_tokens += tokens
+            for i in remaining:
+                cosine, covered = self._similarity(vectors[i], vectors[best])
+                redundancy[i] = max(redundancy[i], cosine)
+                coverage[i] = max(coverage[i], covered)
+
+        packed = [passages[i] for i in selected]
+        with self._lock:
+            self.packs += 1
+            self.chunks_retrieved += len(hits)
+            self.chunks_merged += len(hits) - len(passages)
+            self.duplicates_dropped += duplicates
+            self.over_budget_dropped += over_budget
+            self.context_tokens += used_tokens
+        return packed, {
+            "chunks_retrieved": len(hits),
+            "passages": len(passages),
+            "chunks_merged": len(hits) - len(passages),
+            "duplicates_dropped": duplicates,
+            "over_budget_dropped": over_budget,
+            "passages_packed": len(packed),
+            "context_tokens": used_tokens,
+            "token_budget": self.token_budget
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "token_budget": self.token_budget,
+                "tokenizer": self.encoding.name if self.encoding is not None else "estimate",
+                "packs": self.packs,
+                "chunks_retrieved": self.chunks_retrieved,
+                "chunks_merged": self.chunks_merged,
+                "duplicates_dropped": self.duplicates_dropped,
+                "over_budget_dropped": self.over_budget_dropped,
+                "avg_context_tokens": self.context_tokens / self.packs if self.packs else 0.0
+            }
@@ -0,0 +1,660 @@
+"""
+Course Index
+One FAISS index per course holding the chunks of all its vectorized materials,
+so a question across a course's materials is a single (filtered) index search
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Optional, Any, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.services.vector_store_io import load_vector_store, save_vector_store
+from app.services.vector_store_cache import VectorStoreCache, estimate_store_bytes
+from app.services.bounded_executor import BoundedExecutor
+from app.services.ann_index import (
+    build_index,
+    choose_index_type,
+    has_exact_vectors,
+    index_type_of,
+    optimize_vector_store,
+    reconstruct_vectors,
+    search_subset
+)
+from app.services.lexical_index import LexicalIndex, hybrid_search_candidates, store_lexical_index
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Written next to the index and docstore files in every course index directory
+COURSE_MANIFEST_FILE = "course.json"
+
+
+def _owner_key(material_id: str, generation: int) -> str:
+    """Prefix of the vector IDs added for one version of a material"""
+    return f"{material_id}:{generation}"
+
+
+def _manifest_version(path: Path) -> Optional[Tuple[int, int]]:
+    """
+    (inode, mtime in ns) of a course index's manifest, or None if there is
+    none; the manifest is replaced last on every save
+    """
+    try:
+        stat = (path / COURSE_MANIFEST_FILE).stat()
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+class _FileLock:
+    """
+    Exclusive lock on a file, held across processes: every uvicorn worker
+    runs its own ingestion queue, so several may update one course index
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("a+b")
+        self._file.seek(0)
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue  # LK_LOCK gives up after 10 attempts; keep waiting
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+class CourseIndex:
+    """
+    FAISS index over every material of one course
+
+    Each vector carries the material_id of the material it belongs to.
+    Removing a material only hides its vectors (a tombstone); compact()
+    physically drops hidden vectors once enough of them accumulate.
+    Re-adding a material writes a new generation of vectors, so updates
+    never need an in-place delete either.
+
+    Other processes may save the same index: readers reload it when its
+    manifest changes (refresh), and writers hold locked() so they change
+    the latest version and never overwrite each other. Readers load it
+    read-only (memory-mapped, chunk text read lazily); writers load a
+    private heap copy.
+    """
+
+    def __init__(
+        self,
+        course_id: str,
+        path: Path,
+        embeddings: Embeddings,
+        embedding_id: str,
+        target_recall: float,
+        mmap: bool = False
+    ):
+        self.course_id = course_id
+        self.path = path
+        self.embeddings = embeddings
+        self.embedding_id = embedding_id
+        self.target_recall = target_recall
+        self.mmap = mmap
+
+        self.store: Optional[FAISS] = None
+        # material_id -> {"generation", "store_id", "num_chunks"} for live materials
+        self.materials: Dict[str, Dict[str, Any]] = {}
+        # Owner keys whose vectors are hidden until the next compaction
+        self.tombstones: Dict[str, int] = {}
+        self.compacted_at: Optional[str] = None
+        # Type, parameters and measured recall/latency of the current index
+        self.index_report: Optional[Dict[str, Any]] = None
+        # _manifest_version() of the files loaded (or last saved) here
+        self.version: Optional[Tuple[int, int]] = None
+        # False while the store is loaded read-only (see locked())
+        self.writable = False
+
+        # Owner key -> FAISS positions, rebuilt whenever positions move
+        self._positions: Dict[str, np.ndarray] = {}
+        self._lock = threading.RLock()
+        self._file_lock = _FileLock(path.with_suffix(".lock"))
+
+        self._load()
+
+    def _load(self, writable: bool = False):
+        self.writable = writable
+        self.store = None
+        self.materials = {}
+        self.tombstones = {}
+        self.compacted_at = None
+        self.index_report = None
+        self._positions = {}
+
+        # Read first: a save landing during the load shows up as a change next time
+        self.version = _manifest_version(self.path)
+        if self.version is None:
+            return
+        try:
+            with (self.path / COURSE_MANIFEST_FILE).open() as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            # Deleted (e.g. rebuilt for another model) since the version was read
+            self.version = None
+            return
+
+        if manifest.get("embedding_model") != self.embedding_id:
+            # Vectors from another model can't be mixed with new ones; start over
+            print(f"⚠️  Course index {self.course_id} was built with another embedding model; rebuilding")
+            shutil.rmtree(self.path, ignore_errors=True)
+            return
+
+        self.store = load_vector_store(
+            self.path,
+            self.embeddings,
+            mmap=self.mmap and not writable,
+            lazy_docstore=not writable
+        )
+        if self.store.lexical_index is None:
+            # Built before course indexes had one; saved with the next change
+            self.store.lexical_index = LexicalIndex.from_store(self.store)
+        self.materials = manifest.get("materials", {})
+        self.tombstones = manifest.get("tombstones", {})
+        self.compacted_at = manifest.get("compacted_at")
+        self.index_report = manifest.get("index")
+        self._rebuild_positions()
+
+    def refresh(self) -> bool:
+        """
+        Reload the index if another process saved it since it was loaded
+
+        Returns:
+            True if it was reloaded
+        """
+        with self._lock:
+            if _manifest_version(self.path) == self.version:
+                return False
+            self._load()
+            return True
+
+    @contextmanager
+    def locked(self):
+        """
+        Hold the index exclusively, across processes, with the latest saved
+        version loaded; changes made inside should be saved before leaving
+        """
+        with self._lock, self._file_lock:
+            if not self.writable or _manifest_version(self.path) != self.version:
+                # Changes are made in place: mapped indexes and lazy docstores are read-only
+                self._load(writable=True)
+            try:
+                yield self
+            except BaseException:
+                # Don't keep serving changes that never reached disk
+                self._load()
+                raise
+
+    def save(self):
+        """Write the index and its manifest"""
+        with self._lock:
+            if self.store is None:
+                return
+            save_vector_store(self.store, self.path)
+            # Replaced, not rewritten: a crash never leaves a truncated
+            # manifest, and the new inode tells other processes to reload
+            temp_path = self.path / f"{COURSE_MANIFEST_FILE}.tmp"
+            with temp_path.open("w") as f:
+                json.dump({
+                    "course_id": self.course_id,
+                    "embedding_model": self.embedding_id,
+                    "materials": self.materials,
+                    "tombstones": self.tombstones,
+                    "compacted_at": self.compacted_at,
+                    "index": self.index_report,
+                    "updated_at": datetime.utcnow().isoformat()
+                }, f, indent=2)
+            os.replace(temp_path, self.path / COURSE_MANIFEST_FILE)
+            self.version = _manifest_version(self.path)
+
+    def _rebuild_positions(self):
+        positions: Dict[str, List[int]] = {}
+        if self.store is not None:
+            for position, doc_id in self.store.index_to_docstore_id.items():
+                positions.setdefault(doc_id.rsplit(":", 1)[0], []).append(position)
+        self._positions = {
+            owner: np.asarray(owner_positions, dtype=np.int64)
+            for owner, owner_positions in positions.items()
+        }
+
+    def resident_bytes(self) -> int:
+        """Estimated memory held by the loaded index (see estimate_store_bytes)"""
+        with self._lock:
+            return estimate_store_bytes(self.store) if self.store is not None else 0
+
+    @property
+    def total_vectors(self) -> int:
+        return self.store.index.ntotal if self.store is not None else 0
+
+    @property
+    def tombstoned_vectors(self) -> int:
+        return sum(self.tombstones.values())
+
+    def add_material(
+        self,
+        material_id: str,
+        store_id: str,
+        source: FAISS,
+        metadata: Dict = None
+    ) -> int:
+        """
+        Copy a material's vectors from its own store into the course index
+
+        The vectors are read back from the source index, so nothing is
+        re-embedded unless the source stores compressed vectors. A previous
+        version of the material is tombstoned.
+
+        Args:
+            material_id: Material the vectors belong to
+            store_id: Vector store the material was vectorized into
+            source: That vector store
+            metadata: Metadata overriding the source chunks' metadata (title, ...)
+
+        Returns:
+            Number of vectors added
+        """
+        with self._lock:
+            self._tombstone(material_id)
+
+            previous = max(
+                [int(owner.rsplit(":", 1)[1]) for owner in self.tombstones if owner.rsplit(":", 1)[0] == material_id],
+                default=-1
+            )
+            generation = previous + 1
+            owner = _owner_key(material_id, generation)
+
+            count = source.index.ntotal
+            chunk_ids = [source.index_to_docstore_id[position] for position in range(count)]
+            docs = [source.docstore.search(chunk_id) for chunk_id in chunk_ids]
+            if has_exact_vectors(source.index):
+                vectors = reconstruct_vectors(source.index)
+            else:
+                # Compressed store: decoded vectors are approximate, so embed
+                # the chunks again (embedding cache hits) for full precision
+                vectors = self.embeddings.embed_documents([doc.page_content for doc in docs])
+            text_embeddings = []
+            metadatas = []
+            ids = []
+            for chunk_id, doc, vector in zip(chunk_ids, docs, vectors):
+                text_embeddings.append((doc.page_content, vector))
+                metadatas.append({**doc.metadata, **(metadata or {}), "material_id": material_id})
+                ids.append(f"{owner}:{chunk_id}")
+
+            if text_embeddings:
+                texts = [text for text, _ in text_embeddings]
+                if self.store is None:
+                    self.store = FAISS.from_embeddings(
+                        text_embeddings,
+                        self.embeddings,
+                        metadatas=metadatas,
+                        ids=ids
+                    )
+                    self.store.lexical_index = LexicalIndex.build(ids, texts)
+                else:
+                    lexical = store_lexical_index(self.store)
+                    self.store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+                    if lexical is None:
+                        self.store.lexical_index = LexicalIndex.from_store(self.store)
+                    else:
+                        # New vectors are appended, so their postings are too
+                        all_ids = [doc_id for _, doc_id in sorted(self.store.index_to_docstore_id.items())]
+                        self.store.lexical_index = lexical.extend(all_ids, texts)
+
+                # Switch to an ANN index once the course outgrows the current type
+                if choose_index_type(self.total_vectors) != index_type_of(self.store.index):
+                    self.index_report = optimize_vector_store(self.store, self.target_recall)
+
+            self.materials[material_id] = {
+                "generation": generation,
+                "store_id": store_id,
+                "num_chunks": count
+            }
+            self._rebuild_positions()
+            return count
+
+    def remove_material(self, material_id: str) -> bool:
+        """
+        Hide a material's vectors from searches
+
+        Returns:
+            True if the material was in the index
+        """
+        with self._lock:
+            return self._tombstone(material_id)
+
+    def _tombstone(self, material_id: str) -> bool:
+        entry = self.materials.pop(material_id, None)
+        if entry is None:
+            return False
+        owner = _owner_key(material_id, entry["generation"])
+        if owner in self._positions:
+            self.tombstones[owner] = len(self._positions[owner])
+        return True
+
+    def needs_compaction(self, min_ratio: float) -> bool:
+        """True if at least min_ratio of the stored vectors are tombstoned"""
+        total = self.total_vectors
+        return total > 0 and self.tombstoned_vectors / total >= min_ratio
+
+    def compact(self) -> int:
+        """
+        Physically delete tombstoned vectors
+
+        Returns:
+            Number of vectors removed
+        """
+        with self._lock:
+            if not self.tombstones:
+                return 0
+
+            removed_ids = []
+            if self.store is not None:
+                # Rebuild from the kept vectors: works for every index type
+                # (HNSW can't remove vectors in place) and re-picks the type
+                keep = []
+                for position, doc_id in sorted(self.store.index_to_docstore_id.items()):
+                    if doc_id.rsplit(":", 1)[0] in self.tombstones:
+                        removed_ids.append(doc_id)
+                    else:
+                        keep.append(position)
+
+                if removed_ids:
+                    vectors = reconstruct_vectors(self.store.index, np.asarray(keep, dtype=np.int64))
+                    self.store.index, self.index_report = build_index(vectors, self.target_recall)
+                    self.store.docstore.delete(removed_ids)
+                    self.store.index_to_docstore_id = {
+                        new_position: self.store.index_to_docstore_id[old_position]
+                        for new_position, old_position in enumerate(keep)
+                    }
+                    self.store.lexical_index = LexicalIndex.from_store(self.store)
+
+            self.tombstones = {}
+            self.compacted_at = datetime.utcnow().isoformat()
+            self._rebuild_positions()
+            return len(removed_ids)
+
+    def search(
+        self,
+        embedding: List[float],
+        k: int,
+        material_ids: Optional[List[str]] = None,
+        query: Optional[str] = None,
+        lexical_weight: float = 0.3,
+        candidates: int = 50
+    ) -> List[Tuple[Document, float]]:
+        """
+        Nearest chunks, optionally restricted to some materials
+
+        Args:
+            embedding: Query vector
+            k: Number of chunks to return
+            material_ids: Only search these materials (default: all live materials)
+            query: Question text; if given, BM25 candidates are returned
+                too, to be fused with other searches (see lexical_index.fuse_hits)
+            lexical_weight, candidates: Fusion parameters (see hybrid_search)
+
+        Returns:
+            (document, L2 distance) pairs, closest first; with a query,
+            (document, cosine similarity, BM25 score) candidates
+        """
+        with self._lock:
+            self.refresh()
+            if self.store is None:
+                return []
+
+            wanted = self.materials.keys() if material_ids is None else [
+                material_id for material_id in material_ids if material_id in self.materials
+            ]
+            owners = [
+                _owner_key(material_id, self.materials[material_id]["generation"])
+                for material_id in wanted
+            ]
+            allowed = [self._positions[owner] for owner in owners if owner in self._positions]
+            if not allowed:
+                return []
+            allowed = np.concatenate(allowed)
+            if len(allowed) == self.total_vectors:
+                allowed = None
+
+            if query is not None:
+                return hybrid_search_candidates(self.store, query, embedding, k, lexical_weight, candidates, allowed)
+
+            query_vector = np.asarray([embedding], dtype=np.float32)
+            if allowed is None:
+                distances, positions = self.store.index.search(query_vector, min(k, self.total_vectors))
+            else:
+                distances, positions = search_subset(self.store.index, query_vector, min(k, len(allowed)), allowed)
+
+            results = []
+            for distance, position in zip(distances[0], positions[0]):
+                if position == -1:
+                    continue
+                doc = self.store.docstore.search(self.store.index_to_docstore_id[int(position)])
+                # Copy: callers annotate results
+                results.append((
+                    Document(page_content=doc.page_content, metadata=dict(doc.metadata)),
+                    float(distance)
+                ))
+            return results
+
+    def live_materials(self) -> Dict[str, Dict[str, Any]]:
+        """Live materials of the latest saved version"""
+        with self._lock:
+            self.refresh()
+            return dict(self.materials)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "materials": len(self.materials),
+                "total_vectors": self.total_vectors,
+                "tombstoned_vectors": self.tombstoned_vectors,
+                "compacted_at": self.compacted_at,
+                "index": self.index_report
+            }
+
+
+class CourseIndexManager:
+    """Loads course indexes on demand and keeps them in step with their materials"""
+
+    def __init__(
+        self,
+        path: Path,
+        embeddings: Embeddings,
+        embedding_id: str,
+        compact_ratio: float,
+        target_recall: float,
+        cache: VectorStoreCache,
+        executor: Optional[BoundedExecutor] = None,
+        mmap: bool = False
+    ):
+        self.path = path
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.embeddings = embeddings
+        self.embedding_id = embedding_id
+        self.compact_ratio = compact_ratio
+        self.target_recall = target_recall
+        # Loaded indexes share the material stores' memory budget (and LRU
+        # eviction), under "course:<course_id>" keys
+        self.cache = cache
+        # Runs searches and loads on the query path (default: asyncio.to_thread)
+        self.executor = executor
+        # Memory-map indexes loaded for reading
+        self.mmap = mmap
+
+        self._lock = threading.Lock()
+
+    def _index_path(self, course_id: str) -> Path:
+        if re.fullmatch(r"[A-Za-z0-9_-]{1,64}", course_id):
+            return self.path / f"{course_id}.faiss"
+        return self.path / f"{hashlib.sha256(course_id.encode('utf-8')).hexdigest()}.faiss"
+
+    def get(self, course_id: str) -> CourseIndex:
+        """Get or load the index of a course (blocking), reloaded if another process saved it"""
+        with self._lock:
+            index = self.cache.get(f"course:{course_id}")
+            if index is None:
+                index = CourseIndex(
+                    course_id,
+                    self._index_path(course_id),
+                    self.embeddings,
+                    self.embedding_id,
+                    self.target_recall,
+                    mmap=self.mmap
+                )
+                self._charge(index)
+                return index
+        if index.refresh():
+            self._charge(index)
+        return index
+
+    def _charge(self, index: CourseIndex):
+        """(Re-)add an index to the cache at its current size"""
+        self.cache.put(f"course:{index.course_id}", index, index.resident_bytes())
+
+    def _course_ids_on_disk(self) -> List[str]:
+        course_ids = []
+        for manifest_path in self.path.glob(f"*.faiss/{COURSE_MANIFEST_FILE}"):
+            with manifest_path.open() as f:
+                course_ids.append(json.load(f)["course_id"])
+        return course_ids
+
+    async def _run_query(self, func, *args):
+        """Run query-path work on the query executor if there is one"""
+        if self.executor is not None:
+            return await self.executor.run(func, *args)
+        return await asyncio.to_thread(func, *args)
+
+    async def add_material(
+        self,
+        course_id: str,
+        material_id: str,
+        store_id: str,
+        source: FAISS,
+        metadata: Dict = None
+    ) -> int:
+        """Add or refresh a material in its course index"""
+        def add():
+            with self.get(course_id).locked() as index:
+                count = index.add_material(material_id, store_id, source, metadata)
+                index.save()
+            self._charge(index)
+            return count
+
+        return await asyncio.to_thread(add)
+
+    async def remove_material(self, material_id: str, course_id: Optional[str] = None) -> bool:
+        """
+        Remove a material from its course index
+
+        Args:
+            material_id: Material to remove
+            course_id: Its course; every course index is checked if unknown
+        """
+        def remove():
+            course_ids = [course_id] if course_id else self._course_ids_on_disk()
+            removed = False
+            for cid in course_ids:
+                with self.get(cid).locked() as index:
+                    if index.remove_material(material_id):
+                        if index.needs_compaction(self.compact_ratio):
+                            index.compact()
+                        index.save()
+                        removed = True
+                self._charge(index)
+            return removed
+
+        return await asyncio.to_thread(remove)
+
+    async def search(
+        self,
+        course_id: str,
+        embedding: List[float],
+        k: int,
+        material_ids: Optional[List[str]] = None,
+        query: Optional[str] = None,
+        lexical_weight: float = 0.3,
+        candidates: int = 50
+    ) -> List[Tuple]:
+        """Filtered search of one course index (see CourseIndex.search)"""
+        def search():
+            return self.get(course_id).search(embedding, k, material_ids, query, lexical_weight, candidates)
+
+        return await self._run_query(search)
+
+    async def indexed_materials(self, course_id: str) -> Dict[str, Dict[str, Any]]:
+        """Live materials of a course index"""
+        index = await self._run_query(self.get, course_id)
+        return await self._run_query(index.live_materials)
+
+    async def compact(self, min_ratio: Optional[float] = None) -> Dict[str, int]:
+        """
+        Compact every course index with enough tombstoned vectors
+
+        Args:
+            min_ratio: Tombstoned fraction that triggers compaction (default: configured ratio)
+
+        Returns:
+            Vectors removed per course
+        """
+        min_ratio = self.compact_ratio if min_ratio is None else min_ratio
+
+        def compact():
+            removed = {}
+            for course_id in self._course_ids_on_disk():
+                with self.get(course_id).locked() as index:
+                    if index.tombstones and index.needs_compaction(min_ratio):
+                        removed[course_id] = index.compact()
+                        index.save()
+                self._charge(index)
+            return removed
+
+        return await asyncio.to_thread(compact)
+
+    def stats(self) -> Dict[str, Any]:
+        """Stats of the loaded course indexes"""
+        return {
+            index.course_id: index.stats()
+            for key, index in self.cache.items()
+            if key.startswith("course:")
+        }
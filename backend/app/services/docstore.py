@@ -0,0 +1,165 @@
+"""
+Chunk Docstore
+Compact on-disk format for the chunks of a vector store: an offsets table plus a
+blob of (optionally zstd-compressed) blocks, read lazily one block at a time
+"""
+
+import json
+import mmap
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Tuple, Union
+
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+
+DOCSTORE_INDEX_FILE = "docstore.idx"
+# Each save writes a new data file, named in the index file, so a reader never
+# pairs an index with a blob from a different save
+DOCSTORE_DATA_PATTERN = "docstore-*.bin"
+DOCSTORE_FORMAT = 1
+
+# Decoded blocks kept per docstore; a top-k result often hits the same block twice
+BLOCK_CACHE_SIZE = 8
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise Exception(
+            "zstd-compressed docstores require the zstandard package (pip install zstandard)"
+        )
+    return zstandard
+
+
+def write_docstore(
+    store_path: Path,
+    documents: List[Tuple[str, Document]],
+    compression: str = "none",
+    block_size: int = 16
+) -> List[Path]:
+    """
+    Write chunks in index order
+
+    Args:
+        store_path: Store directory
+        documents: (docstore ID, document) for every vector, in index position order
+        compression: "none" or "zstd" (per block)
+        block_size: Chunks per block
+
+    Returns:
+        The files written: the data file first, the index file last
+    """
+    if compression not in ("none", "zstd"):
+        raise Exception(f"Unknown docstore compression '{compression}'")
+    compressor = _zstd().ZstdCompressor(level=3) if compression == "zstd" else None
+
+    data_file = DOCSTORE_DATA_PATTERN.replace("*", uuid.uuid4().hex)
+    offsets = []
+    offset = 0
+    with (store_path / data_file).open("wb") as f:
+        for start in range(0, len(documents), block_size):
+            block = json.dumps(
+                [[doc.page_content, doc.metadata] for _, doc in documents[start:start + block_size]],
+                ensure_ascii=False,
+                separators=(",", ":")
+            ).encode("utf-8")
+            if compressor is not None:
+                block = compressor.compress(block)
+            f.write(block)
+            offsets.append([offset, len(block)])
+            offset += len(block)
+
+    with (store_path / DOCSTORE_INDEX_FILE).open("w") as f:
+        json.dump({
+            "format": DOCSTORE_FORMAT,
+            "data_file": data_file,
+            "compression": compression,
+            "block_size": block_size,
+            "ids": [doc_id for doc_id, _ in documents],
+            "blocks": offsets
+        }, f, separators=(",", ":"))
+    return [store_path / data_file, store_path / DOCSTORE_INDEX_FILE]
+
+
+class LazyDocstore(Docstore):
+    """
+    Read-only docstore over write_docstore files
+
+    Only the ID table is loaded; chunk text is read from a memory-mapped
+    blob when a search returns it.
+    """
+
+    def __init__(self, store_path: Path):
+        with (store_path / DOCSTORE_INDEX_FILE).open() as f:
+            header = json.load(f)
+        if header.get("format") != DOCSTORE_FORMAT:
+            raise Exception(f"Unsupported docstore format {header.get('format')}")
+
+        self.ids: List[str] = header["ids"]
+        self.positions: Dict[str, int] = {doc_id: position for position, doc_id in enumerate(self.ids)}
+        self.block_size: int = header["block_size"]
+        self.blocks: List[List[int]] = header["blocks"]
+
+        self._decompressor = _zstd().ZstdDecompressor() if header["compression"] == "zstd" else None
+        self._data = None
+        data_path = store_path / header["data_file"]
+        if data_path.stat().st_size > 0:
+            with data_path.open("rb") as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._block_cache: "OrderedDict[int, list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _read_block(self, block_number: int) -> list:
+        with self._lock:
+            block = self._block_cache.get(block_number)
+            if block is not None:
+                self._block_cache.move_to_end(block_number)
+                return block
+
+        offset, length = self.blocks[block_number]
+        raw = self._data[offset:offset + length]
+        if self._decompressor is not None:
+            raw = self._decompressor.decompress(raw)
+        block = json.loads(raw)
+
+        with self._lock:
+            self._block_cache[block_number] = block
+            while len(self._block_cache) > BLOCK_CACHE_SIZE:
+                self._block_cache.popitem(last=False)
+        return block
+
+    def search(self, search: str) -> Union[str, Document]:
+        position = self.positions.get(search)
+        if position is None:
+            return f"ID {search} not found."
+        page_content, metadata = self._read_block(position // self.block_size)[position % self.block_size]
+        return Document(id=search, page_content=page_content, metadata=metadata)
+
+    def delete(self, ids: List) -> None:
+        raise NotImplementedError("LazyDocstore is read-only; load the store with lazy_docstore=False to modify it")
+
+    def to_memory(self) -> InMemoryDocstore:
+        """Read every chunk into a mutable InMemoryDocstore"""
+        documents = {}
+        for block_number in range(len(self.blocks)):
+            block = self._read_block(block_number)
+            for i, (page_content, metadata) in enumerate(block):
+                doc_id = self.ids[block_number * self.block_size + i]
+                documents[doc_id] = Document(id=doc_id, page_content=page_content, metadata=metadata)
+        return InMemoryDocstore(documents)
+
+    def resident_bytes(self) -> int:
+        """Approximate heap use: the ID table and cached blocks"""
+        with self._lock:
+            cached = sum(len(str(block)) for block in self._block_cache.values())
+        return sum(len(doc_id) * 2 + 16 for doc_id in self.ids) + len(self.blocks) * 16 + cached
+
+    def __len__(self) -> int:
+        return len(self.ids)
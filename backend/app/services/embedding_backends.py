@@ -0,0 +1,187 @@
+"""
+Embedding Backends
+Interchangeable CPU implementations of the sentence embedding model, selected via Settings
+"""
+
+import os
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+from app.core.config import settings
+
+
+class EmbeddingBackend(Embeddings):
+    """Base class for embedding backends"""
+
+    # Identifies the numeric output of a backend; vectors from backends with
+    # different IDs are not mixed in caches or incremental index updates
+    backend_name: str = ""
+
+    def __init__(self, model_name: str, batch_size: int):
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+    @property
+    def embedding_id(self) -> str:
+        return f"{self.model_name}#{self.backend_name}"
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed several questions in one forward pass (the models are symmetric: queries embed like documents)"""
+        return self.embed_documents(texts)
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """PyTorch sentence-transformers model (float32)"""
+
+    backend_name = "sentence-transformers"
+
+    def __init__(self, model_name: str, batch_size: int):
+        super().__init__(model_name, batch_size)
+        self.embeddings = HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={
+                'normalize_embeddings': True,
+                'batch_size': batch_size
+            }
+        )
+
+    @property
+    def embedding_id(self) -> str:
+        # Original backend: keep IDs stable for caches and stores built before backends existed
+        return self.model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+class OnnxInt8Backend(EmbeddingBackend):
+    """
+    Same model exported to ONNX with dynamically quantized int8 weights
+
+    The model is exported and quantized once into ONNX_MODEL_DIR; later
+    startups load the quantized file directly.
+    """
+
+    backend_name = "onnx-int8"
+
+    def __init__(self, model_name: str, batch_size: int, model_dir: str, num_threads: int = 0):
+        super().__init__(model_name, batch_size)
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError:
+            raise Exception(
+                "The onnx-int8 embedding backend requires onnxruntime, optimum and transformers "
+                "(pip install optimum[onnxruntime])"
+            )
+
+        model_path = Path(model_dir) / model_name.replace("/", "__")
+        quantized_file = model_path / "model_quantized.onnx"
+        if not quantized_file.exists():
+            self._export_quantized(model_name, model_path)
+
+        session_options = ort.SessionOptions()
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session_options.intra_op_num_threads = num_threads or os.cpu_count() or 1
+
+        self.session = ort.InferenceSession(
+            str(quantized_file),
+            sess_options=session_options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_path))
+        self.max_length = min(self.tokenizer.model_max_length, 256)  # MiniLM was trained on 256 tokens
+
+    @staticmethod
+    def _export_quantized(model_name: str, model_path: Path):
+        """Export the Hugging Face model to ONNX and quantize its weights to int8"""
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        from transformers import AutoTokenizer
+
+        print(f"⏳ Exporting {model_name} to ONNX (one-time)...")
+        model_path.mkdir(parents=True, exist_ok=True)
+        ORTModelForFeatureExtraction.from_pretrained(model_name, export=True).save_pretrained(model_path)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(model_path)
+
+        quantize_dynamic(
+            model_input=str(model_path / "model.onnx"),
+            model_output=str(model_path / "model_quantized.onnx"),
+            weight_type=QuantType.QInt8
+        )
+        print(f"✅ Quantized ONNX model saved to {model_path}")
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = [text.replace("\n", " ") for text in texts[start:start + self.batch_size]]
+            encoded = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            inputs = {
+                name: encoded[name].astype(np.int64)
+                for name in self.input_names
+                if name in encoded
+            }
+            token_embeddings = self.session.run(None, inputs)[0]
+
+            # Mean pooling over real tokens, then L2 normalization (as sentence-transformers does)
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.append(pooled)
+        return np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
+
+
+EMBEDDING_BACKENDS = {
+    SentenceTransformerBackend.backend_name: SentenceTransformerBackend,
+    OnnxInt8Backend.backend_name: OnnxInt8Backend,
+}
+
+
+def create_embedding_backend(backend_name: str, model_name: str, batch_size: int) -> EmbeddingBackend:
+    """
+    Build the embedding backend selected in Settings
+
+    Args:
+        backend_name: One of EMBEDDING_BACKENDS
+        model_name: Hugging Face model name
+        batch_size: Texts per forward pass
+
+    Returns:
+        The embedding backend
+    """
+    if backend_name == OnnxInt8Backend.backend_name:
+        return OnnxInt8Backend(
+            model_name,
+            batch_size,
+            model_dir=settings.ONNX_MODEL_DIR,
+            num_threads=settings.ONNX_NUM_THREADS
+        )
+    if backend_name == SentenceTransformerBackend.backend_name:
+        return SentenceTransformerBackend(model_name, batch_size)
+    raise Exception(
+        f"Unknown embedding backend '{backend_name}'. "
+        f"Available: {', '.join(EMBEDDING_BACKENDS)}"
+    )
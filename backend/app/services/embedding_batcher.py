@@ -0,0 +1,177 @@
+"""
+Embedding Batcher
+Central worker that merges chunks from all in-flight ingestions into length-bucketed batches
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+# Items considered per scheduling round, as a multiple of the batch size;
+# sorting a wider window by length gives tighter buckets (less padding)
+BUCKET_WINDOW = 4
+
+
+@dataclass
+class _Request:
+    """One embed_documents call waiting on the batcher"""
+    size: int
+    future: Future = field(default_factory=Future)
+    results: List[Optional[List[float]]] = None
+    remaining: int = 0
+
+    def __post_init__(self):
+        self.results = [None] * self.size
+        self.remaining = self.size
+
+
+@dataclass
+class _Item:
+    text: str
+    request: _Request
+    position: int
+    enqueued_at: float
+
+
+class EmbeddingBatcher:
+    """Runs a single embedding thread fed by every caller"""
+
+    def __init__(self, embeddings: Embeddings, max_batch_size: int, max_wait: float):
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+
+        self._pending: List[_Item] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+        # Metrics
+        self._stats_lock = threading.Lock()
+        self.total_chunks = 0
+        self.total_batches = 0
+        self.total_requests = 0
+        self.busy_seconds = 0.0
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts through the shared batches, blocking until done
+
+        Args:
+            texts: Chunk texts to embed
+
+        Returns:
+            One vector per text, in input order
+        """
+        if not texts:
+            return []
+
+        request = _Request(len(texts))
+        now = time.monotonic()
+        with self._cond:
+            self._ensure_started()
+            self._pending.extend(
+                _Item(text, request, position, now)
+                for position, text in enumerate(texts)
+            )
+            self._cond.notify()
+
+        with self._stats_lock:
+            self.total_requests += 1
+        return request.future.result()
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run,
+                name="embedding-batcher",
+                daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+
+                # Wait for a full batch, but never longer than max_wait for the oldest item
+                deadline = self._pending[0].enqueued_at + self.max_wait
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                window_size = self.max_batch_size * BUCKET_WINDOW
+                window = self._pending[:window_size]
+                del self._pending[:window_size]
+
+            # Oldest items are always in the window; within it, group similar lengths
+            window.sort(key=lambda item: len(item.text))
+            for start in range(0, len(window), self.max_batch_size):
+                self._embed_batch(window[start:start + self.max_batch_size])
+
+    def _embed_batch(self, batch: List[_Item]):
+        started = time.monotonic()
+        try:
+            vectors = self.embeddings.embed_documents([item.text for item in batch])
+        except Exception as e:
+            for request in {id(item.request): item.request for item in batch}.values():
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        finally:
+            with self._stats_lock:
+                self.busy_seconds += time.monotonic() - started
+
+        with self._stats_lock:
+            self.total_chunks += len(batch)
+            self.total_batches += 1
+
+        for item, vector in zip(batch, vectors):
+            request = item.request
+            if request.future.done():
+                continue
+            request.results[item.position] = vector
+            request.remaining -= 1
+            if request.remaining == 0:
+                request.future.set_result(request.results)
+
+    def stats(self) -> Dict[str, Any]:
+        """Throughput since startup"""
+        with self._stats_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queued_chunks": len(self._pending),
+                "total_requests": self.total_requests,
+                "total_chunks": self.total_chunks,
+                "total_batches": self.total_batches,
+                "avg_batch_size": self.total_chunks / self.total_batches if self.total_batches else 0.0,
+                "busy_seconds": self.busy_seconds,
+                "chunks_per_second": self.total_chunks / self.busy_seconds if self.busy_seconds else 0.0
+            }
+
+
+class BatchedEmbeddings(Embeddings):
+    """Embeddings wrapper that routes document embedding through an EmbeddingBatcher"""
+
+    def __init__(self, embeddings: Embeddings, batcher: EmbeddingBatcher):
+        self.embeddings = embeddings
+        self.batcher = batcher
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.batcher.embed(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries are latency-sensitive; don't make them wait for a batch
+        return self.embeddings.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # Already one batch
+        return self.embeddings.embed_queries(texts)
@@ -0,0 +1,409 @@
+"""
+Ingestion Service
+Persistent background queue that vectorizes uploaded materials off the request path
+"""
+
+import asyncio
+from enum import Enum
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from beanie import PydanticObjectId
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from app.core.config import settings
+from app.models.ingestion_job import IngestionJob, IngestionJobStatus
+from app.models.material import Material, VectorizationStatus
+from app.models.content_blob import ContentBlob
+from app.services.pdf_extractor import get_pdf_extractor
+from app.services.rag_service import get_rag_service, material_metadata
+from app.services.store_builder import get_ingestion_process
+
+
+# Vectorization fields mirrored onto a shared ContentBlob
+BLOB_STATUS_FIELDS = {
+    "vectorization_status",
+    "vectorization_job_id",
+    "num_chunks",
+    "page_count",
+    "updated_at",
+}
+
+
+class IngestionService:
+    """Claims vectorization jobs from MongoDB and runs them in the background"""
+
+    def __init__(self):
+        self.num_workers = settings.INGESTION_WORKERS
+        self.poll_interval = settings.INGESTION_POLL_INTERVAL
+        self.max_attempts = settings.INGESTION_MAX_ATTEMPTS
+        self.job_timeout = settings.INGESTION_JOB_TIMEOUT
+        self.heartbeat_interval = settings.INGESTION_HEARTBEAT_INTERVAL
+        self.compaction_interval = settings.COURSE_INDEX_COMPACTION_INTERVAL
+
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """Start the queue consumers"""
+        if self._tasks:
+            return
+
+        self._tasks = [
+            asyncio.create_task(self._worker(i))
+            for i in range(self.num_workers)
+        ]
+        if settings.COURSE_INDEX_ENABLED:
+            self._tasks.append(asyncio.create_task(self._compaction_loop()))
+        print(f"✅ Ingestion queue started with {self.num_workers} workers")
+
+    async def stop(self):
+        """Stop consumers (and compaction); interrupted jobs are reclaimed once their heartbeat is INGESTION_JOB_TIMEOUT old"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        get_pdf_extractor().shutdown()
+        get_ingestion_process().shutdown()
+
+    async def enqueue(
+        self,
+        material_id: str,
+        file_path: str,
+        metadata: Dict = None,
+        content_hash: Optional[str] = None,
+        force: bool = False
+    ) -> Optional[IngestionJob]:
+        """
+        Add a vectorization job to the queue
+
+        Content that is already vectorized (or queued) for another material
+        is shared instead of being processed again.
+
+        Args:
+            material_id: Unique identifier for the material
+            file_path: Path to the uploaded PDF file
+            metadata: Optional metadata attached to every chunk
+            content_hash: SHA-256 of a content-addressed upload
+            force: Re-vectorize even if the content is already vectorized
+                (e.g. after changing CHUNK_SIZE); unchanged chunks are reused
+
+        Returns:
+            The job vectorizing this content, or None if it is already vectorized
+        """
+        if content_hash and not force:
+            blob = await ContentBlob.find_one(ContentBlob.sha256 == content_hash)
+            if blob is not None and blob.vectorization_status == VectorizationStatus.COMPLETED:
+                await self._update_material(
+                    material_id,
+                    vectorization_status=VectorizationStatus.COMPLETED,
+                    vectorization_job_id=blob.vectorization_job_id,
+                    vectorization_error=None,
+                    num_chunks=blob.num_chunks,
+                    page_count=blob.page_count,
+                    vectorized_at=datetime.utcnow()
+                )
+                if ObjectId.is_valid(material_id):
+                    material = await Material.get(PydanticObjectId(material_id))
+                    if material is not None:
+                        await self._index_courses(content_hash, [material])
+                return None
+
+            if blob is not None and blob.vectorization_status in (
+                VectorizationStatus.PENDING, VectorizationStatus.PROCESSING
+            ):
+                job = await self.get_job(blob.vectorization_job_id or "")
+                if job is not None:
+                    await self._update_material(
+                        material_id,
+                        vectorization_status=blob.vectorization_status,
+                        vectorization_job_id=str(job.id),
+                        vectorization_error=None
+                    )
+                    return job
+
+        job = IngestionJob(
+            material_id=material_id,
+            content_hash=content_hash,
+            file_path=file_path,
+            metadata=metadata or {}
+        )
+        await job.insert()
+
+        await self._update_status(
+            job,
+            vectorization_status=VectorizationStatus.PENDING,
+            vectorization_job_id=str(job.id),
+            vectorization_error=None
+        )
+
+        self._wakeup.set()
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[IngestionJob]:
+        """Get a job by ID"""
+        if not ObjectId.is_valid(job_id):
+            return None
+        return await IngestionJob.get(PydanticObjectId(job_id))
+
+    async def _worker(self, worker_id: int):
+        """Consume jobs until cancelled"""
+        while True:
+            try:
+                self._wakeup.clear()
+                job = await self._claim_next_job()
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                await self._process_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️  Ingestion worker {worker_id} error: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _claim_next_job(self) -> Optional[IngestionJob]:
+        """
+        Atomically claim the oldest runnable job
+
+        Jobs left in 'processing' by a crashed worker become claimable again
+        once their last heartbeat (updated_at) is older than the job timeout;
+        a live worker keeps it fresh however long the PDF takes.
+        """
+        now = datetime.utcnow()
+        abandoned_before = now - timedelta(seconds=self.job_timeout)
+        collection = IngestionJob.get_motor_collection()
+
+        # Abandoned jobs that already used every attempt are failed for good
+        await collection.update_many(
+            {
+                "status": IngestionJobStatus.PROCESSING.value,
+                "updated_at": {"$lt": abandoned_before},
+                "attempts": {"$gte": self.max_attempts}
+            },
+            {"$set": {
+                "status": IngestionJobStatus.FAILED.value,
+                "error": "Job timed out",
+                "finished_at": now,
+                "updated_at": now
+            }}
+        )
+
+        raw = await collection.find_one_and_update(
+            {
+                "$or": [
+                    {"status": IngestionJobStatus.PENDING.value},
+                    {
+                        "status": IngestionJobStatus.PROCESSING.value,
+                        "updated_at": {"$lt": abandoned_before}
+                    }
+                ],
+                "attempts": {"$lt": self.max_attempts}
+            },
+            {
+                "$set": {
+                    "status": IngestionJobStatus.PROCESSING.value,
+                    "started_at": now,
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if raw is None:
+            return None
+        return await IngestionJob.get(raw["_id"])
+
+    async def _process_job(self, job: IngestionJob):
+        """Run one claimed job and record the outcome on the job and material"""
+        if job.content_hash:
+            orphaned = await ContentBlob.find_one(ContentBlob.sha256 == job.content_hash) is None
+        else:
+            orphaned = ObjectId.is_valid(job.material_id) and await Material.get(PydanticObjectId(job.material_id)) is None
+        if orphaned:
+            # Material was deleted while the job was queued
+            job.status = IngestionJobStatus.FAILED
+            job.error = "Material no longer exists"
+            job.finished_at = job.updated_at = datetime.utcnow()
+            await job.save()
+            return
+
+        await self._update_status(
+            job,
+            vectorization_status=VectorizationStatus.PROCESSING
+        )
+
+        # Keeps the claim alive for as long as vectorization runs
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            try:
+                # Page extraction fans out to the PDF process pool and chunking,
+                # embedding and indexing run in the ingestion process, so this
+                # worker stays responsive (the service itself may still be
+                # loading its models at startup)
+                rag_service = await asyncio.to_thread(get_rag_service)
+                result = await rag_service.vectorize_material(
+                    material_id=job.content_hash or job.material_id,
+                    file_path=job.file_path,
+                    metadata=dict(job.metadata)
+                )
+            finally:
+                heartbeat.cancel()
+        except Exception as e:
+            error = str(e)
+            retry = job.attempts < self.max_attempts
+            print(f"⚠️  Ingestion job {job.id} failed (attempt {job.attempts}): {error}")
+
+            job.status = IngestionJobStatus.PENDING if retry else IngestionJobStatus.FAILED
+            job.error = error
+            job.updated_at = datetime.utcnow()
+            if not retry:
+                job.finished_at = job.updated_at
+            await job.save()
+
+            await self._update_status(
+                job,
+                vectorization_status=VectorizationStatus.PENDING if retry else VectorizationStatus.FAILED,
+                vectorization_error=error
+            )
+            return
+
+        now = datetime.utcnow()
+        job.status = IngestionJobStatus.COMPLETED
+        job.result = result
+        job.error = None
+        job.finished_at = now
+        job.updated_at = now
+        await job.save()
+
+        await self._update_status(
+            job,
+            vectorization_status=VectorizationStatus.COMPLETED,
+            vectorization_error=None,
+            num_chunks=result.get("num_chunks"),
+            page_count=result.get("num_pages"),
+            vectorized_at=now
+        )
+
+        print(f"✅ Ingestion job {job.id} completed: {result.get('num_chunks')} chunks")
+        
+        if job.content_hash:
+            materials = await Material.find(Material.content_hash == job.content_hash).to_list()
+        elif ObjectId.is_valid(job.material_id):
+            material = await Material.get(PydanticObjectId(job.material_id))
+            materials = [material] if material is not None else []
+        else:
+            materials = []
+        await self._index_courses(job.content_hash or job.material_id, materials)
+
+    async def _heartbeat(self, job: IngestionJob):
+        """Refresh a running job's updated_at so other workers don't reclaim it"""
+        collection = IngestionJob.get_motor_collection()
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                # attempts identifies this claim: a reclaim increments it
+                updated = await collection.update_one(
+                    {
+                        "_id": job.id,
+                        "status": IngestionJobStatus.PROCESSING.value,
+                        "attempts": job.attempts
+                    },
+                    {"$set": {"updated_at": datetime.utcnow()}}
+                )
+            except Exception as e:
+                print(f"⚠️  Heartbeat of ingestion job {job.id} failed: {str(e)}")
+                continue
+            if updated.matched_count == 0:
+                print(f"⚠️  Ingestion job {job.id} was reclaimed by another worker")
+                return
+
+    async def _index_courses(self, store_id: str, materials: List[Material]):
+        """Add freshly vectorized materials to their course indexes"""
+        if not settings.COURSE_INDEX_ENABLED:
+            return
+
+        rag_service = await asyncio.to_thread(get_rag_service)
+        for material in materials:
+            try:
+                await rag_service.index_material_in_course(
+                    material.course_id,
+                    str(material.id),
+                    store_id,
+                    material_metadata(material)
+                )
+            except Exception as e:
+                # The material's own store still serves queries
+                print(f"⚠️  Could not add material {material.id} to course index: {str(e)}")
+
+    async def _compaction_loop(self):
+        """Periodically drop deleted vectors from course indexes"""
+        while True:
+            await asyncio.sleep(self.compaction_interval)
+            try:
+                rag_service = await asyncio.to_thread(get_rag_service)
+                removed = await rag_service.course_indexes.compact()
+                for course_id, count in removed.items():
+                    print(f"✅ Compacted course index {course_id}: removed {count} vectors")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️  Course index compaction failed: {str(e)}")
+
+    async def _update_status(self, job: IngestionJob, **fields):
+        """
+        Record vectorization progress for everything the job serves
+
+        Content-addressed jobs update the shared blob and every material
+        referencing it; other jobs update only their own material.
+        """
+        if not job.content_hash:
+            await self._update_material(job.material_id, **fields)
+            return
+
+        fields = self._encode(fields)
+        await Material.find(Material.content_hash == job.content_hash).update(
+            {"$set": fields}
+        )
+        await ContentBlob.find_one(ContentBlob.sha256 == job.content_hash).update(
+            {"$set": {
+                key: value for key, value in fields.items()
+                if key in BLOB_STATUS_FIELDS
+            }}
+        )
+
+    async def _update_material(self, material_id: str, **fields):
+        """Update vectorization fields on the Material, if it is a stored material"""
+        if not ObjectId.is_valid(material_id):
+            return
+        await Material.find_one(Material.id == PydanticObjectId(material_id)).update(
+            {"$set": self._encode(fields)}
+        )
+
+    @staticmethod
+    def _encode(fields: Dict) -> Dict:
+        """Convert enum values for a raw $set and stamp updated_at"""
+        fields = {
+            key: value.value if isinstance(value, Enum) else value
+            for key, value in fields.items()
+        }
+        fields["updated_at"] = datetime.utcnow()
+        return fields
+
+
+# Singleton instance
+_ingestion_service = None
+
+def get_ingestion_service() -> IngestionService:
+    """Get or create ingestion service singleton"""
+    global _ingestion_service
+    if _ingestion_service is None:
+        _ingestion_service = IngestionService()
+    return _ingestion_service
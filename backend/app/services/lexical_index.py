@@ -0,0 +1,561 @@
+"""
+Lexical Index
+Compact BM25 inverted index over a store's chunks, and score fusion with
+vector search results, so exact terms (course codes, acronyms, formulas)
+are found even when the embedding misses them
+"""
+
+import hashlib
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, List, Dict, Optional, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from app.services.ann_index import reconstruct_vectors, search_subset
+
+
+# Written next to the index and docstore files in every store directory
+LEXICAL_INDEX_FILE = "lexical.npz"
+LEXICAL_INDEX_FORMAT = 1
+
+# BM25 term frequency saturation and document length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Words and numbers, keeping joined forms such as "tcp/ip", "22adc09",
+# "o(n^2)"-style pieces and "x.509" together as one token
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[./+\-^_][a-z0-9]+)*")
+TOKEN_SEPARATORS = re.compile(r"[./+\-^_]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased terms of a text
+
+    Joined tokens are also indexed by their parts, so "TCP/IP" matches
+    questions about "TCP" as well as "TCP/IP".
+    """
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if TOKEN_SEPARATORS.search(token):
+            tokens.extend(part for part in TOKEN_SEPARATORS.split(token) if part)
+    return tokens
+
+
+def ids_fingerprint(ids: Iterable[str]) -> str:
+    """Identifies the chunk order a lexical index was built for"""
+    digest = hashlib.sha256()
+    for doc_id in ids:
+        digest.update(doc_id.encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class LexicalIndex:
+    """
+    BM25 index whose document numbers are the FAISS positions of its store
+
+    Postings are stored CSR style in flat numpy arrays (one offsets array,
+    one array of positions and one of term frequencies), a few bytes per
+    posting instead of a dict of Python lists.
+    """
+
+    def __init__(
+        self,
+        terms: List[str],
+        offsets: np.ndarray,
+        positions: np.ndarray,
+        frequencies: np.ndarray,
+        doc_lengths: np.ndarray,
+        fingerprint: str
+    ):
+        self.term_ids: Dict[str, int] = {term: term_id for term_id, term in enumerate(terms)}
+        self.offsets = offsets
+        self.positions = positions
+        self.frequencies = frequencies
+        self.doc_lengths = doc_lengths
+        self.fingerprint = fingerprint
+
+        self.num_docs = len(doc_lengths)
+        self.avg_doc_length = float(doc_lengths.mean()) if self.num_docs else 0.0
+        doc_freqs = np.diff(offsets).astype(np.float32)
+        # BM25+ style idf, never negative for very common terms
+        self.idf = np.log1p((self.num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+
+    @classmethod
+    def build(cls, ids: List[str], texts: List[str]) -> "LexicalIndex":
+        """
+        Index texts in FAISS position order
+
+        Args:
+            ids: Docstore ID at each position (index_to_docstore_id order)
+            texts: Chunk text at each position
+        """
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for position, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths[position] = sum(counts.values())
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((position, count))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for term_id, term in enumerate(terms):
+            offsets[term_id + 1] = offsets[term_id] + len(postings[term])
+        positions = np.empty(offsets[-1], dtype=np.int32)
+        frequencies = np.empty(offsets[-1], dtype=np.uint16)
+        for term_id, term in enumerate(terms):
+            entries = np.asarray(postings[term], dtype=np.int64)
+            positions[offsets[term_id]:offsets[term_id + 1]] = entries[:, 0]
+            frequencies[offsets[term_id]:offsets[term_id + 1]] = np.minimum(entries[:, 1], np.iinfo(np.uint16).max)
+
+        return cls(terms, offsets, positions, frequencies, doc_lengths, ids_fingerprint(ids))
+
+    def extend(self, ids: List[str], texts: List[str]) -> "LexicalIndex":
+        """
+        New index with texts appended at the next positions
+
+        Postings are merged array-wise, so growing a large index doesn't
+        tokenize its existing texts again.
+
+        Args:
+            ids: Docstore ID at every position, old and new
+            texts: Chunk text at each new position
+        """
+        added = LexicalIndex.build([], texts)
+        old_terms = sorted(self.term_ids, key=self.term_ids.get)
+        new_terms = sorted(added.term_ids, key=added.term_ids.get)
+        terms = sorted(set(old_terms).union(new_terms))
+        merged_ids = {term: term_id for term_id, term in enumerate(terms)}
+        old_map = np.asarray([merged_ids[term] for term in old_terms], dtype=np.int64)
+        new_map = np.asarray([merged_ids[term] for term in new_terms], dtype=np.int64)
+
+        old_counts = np.zeros(len(terms), dtype=np.int64)
+        old_counts[old_map] = np.diff(self.offsets)
+        new_counts = np.zeros(len(terms), dtype=np.int64)
+        new_counts[new_map] = np.diff(added.offsets)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(old_counts + new_counts, out=offsets[1:])
+
+        positions = np.empty(offsets[-1], dtype=np.int32)
+        frequencies = np.empty(offsets[-1], dtype=np.uint16)
+        # Old postings first, then the new ones, so each term stays sorted by position
+        for source, term_map, shift, base in (
+            (self, old_map, 0, offsets[:-1]),
+            (added, new_map, self.num_docs, offsets[:-1] + old_counts)
+        ):
+            term_of_posting = np.repeat(np.arange(len(term_map)), np.diff(source.offsets))
+            rank = np.arange(len(source.positions)) - source.offsets[term_of_posting]
+            destination = base[term_map[term_of_posting]] + rank
+            positions[destination] = source.positions + shift
+            frequencies[destination] = source.frequencies
+
+        return LexicalIndex(
+            terms,
+            offsets,
+            positions,
+            frequencies,
+            np.concatenate([self.doc_lengths, added.doc_lengths]),
+            ids_fingerprint(ids)
+        )
+
+    @classmethod
+    def from_store(cls, vector_store: FAISS) -> "LexicalIndex":
+        """Index every chunk of a vector store"""
+        ids = [doc_id for _, doc_id in sorted(vector_store.index_to_docstore_id.items())]
+        return cls.build(ids, [vector_store.docstore.search(doc_id).page_content for doc_id in ids])
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        allowed: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Best matching positions for a query
+
+        Args:
+            query: Question text
+            k: Number of positions to return
+            allowed: Only return these positions (default: all)
+
+        Returns:
+            (position, BM25 score) pairs, best first; positions without any
+            query term are left out
+        """
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            positions = self.positions[start:end]
+            tf = self.frequencies[start:end].astype(np.float32)
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[positions] / max(self.avg_doc_length, 1e-6))
+            scores[positions] += self.idf[term_id] * tf * (BM25_K1 + 1) / (tf + norm)
+
+        candidates = np.flatnonzero(scores) if allowed is None else allowed[scores[allowed] > 0]
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(position), float(scores[position])) for position in candidates]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate heap use: postings arrays plus the term table"""
+        arrays = self.offsets.nbytes + self.positions.nbytes + self.frequencies.nbytes
+        arrays += self.doc_lengths.nbytes + self.idf.nbytes
+        return arrays + sum(len(term) + 64 for term in self.term_ids)
+
+    def save(self, path: Path):
+        """Write the index (to a temporary file swapped in with os.replace)"""
+        terms = sorted(self.term_ids, key=self.term_ids.get)
+        temp_path = path.with_name(f".{path.name}.tmp")
+        with temp_path.open("wb") as f:
+            np.savez(
+                f,
+                format=np.asarray(LEXICAL_INDEX_FORMAT),
+                fingerprint=np.asarray(self.fingerprint),
+                terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+                offsets=self.offsets,
+                positions=self.positions,
+                frequencies=self.frequencies,
+                doc_lengths=self.doc_lengths
+            )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["LexicalIndex"]:
+        """Read an index written by save, or None if there is none (or it is unreadable)"""
+        if not path.exists():
+            return None
+        try:
+            with np.load(path) as data:
+                if int(data["format"]) != LEXICAL_INDEX_FORMAT:
+                    return None
+                raw_terms = data["terms"].tobytes().decode("utf-8")
+                return cls(
+                    raw_terms.split("\n") if raw_terms else [],
+                    data["offsets"],
+                    data["positions"],
+                    data["frequencies"],
+                    data["doc_lengths"],
+                    str(data["fingerprint"])
+                )
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️  Could not read lexical index {path}: {str(e)}")
+            return None
+
+
+def fuse_scores(
+    vector_scores: Dict[int, float],
+    lexical_scores: Dict[int, float],
+    lexical_weight: float
+) -> List[Tuple[int, float]]:
+    """
+    Weighted sum of vector and lexical scores per position
+
+    Args:
+        vector_scores: Cosine similarity of each candidate to the question
+        lexical_scores: BM25 score of each candidate scaled by the best one
+            among everything ranked together (see lexical_scale), absent if
+            no query term matches
+        lexical_weight: Share of the lexical score, 0 (vector only) to 1
+
+    Returns:
+        (position, fused score) pairs, best first
+    """
+    fused = {
+        position: (1 - lexical_weight) * vector_score + lexical_weight * lexical_scores.get(position, 0.0)
+        for position, vector_score in vector_scores.items()
+    }
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def store_lexical_index(vector_store: FAISS) -> Optional[LexicalIndex]:
+    """The store's lexical index, if it has one matching its current chunks"""
+    lexical = getattr(vector_store, "lexical_index", None)
+    if lexical is None or lexical.num_docs != vector_store.index.ntotal:
+        return None
+    return lexical
+
+
+def _candidates(
+    vector_store: FAISS,
+    query: str,
+    query_vector: np.ndarray,
+    distances: np.ndarray,
+    positions: np.ndarray,
+    fetch_k: int,
+    lexical_weight: float,
+    allowed: Optional[np.ndarray]
+) -> List[Tuple[int, float, float]]:
+    """
+    Candidates of one question from its vector search results (a row of
+    index.search) and its BM25 search
+
+    Returns:
+        (position, cosine similarity, raw BM25 score) triples; BM25 is 0
+        without a term match (or without a lexical index)
+    """
+    # Embeddings are unit length: cosine similarity is 1 - (squared L2) / 2
+    vector_scores = {
+        int(position): 1 - float(distance) / 2
+        for distance, position in zip(distances, positions)
+        if position != -1
+    }
+
+    lexical_scores: Dict[int, float] = {}
+    lexical = store_lexical_index(vector_store)
+    if lexical is not None and lexical_weight > 0:
+        lexical_scores = dict(lexical.search(query, fetch_k, allowed))
+
+        # Lexical matches the vector search didn't return still need their similarity
+        missing = np.asarray([position for position in lexical_scores if position not in vector_scores], dtype=np.int64)
+        if len(missing):
+            vectors = reconstruct_vectors(vector_store.index, missing)
+            missing_distances = ((vectors - query_vector) ** 2).sum(axis=1)
+            vector_scores.update(zip(missing.tolist(), (1 - missing_distances / 2).tolist()))
+
+    return [
+        (position, vector_score, lexical_scores.get(position, 0.0))
+        for position, vector_score in vector_scores.items()
+    ]
+
+
+def lexical_scale(candidate_lists: Iterable[List[Tuple]]) -> float:
+    """
+    Best raw BM25 score among candidates ranked together
+
+    BM25 scores are scaled by it before fusion, so the best lexical match
+    across all stores searched (not of each store) scores 1.
+    """
+    return max((candidate[2] for candidates in candidate_lists for candidate in candidates), default=0.0)
+
+
+def rank_candidates(
+    candidates: List[Tuple[int, float, float]],
+    k: int,
+    lexical_weight: float,
+    scale: float
+) -> List[Tuple[int, float]]:
+    """
+    Fuse candidate scores (see fuse_scores), BM25 scaled by scale (see lexical_scale)
+
+    Returns:
+        The k best (position, fused score) pairs, best first
+    """
+    vector_scores = {position: vector_score for position, vector_score, _ in candidates}
+    lexical_scores = {
+        position: lexical_score / scale
+        for position, _, lexical_score in candidates
+        if scale > 0 and lexical_score > 0
+    }
+    return fuse_scores(vector_scores, lexical_scores, lexical_weight)[:k]
+
+
+def prune_candidates(candidates: List[Tuple[int, float, float]], k: int) -> List[Tuple[int, float, float]]:
+    """
+    Drop candidates that can't be among the k best whatever the BM25 scale
+
+    A candidate at least k others beat on both cosine similarity and BM25
+    score ranks below them under any positive scale, so it is only kept
+    while fewer than k candidates dominate it.
+    """
+    ranked = sorted(candidates, key=lambda candidate: (candidate[1], candidate[2]), reverse=True)
+    kept = []
+    for i, candidate in enumerate(ranked):
+        dominating = sum(1 for other in ranked[:i] if other[2] >= candidate[2])
+        if dominating < k:
+            kept.append(candidate)
+    return kept
+
+
+def hybrid_rank(
+    vector_store: FAISS,
+    query: str,
+    embedding: List[float],
+    k: int,
+    lexical_weight: float,
+    candidates: int,
+    allowed: Optional[np.ndarray] = None
+) -> List[Tuple[int, float]]:
+    """
+    Vector and BM25 search of a store, fused by score
+
+    Candidates come from both searches; each is scored by its cosine
+    similarity to the question plus its BM25 score scaled by the store's
+    best (see fuse_scores). Stores without a lexical index (built before
+    lexical indexes existed) are ranked by vector search alone. To rank
+    hits of several stores together, scale BM25 over all of them instead
+    (see hybrid_search_candidates).
+
+    Args:
+        vector_store: Store to search
+        query: Question text (for BM25)
+        embedding: Question vector
+        k: Number of positions to return
+        lexical_weight: Share of the BM25 score in the fused score, 0 to 1
+        candidates: Positions taken from each search before fusion (at least k)
+        allowed: Only search these positions (default: all)
+
+    Returns:
+        (FAISS position, fused score) pairs, best first
+    """
+    total = vector_store.index.ntotal if allowed is None else len(allowed)
+    fetch_k = min(max(k, candidates), total)
+    if fetch_k == 0:
+        return []
+
+    candidates = _search_candidates(vector_store, query, embedding, fetch_k, lexical_weight, allowed)
+    return rank_candidates(candidates, k, lexical_weight, lexical_scale([candidates]))
+
+
+def _search_candidates(
+    vector_store: FAISS,
+    query: str,
+    embedding: List[float],
+    fetch_k: int,
+    lexical_weight: float,
+    allowed: Optional[np.ndarray]
+) -> List[Tuple[int, float, float]]:
+    query_vector = np.asarray([embedding], dtype=np.float32)
+    if allowed is None:
+        distances, positions = vector_store.index.search(query_vector, fetch_k)
+    else:
+        distances, positions = search_subset(vector_store.index, query_vector, fetch_k, allowed)
+    return _candidates(
+        vector_store, query, query_vector[0], distances[0], positions[0], fetch_k, lexical_weight, allowed
+    )
+
+
+def hybrid_rank_batch(
+    vector_store: FAISS,
+    queries: List[str],
+    embeddings: List[List[float]],
+    k: int,
+    lexical_weight: float,
+    candidates: int
+) -> List[List[Tuple[int, float]]]:
+    """
+    hybrid_rank for several questions, with one matrix search of the index
+    for all of them
+
+    Returns:
+        One list of (FAISS position, fused score) pairs per question, best first
+    """
+    fetch_k = min(max(k, candidates), vector_store.index.ntotal)
+    if fetch_k == 0 or not queries:
+        return [[] for _ in queries]
+
+    query_vectors = np.asarray(embeddings, dtype=np.float32)
+    distances, positions = vector_store.index.search(query_vectors, fetch_k)
+    ranked = []
+    for row, query in enumerate(queries):
+        candidates = _candidates(
+            vector_store, query, query_vectors[row], distances[row], positions[row], fetch_k, lexical_weight, None
+        )
+        ranked.append(rank_candidates(candidates, k, lexical_weight, lexical_scale([candidates])))
+    return ranked
+
+
+def _documents(vector_store: FAISS, ranked: List[Tuple]) -> List[Tuple]:
+    """ranked with each position replaced by (a copy of) its document"""
+    results = []
+    for position, *scores in ranked:
+        doc = vector_store.docstore.search(vector_store.index_to_docstore_id[position])
+        # Copy: callers annotate results
+        results.append((Document(page_content=doc.page_content, metadata=dict(doc.metadata)), *scores))
+    return results
+
+
+def hybrid_search(
+    vector_store: FAISS,
+    query: str,
+    embedding: List[float],
+    k: int,
+    lexical_weight: float,
+    candidates: int,
+    allowed: Optional[np.ndarray] = None
+) -> List[Tuple[Document, float]]:
+    """
+    Best chunks of a store by fused vector and BM25 score (see hybrid_rank)
+
+    Returns:
+        (document, fused score) pairs, best first
+    """
+    return _documents(
+        vector_store, hybrid_rank(vector_store, query, embedding, k, lexical_weight, candidates, allowed)
+    )
+
+
+def hybrid_search_batch(
+    vector_store: FAISS,
+    queries: List[str],
+    embeddings: List[List[float]],
+    k: int,
+    lexical_weight: float,
+    candidates: int
+) -> List[List[Tuple[Document, float]]]:
+    """hybrid_search for several questions (see hybrid_rank_batch)"""
+    return [
+        _documents(vector_store, ranked)
+        for ranked in hybrid_rank_batch(vector_store, queries, embeddings, k, lexical_weight, candidates)
+    ]
+
+
+def hybrid_search_candidates(
+    vector_store: FAISS,
+    query: str,
+    embedding: List[float],
+    k: int,
+    lexical_weight: float,
+    candidates: int,
+    allowed: Optional[np.ndarray] = None
+) -> List[Tuple[Document, float, float]]:
+    """
+    Unfused hybrid search of one of several stores ranked together (see fuse_hits)
+
+    Only candidates that can be among the k best under any BM25 scale are
+    returned (see prune_candidates).
+
+    Returns:
+        (document, cosine similarity, raw BM25 score) triples
+    """
+    total = vector_store.index.ntotal if allowed is None else len(allowed)
+    fetch_k = min(max(k, candidates), total)
+    if fetch_k == 0:
+        return []
+    found = _search_candidates(vector_store, query, embedding, fetch_k, lexical_weight, allowed)
+    return _documents(vector_store, prune_candidates(found, k))
+
+
+def fuse_hits(
+    hit_lists: List[List[Tuple[Document, float, float]]],
+    k: int,
+    lexical_weight: float
+) -> List[Tuple[Document, float]]:
+    """
+    Rank the candidates of several stores (see hybrid_search_candidates)
+    together, with BM25 scaled by the best score among all of them, so
+    the best lexical match of a store only scores 1 if no other store has
+    a better one
+
+    Returns:
+        The k best (document, fused score) pairs, best first
+    """
+    hits = [hit for hits in hit_lists for hit in hits]
+    ranked = rank_candidates(
+        [(i, vector_score, lexical_score) for i, (_, vector_score, lexical_score) in enumerate(hits)],
+        k,
+        lexical_weight,
+        lexical_scale(hit_lists)
+    )
+    return [(hits[i][0], score) for i, score in ranked]
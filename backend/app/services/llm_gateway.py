@@ -0,0 +1,223 @@
+"""
+LLM Gateway
+Admission control for Gemini calls: a global concurrency cap, round-robin
+queuing across users and a bounded queue that sheds load with 429s
+"""
+
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Any, List, Optional
+
+from app.core.config import settings
+
+
+# Upper bounds (seconds) of the wait and call time histogram buckets
+HISTOGRAM_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+
+class GatewayOverloaded(Exception):
+    """The LLM queue is full (or the wait timed out); retry after retry_after seconds"""
+
+    def __init__(self, retry_after: int, detail: str = "Too many AI requests in progress, please retry shortly"):
+        super().__init__(detail)
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style)"""
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last bucket: +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets + [math.inf], self.counts):
+            running += count
+            cumulative.append({"le": "+Inf" if bound == math.inf else bound, "count": running})
+        return {
+            "buckets": cumulative,
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "avg": self.total / self.count if self.count else 0.0
+        }
+
+
+class LLMGateway:
+    """
+    Limits concurrent upstream LLM calls per worker process
+
+    Callers over the cap wait in a per-user queue; freed slots go to users
+    in round-robin order, so one user firing many requests can't starve
+    everyone else. Once max_queue callers are waiting (or max_queue_per_user
+    for one user), new ones are rejected with GatewayOverloaded instead of
+    piling up.
+
+    Runs on the event loop: not thread-safe.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        max_queue_per_user: int,
+        queue_timeout: float
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self.queue_timeout = queue_timeout
+
+        self.active = 0
+        # user -> waiting futures, in round-robin order of users
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._queued = 0
+
+        # Metrics
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.peak_queued = 0
+        self.wait_seconds: Dict[str, Histogram] = {}
+        self.call_seconds: Dict[str, Histogram] = {}
+
+    def _retry_after(self) -> int:
+        """Seconds until a queued caller would likely get a slot"""
+        avg_call = sum(h.total for h in self.call_seconds.values()) / max(
+            sum(h.count for h in self.call_seconds.values()), 1
+        )
+        estimate = (self._queued / max(self.max_concurrency, 1) + 1) * (avg_call or 1.0)
+        return max(1, math.ceil(estimate))
+
+    def _observe(self, histograms: Dict[str, Histogram], endpoint: str, value: float):
+        if endpoint not in histograms:
+            histograms[endpoint] = Histogram(HISTOGRAM_BUCKETS)
+        histograms[endpoint].observe(value)
+
+    async def acquire(self, user: str, endpoint: str):
+        """
+        Wait for a slot
+
+        Raises:
+            GatewayOverloaded: The queue is full, or no slot freed up within queue_timeout
+        """
+        started = time.perf_counter()
+        if self.active < self.max_concurrency and not self._queued:
+            self.active += 1
+        else:
+            if (
+                self._queued >= self.max_queue
+                or len(self._waiters.get(user, ())) >= self.max_queue_per_user
+            ):
+                self.rejected += 1
+                raise GatewayOverloaded(self._retry_after())
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.setdefault(user, deque()).append(waiter)
+            self._queued += 1
+            self.peak_queued = max(self.peak_queued, self._queued)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was handed over just as we gave up: pass it on
+                    self.release()
+                else:
+                    waiter.cancel()
+                    self._remove_waiter(user, waiter)
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timed_out += 1
+                    raise GatewayOverloaded(self._retry_after())
+                raise
+
+        self.admitted += 1
+        self._observe(self.wait_seconds, endpoint, time.perf_counter() - started)
+
+    def _remove_waiter(self, user: str, waiter: asyncio.Future):
+        queue = self._waiters.get(user)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self._queued -= 1
+        if not queue:
+            del self._waiters[user]
+
+    def release(self):
+        """Free a slot, handing it to the next user in round-robin order"""
+        while self._waiters:
+            user, queue = next(iter(self._waiters.items()))
+            waiter = queue.popleft()
+            self._queued -= 1
+            # This user goes to the back of the line
+            del self._waiters[user]
+            if queue:
+                self._waiters[user] = queue
+            if not waiter.done():
+                # The slot moves to the waiter; active stays the same
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, user: Optional[str], endpoint: str) -> AsyncIterator[None]:
+        """Hold a slot for one upstream call"""
+        await self.acquire(user or "anonymous", endpoint)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._observe(self.call_seconds, endpoint, time.perf_counter() - started)
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "max_queue_per_user": self.max_queue_per_user,
+            "active": self.active,
+            "queued": self._queued,
+            "queued_users": len(self._waiters),
+            "peak_queued": self.peak_queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_seconds": {endpoint: h.snapshot() for endpoint, h in self.wait_seconds.items()},
+            "call_seconds": {endpoint: h.snapshot() for endpoint, h in self.call_seconds.items()}
+        }
+
+
+# Singleton instance
+_llm_gateway = None
+_llm_gateway_lock = threading.Lock()
+
+def get_llm_gateway() -> LLMGateway:
+    """Get or create the LLM gateway singleton"""
+    global _llm_gateway
+    if _llm_gateway is None:
+        with _llm_gateway_lock:
+            if _llm_gateway is None:
+                _llm_gateway = LLMGateway(
+                    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+                    max_queue=settings.LLM_MAX_QUEUE,
+                    max_queue_per_user=settings.LLM_MAX_QUEUE_PER_USER,
+                    queue_timeout=settings.LLM_QUEUE_TIMEOUT
+                )
+    return _llm_gateway
@@ -0,0 +1,142 @@
+"""
+LLM Registry
+Shared Gemini clients and prebuilt prompts and chains, so a request only pays
+for the model call itself
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Hashable, Optional, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from app.core.config import settings
+
+
+# (model, temperature, max output tokens)
+LLMKey = Tuple[str, float, Optional[int]]
+
+
+class LLMRegistry:
+    """
+    Thread-safe registry of LLM clients keyed by (model, temperature, max_tokens)
+
+    A client owns its gRPC channels (one multiplexed connection, sync and
+    async), so reusing it skips client setup and the TLS handshake on every
+    request. Clients are LRU-bounded because temperatures come from
+    requests; chains built on an evicted client are dropped with it.
+    """
+
+    def __init__(self, api_key: str, max_clients: int):
+        self.api_key = api_key
+        self.max_clients = max_clients
+        self._clients: "OrderedDict[LLMKey, ChatGoogleGenerativeAI]" = OrderedDict()
+        self._prompts: Dict[str, ChatPromptTemplate] = {}
+        self._chains: Dict[Tuple[Hashable, LLMKey], Runnable] = {}
+        self._lock = threading.RLock()
+
+        self.client_hits = 0
+        self.client_misses = 0
+        self.client_evictions = 0
+        self.chain_hits = 0
+        self.chain_misses = 0
+
+    @staticmethod
+    def make_key(model: str, temperature: float, max_tokens: Optional[int] = None) -> LLMKey:
+        # Requests send arbitrary floats; temperatures this close share a client
+        return (model, round(float(temperature), 2), max_tokens)
+
+    def get_llm(self, model: str, temperature: float, max_tokens: Optional[int] = None) -> ChatGoogleGenerativeAI:
+        """Shared client for these generation settings (created on first use)"""
+        key = self.make_key(model, temperature, max_tokens)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self.client_hits += 1
+                return client
+
+            self.client_misses += 1
+            client = ChatGoogleGenerativeAI(
+                model=model,
+                google_api_key=self.api_key,
+                temperature=key[1],
+                max_output_tokens=max_tokens,
+                convert_system_message_to_human=True
+            )
+            self._clients[key] = client
+
+            while len(self._clients) > self.max_clients:
+                evicted_key, _ = self._clients.popitem(last=False)
+                self.client_evictions += 1
+                for chain_key in [chain_key for chain_key in self._chains if chain_key[1] == evicted_key]:
+                    del self._chains[chain_key]
+            return client
+
+    def get_prompt(self, template: str) -> ChatPromptTemplate:
+        """Parsed prompt for a template string"""
+        with self._lock:
+            prompt = self._prompts.get(template)
+            if prompt is None:
+                prompt = ChatPromptTemplate.from_template(template)
+                self._prompts[template] = prompt
+            return prompt
+
+    def get_chain(
+        self,
+        name: Hashable,
+        model: str,
+        temperature: float,
+        max_tokens: Optional[int],
+        build: Callable[[ChatGoogleGenerativeAI], Runnable]
+    ) -> Runnable:
+        """
+        Chain built once per name and client
+
+        Args:
+            name: Identifies what build() makes (e.g. the prompt it uses)
+            model, temperature, max_tokens: Client settings (see get_llm)
+            build: Builds the chain around the shared client
+        """
+        key = (name, self.make_key(model, temperature, max_tokens))
+        with self._lock:
+            chain = self._chains.get(key)
+            if chain is not None:
+                self._clients.move_to_end(key[1])
+                self.chain_hits += 1
+                return chain
+
+            self.chain_misses += 1
+            chain = build(self.get_llm(model, temperature, max_tokens))
+            self._chains[key] = chain
+            return chain
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "max_clients": self.max_clients,
+                "client_hits": self.client_hits,
+                "client_misses": self.client_misses,
+                "client_evictions": self.client_evictions,
+                "prompts": len(self._prompts),
+                "chains": len(self._chains),
+                "chain_hits": self.chain_hits,
+                "chain_misses": self.chain_misses
+            }
+
+
+# Singleton instance
+_llm_registry = None
+_llm_registry_lock = threading.Lock()
+
+def get_llm_registry() -> LLMRegistry:
+    """Get or create the LLM registry singleton"""
+    global _llm_registry
+    if _llm_registry is None:
+        with _llm_registry_lock:
+            if _llm_registry is None:
+                _llm_registry = LLMRegistry(settings.GOOGLE_API_KEY, settings.LLM_CLIENT_POOL_SIZE)
+    return _llm_registry
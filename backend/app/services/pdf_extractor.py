@@ -0,0 +1,99 @@
+"""
+PDF Extraction
+Page-level PDF text extraction fanned out across a process pool
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple, Optional
+
+import fitz  # PyMuPDF
+
+from app.core.config import settings
+
+
+# (page_number, text) with 1-based page numbers
+PageRecord = Tuple[int, str]
+
+
+def count_pages(pdf_path: str) -> int:
+    """Return the number of pages in a PDF"""
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def extract_page_range(pdf_path: str, start: int, stop: int) -> List[PageRecord]:
+    """
+    Extract text from pages [start, stop) of a PDF
+
+    Runs inside a worker process; each task opens its own document handle
+    because PyMuPDF documents cannot be shared across processes.
+    """
+    with fitz.open(pdf_path) as doc:
+        return [(number + 1, doc[number].get_text()) for number in range(start, stop)]
+
+
+class PDFExtractor:
+    """Splits a PDF into page ranges and extracts them in parallel"""
+
+    def __init__(self):
+        self.num_workers = settings.PDF_EXTRACTION_WORKERS or os.cpu_count() or 1
+        self.pages_per_task = settings.PDF_PAGES_PER_TASK
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawn (not fork) so workers don't inherit the event loop or model threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def extract_pages(self, pdf_path: str) -> List[PageRecord]:
+        """
+        Extract text from every page of a PDF
+
+        Args:
+            pdf_path: Path to the PDF file
+
+        Returns:
+            List of (page_number, text) records in page order
+        """
+        loop = asyncio.get_running_loop()
+        num_pages = await loop.run_in_executor(self.executor, count_pages, pdf_path)
+
+        tasks = [
+            loop.run_in_executor(
+                self.executor,
+                extract_page_range,
+                pdf_path,
+                start,
+                min(start + self.pages_per_task, num_pages)
+            )
+            for start in range(0, num_pages, self.pages_per_task)
+        ]
+        pages: List[PageRecord] = []
+        for page_range in await asyncio.gather(*tasks):
+            pages.extend(page_range)
+        return pages
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Singleton instance
+_pdf_extractor = None
+
+def get_pdf_extractor() -> PDFExtractor:
+    """Get or create PDF extractor singleton"""
+    global _pdf_extractor
+    if _pdf_extractor is None:
+        _pdf_extractor = PDFExtractor()
+    return _pdf_extractor
@@ -3,22 +3,106 @@ RAG (Retrieval Augmented Generation) Service
 Uses Google's Gemini 2.0 Flash model with FAISS vector store for document Q&A
 """
 
-import os
-import fitz  # PyMuPDF
-from typing import List, Dict, Optional, Any
+import asyncio
+import heapq
+import shutil
+import threading
+import time
+from collections import defaultdict
+from typing import List, Dict, Optional, Any, Tuple, AsyncIterator
 from pathlib import Path
 import pickle
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import numpy as np
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_classic.chains.retrieval import create_retrieval_chain
 from langchain_classic.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.documents import Document
+from langchain_core.runnables import Runnable
+from beanie import PydanticObjectId
+from beanie.operators import In
+from bson import ObjectId
 
 from app.core.config import settings
+from app.models.material import Material
+from app.services.pdf_extractor import get_pdf_extractor
+from app.services.embedding_backends import create_embedding_backend
+from app.services.embedding_cache import (
+    EmbeddingCache,
+    CachedEmbeddings,
+    QueryEmbeddingCache,
+    QueryCachedEmbeddings,
+    normalize_query
+)
+from app.services.course_index import CourseIndexManager
+from app.services.store_builder import MANIFEST_FILE, get_ingestion_process
+from app.services.bounded_executor import BoundedExecutor
+from app.services.llm_registry import get_llm_registry
+from app.services.llm_gateway import get_llm_gateway, GatewayOverloaded
+from app.services.answer_cache import AnswerCache
+from app.services.vector_store_cache import VectorStoreCache
+from app.services.vector_store_io import INDEX_FILE, load_vector_store
+from app.services.lexical_index import (
+    fuse_hits,
+    hybrid_search,
+    hybrid_search_batch,
+    hybrid_search_candidates
+)
+from app.services.context_packer import ContextPacker
+
+
+MAX_OUTPUT_TOKENS = 2048
+
+MATERIAL_PROMPT_TEMPLATE = """Use the following pieces of context from the study material to answer the question at the end. 
+If you don't know the answer based on the context, just say that you don't know, don't try to make up an answer.
+Always provide specific references to the material when possible.
+
+Context:
+{context}
+
+Question: {input}"""
+
+MULTIPLE_PROMPT_TEMPLATE = """Use the following pieces of context from multiple study materials to answer the question.
+If you don't know the answer, just say so. When answering, try to reference which material the information comes from.
+
+Context:
+{context}
+
+Question: {input}"""
+
+
+def material_metadata(material: Material) -> Dict[str, Any]:
+    """
+    Per-material fields of a material's chunks (sources)
+
+    Deduplicated materials share one store, whose chunks carry these fields
+    for whichever material vectorized it first; queries lay the requesting
+    material's fields over them.
+    """
+    return {
+        "title": material.title,
+        "course_id": material.course_id,
+        "uploaded_by": material.teacher_id,
+        "filename": material.file_name or Path(material.file_url or "").name
+    }
+
+
+def store_version(store_path: Path) -> Optional[Tuple[int, int]]:
+    """
+    Identifies the state of a store on disk: changes whenever any worker
+    rewrites it (the manifest is replaced last; stores without a manifest
+    fall back to their index file)
+
+    Returns:
+        (inode, mtime in ns), or None if the store doesn't exist
+    """
+    for path in (store_path / MANIFEST_FILE, store_path / INDEX_FILE, store_path):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        if path.is_file():
+            return stat.st_ino, stat.st_mtime_ns
+    return None
 
 
 class RAGService:
@@ -37,78 +121,201 @@ class RAGService:
         self.vector_store_path.mkdir(parents=True, exist_ok=True)
         
         # Initialize embeddings model
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=self.embedding_model_name,
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
+        self.embedding_backend = create_embedding_backend(
+            settings.EMBEDDING_BACKEND,
+            self.embedding_model_name,
+            batch_size=settings.EMBEDDING_BATCH_SIZE
         )
+        # Model + backend identity, used to key cached vectors and store manifests
+        self.embedding_id = self.embedding_backend.embedding_id
+        self.embeddings = self.embedding_backend
         
-        # Initialize Google Gemini LLM
+        # Reuse chunk embeddings (course indexes re-embed compressed stores);
+        # ingestion embeds in its own process (see store_builder)
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH)
+            self.embeddings = CachedEmbeddings(
+                self.embeddings,
+                self.embedding_cache,
+                self.embedding_id
+            )
+        
+        # Students repeat the same questions; every retrieval path embeds through this
+        self.query_embedding_cache: Optional[QueryEmbeddingCache] = None
+        if settings.QUERY_EMBEDDING_CACHE_MB > 0:
+            self.query_embedding_cache = QueryEmbeddingCache(
+                int(settings.QUERY_EMBEDDING_CACHE_MB * 1024 * 1024)
+            )
+            self.embeddings = QueryCachedEmbeddings(self.embeddings, self.query_embedding_cache)
+        
+        # Answers to repeated questions, dropped when their materials change
+        self.answer_cache: Optional[AnswerCache] = None
+        if settings.ANSWER_CACHE_ENABLED:
+            self.answer_cache = AnswerCache(
+                ttl=settings.ANSWER_CACHE_TTL,
+                similarity_threshold=settings.ANSWER_CACHE_SIMILARITY,
+                max_entries=settings.ANSWER_CACHE_MAX_ENTRIES
+            )
+        
+        # Initialize Google Gemini LLM (clients and chains are shared and reused)
+        self.llm_registry = get_llm_registry()
+        # Caps concurrent Gemini calls and queues them fairly across users
+        self.llm_gateway = get_llm_gateway()
         if not self.google_api_key:
             print("⚠️  Google API key not configured. RAG service will not work.")
             self.llm = None
         else:
             try:
-                self.llm = ChatGoogleGenerativeAI(
-                    model=self.model_name,
-                    google_api_key=self.google_api_key,
-                    temperature=0.3,
-                    max_output_tokens=2048,
-                    convert_system_message_to_human=True
-                )
+                self.llm = self.llm_registry.get_llm(self.model_name, 0.3, MAX_OUTPUT_TOKENS)
                 print(f"✅ Gemini LLM initialized successfully with model: {self.model_name}")
             except Exception as e:
                 print(f"⚠️  Failed to initialize Gemini LLM: {str(e)}")
                 self.llm = None
         
-        # Text splitter for chunking documents
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
+        # Merges overlapping retrieved chunks, drops near-duplicates and keeps
+        # the prompt context within a token budget
+        self.context_packer = ContextPacker(
+            token_budget=settings.CONTEXT_TOKEN_BUDGET,
+            mmr_lambda=settings.CONTEXT_MMR_LAMBDA,
+            duplicate_threshold=settings.CONTEXT_DUPLICATE_THRESHOLD,
+            max_overlap=self.chunk_overlap,
+            encoding_name=settings.CONTEXT_TOKENIZER
         )
         
-        # Cache for vector stores by material_id
-        self.vector_stores: Dict[str, FAISS] = {}
+        # Cache for vector stores by store ID
+        # (LRU bounded by estimated memory, so workers don't grow with the number of materials)
+        self.vector_stores = VectorStoreCache(int(settings.VECTOR_STORE_CACHE_MB * 1024 * 1024))
+        
+        # Store ID -> store_version() of the copy this worker loaded (or
+        # wrote); a different version on disk means another worker updated it
+        self.store_versions: Dict[str, Optional[Tuple[int, int]]] = {}
+        
+        # Material ID -> (vector store ID, when it was read); the content hash
+        # changes when any worker replaces the file, so entries expire
+        self.store_ids: Dict[str, Tuple[str, float]] = {}
+        
+        # Material ID -> material_metadata(), read along with store_ids
+        self.material_fields: Dict[str, Dict[str, Any]] = {}
+        
+        # Serializes writers of the same store
+        self.store_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        
+        # Blocking query work (embedding, FAISS search, store loads) runs here,
+        # never on the event loop; sized so a burst of queries queues visibly
+        self.query_executor = BoundedExecutor(settings.RAG_QUERY_WORKERS, "rag-query")
+        
+        # One index per course with every vectorized material's chunks
+        self.course_indexes = CourseIndexManager(
+            self.vector_store_path / "courses",
+            self.embeddings,
+            self.embedding_id,
+            compact_ratio=settings.COURSE_INDEX_COMPACT_RATIO,
+            target_recall=settings.ANN_TARGET_RECALL,
+            cache=self.vector_stores,
+            executor=self.query_executor,
+            mmap=settings.VECTOR_STORE_MMAP
+        )
     
-    async def extract_text_from_pdf(self, pdf_path: str) -> str:
+    async def resolve_store_id(self, material_id: str, refresh: bool = False) -> str:
         """
-        Extract text content from PDF file
+        Map a material to the vector store holding its chunks
+        
+        Content-addressed materials share the store named after their content
+        hash; older materials keep a store named after their own ID. The
+        mapping is re-read after STORE_ID_CACHE_TTL seconds (or with
+        refresh), since another worker may have replaced the file.
+        """
+        entry = self.store_ids.get(material_id)
+        if refresh or entry is None or time.monotonic() - entry[1] > settings.STORE_ID_CACHE_TTL:
+            store_id = material_id
+            if ObjectId.is_valid(material_id):
+                material = await Material.get(PydanticObjectId(material_id))
+                if material is not None:
+                    self.material_fields[material_id] = material_metadata(material)
+                    if material.content_hash:
+                        store_id = material.content_hash
+            if entry is not None and entry[0] != store_id:
+                # Replaced elsewhere: answers about the old content are stale
+                self.invalidate_answers([material_id])
+            entry = self.store_ids[material_id] = (store_id, time.monotonic())
+        return entry[0]
+    
+    async def get_material_store(self, material_id: str) -> Tuple[str, Optional[FAISS]]:
+        """
+        Resolve and load a material's vector store
+        
+        If the store is missing, the mapping is re-read once: another worker
+        may have replaced the file (and deleted the old store) since it was
+        cached.
         
-        Args:
-            pdf_path: Path to the PDF file
-            
         Returns:
-            Extracted text content
+            (store ID, vector store or None if not vectorized)
         """
-        try:
-            doc = fitz.open(pdf_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            doc.close()
-            return text
-        except Exception as e:
-            raise Exception(f"Error extracting text from PDF: {str(e)}")
+        store_id = await self.resolve_store_id(material_id)
+        vector_store = await self.get_vector_store(store_id)
+        if vector_store is None:
+            current_id = await self.resolve_store_id(material_id, refresh=True)
+            if current_id != store_id:
+                store_id = current_id
+                vector_store = await self.get_vector_store(store_id)
+        return store_id, vector_store
+    
+    def forget_material(self, material_id: str):
+        """Drop cached state for a material whose content changed or was deleted"""
+        self.store_ids.pop(material_id, None)
+        self.material_fields.pop(material_id, None)
+        self.invalidate_answers([material_id])
     
-    async def chunk_text(self, text: str, metadata: Dict = None) -> List[Document]:
+    def source_metadata(self, material_id: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        A chunk's metadata as a source of this material
+        
+        Call resolve_store_id first: it reads the material's fields, which
+        replace those of the material that vectorized a shared store.
+        """
+        return {**metadata, **self.material_fields.get(material_id, {}), "material_id": material_id}
+    
+    def invalidate_answers(self, ids: List[str]):
+        """Drop cached answers built from any of these material or store IDs"""
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate(ids)
+    
+    async def _cached_answer(
+        self,
+        scope: Tuple,
+        query: str,
+        query_embedding: Optional[List[float]] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]]]:
         """
-        Split text into chunks for embedding
+        Look up a cached answer, exact match first, then a near-duplicate question
+        
+        Returns:
+            (cached answer or None, query embedding if one was computed)
+        """
+        if self.answer_cache is None:
+            return None, query_embedding
+        cached = self.answer_cache.get(scope, query)
+        if cached is not None:
+            return cached, query_embedding
+        if query_embedding is None:
+            query_embedding = await self.query_executor.run(self.embeddings.embed_query, query)
+        return self.answer_cache.get_similar(scope, query_embedding), query_embedding
+    
+    async def extract_pages(self, pdf_path: str) -> List[Tuple[int, str]]:
+        """
+        Extract text content from PDF file, page by page
         
         Args:
-            text: Text content to chunk
-            metadata: Optional metadata to attach to chunks
+            pdf_path: Path to the PDF file
             
         Returns:
-            List of Document objects with chunks
+            List of (page_number, text) records
         """
-        chunks = self.text_splitter.split_text(text)
-        documents = [
-            Document(page_content=chunk, metadata=metadata or {})
-            for chunk in chunks
-        ]
-        return documents
+        try:
+            return await get_pdf_extractor().extract_pages(pdf_path)
+        except Exception as e:
+            raise Exception(f"Error extracting text from PDF: {str(e)}")
     
     async def vectorize_material(
         self,
@@ -120,7 +327,7 @@ class RAGService:
         Extract text from PDF, chunk it, and create vector embeddings
         
         Args:
-            material_id: Unique identifier for the material
+            material_id: Vector store ID (the content hash for deduplicated uploads)
             file_path: Path to the PDF file
             metadata: Optional metadata (title, course_id, etc.)
             
@@ -128,62 +335,329 @@ class RAGService:
             Dictionary with vectorization results
         """
         try:
-            # Extract text from PDF
-            text = await self.extract_text_from_pdf(file_path)
+            # Extract text from PDF pages on the process pool
+            pages = await self.extract_pages(file_path)
+            total_characters = sum(len(text) for _, text in pages)
             
-            if not text.strip():
+            if not any(text.strip() for _, text in pages):
                 raise Exception("No text content found in PDF")
             
             # Add material_id to metadata
-            if metadata is None:
-                metadata = {}
-            metadata['material_id'] = material_id
-            metadata['file_path'] = file_path
-            
-            # Chunk the text
-            documents = await self.chunk_text(text, metadata)
-            
-            # Create vector store
-            vector_store = FAISS.from_documents(documents, self.embeddings)
+            metadata = {**(metadata or {}), "material_id": material_id, "file_path": file_path}
             
-            # Save vector store to disk
-            vector_store_file = self.vector_store_path / f"{material_id}.faiss"
-            vector_store.save_local(str(vector_store_file))
+            # Chunk, embed and build or update the vector store in the
+            # ingestion process: CPU-bound work stays off the API workers
+            async with self.store_locks[material_id]:
+                update_stats = await asyncio.to_thread(
+                    get_ingestion_process().build, material_id, pages, metadata
+                )
             
-            # Cache in memory
-            self.vector_stores[material_id] = vector_store
+            # Loaded (read-only) from the new files on next use
+            self.vector_stores.pop(material_id, None)
+            self.store_versions.pop(material_id, None)
+            self.invalidate_answers([material_id])
             
             return {
                 "success": True,
                 "material_id": material_id,
-                "num_chunks": len(documents),
-                "total_characters": len(text),
-                "vector_store_path": str(vector_store_file)
+                "num_pages": len(pages),
+                "total_characters": total_characters,
+                "vector_store_path": str(self._store_path(material_id)),
+                **update_stats
             }
             
         except Exception as e:
             raise Exception(f"Error vectorizing material: {str(e)}")
     
+    def _store_path(self, store_id: str) -> Path:
+        return self.vector_store_path / f"{store_id}.faiss"
+    
+    async def seed_vector_store(self, source_id: str, target_id: str) -> bool:
+        """
+        Copy an existing store to a new ID so it can be updated incrementally
+        
+        Used when a material's PDF is replaced: the new content starts from
+        the old chunks instead of an empty index.
+        
+        Returns:
+            True if the target store now exists
+        """
+        source_path = self._store_path(source_id)
+        target_path = self._store_path(target_id)
+        if target_path.exists():
+            return True
+        if not source_path.is_dir():
+            return False
+        async with self.store_locks[source_id]:
+            await asyncio.to_thread(shutil.copytree, source_path, target_path)
+        return True
+    
+    async def index_material_in_course(
+        self,
+        course_id: str,
+        material_id: str,
+        store_id: str,
+        metadata: Dict = None
+    ) -> int:
+        """
+        Copy a vectorized material into its course index (no re-embedding)
+        
+        Args:
+            course_id: Course the material belongs to
+            material_id: Material ID recorded on every vector
+            store_id: The material's vector store (see resolve_store_id)
+            metadata: Chunk metadata to override (title, course_id)
+            
+        Returns:
+            Number of vectors indexed
+        """
+        vector_store = await self.get_vector_store(store_id)
+        if vector_store is None:
+            raise Exception(f"Vector store {store_id} not found")
+        async with self.store_locks[store_id]:
+            count = await self.course_indexes.add_material(
+                course_id, material_id, store_id, vector_store, metadata
+            )
+        self.invalidate_answers([material_id])
+        return count
+    
+    async def rebuild_course_index(self, course_id: str) -> Dict[str, Any]:
+        """
+        Bring a course index in line with the course's vectorized materials
+        
+        Adds materials missing from the index (e.g. vectorized before course
+        indexes existed), refreshes ones whose content changed and removes
+        ones no longer vectorized.
+        """
+        materials = await Material.find(
+            Material.course_id == course_id,
+            Material.vectorization_status == "completed"
+        ).to_list()
+        indexed = await self.course_indexes.indexed_materials(course_id)
+        
+        added = 0
+        for material in materials:
+            material_id = str(material.id)
+            store_id = await self.resolve_store_id(material_id)
+            if indexed.get(material_id, {}).get("store_id") == store_id:
+                continue
+            try:
+                await self.index_material_in_course(
+                    course_id,
+                    material_id,
+                    store_id,
+                    material_metadata(material)
+                )
+                added += 1
+            except Exception as e:
+                print(f"⚠️  Could not index material {material_id} in course {course_id}: {str(e)}")
+        
+        current_ids = {str(material.id) for material in materials}
+        removed = 0
+        for material_id in indexed:
+            if material_id not in current_ids:
+                await self.course_indexes.remove_material(material_id, course_id)
+                removed += 1
+        
+        return {
+            "course_id": course_id,
+            "materials_indexed": added,
+            "materials_removed": removed,
+            "materials_total": len(materials)
+        }
+    
+    async def _search_course_indexes(
+        self,
+        material_ids: List[str],
+        query: str,
+        query_embedding: List[float],
+        num_results: int
+    ) -> Tuple[List[List[Tuple]], List[str]]:
+        """
+        Search the requested materials through their course indexes
+        
+        Materials of the same course are served by one filtered search.
+        
+        Returns:
+            (one hit list per course (see _search_store_candidates);
+            material IDs served by a course index)
+        """
+        object_ids = [PydanticObjectId(material_id) for material_id in material_ids if ObjectId.is_valid(material_id)]
+        if not object_ids:
+            return [], []
+        
+        by_course: Dict[str, List[str]] = defaultdict(list)
+        for material in await Material.find(In(Material.id, object_ids)).to_list():
+            by_course[material.course_id].append(str(material.id))
+        
+        hit_lists = []
+        served = []
+        for course_id, course_material_ids in by_course.items():
+            indexed = await self.course_indexes.indexed_materials(course_id)
+            course_material_ids = [material_id for material_id in course_material_ids if material_id in indexed]
+            if not course_material_ids:
+                continue
+            
+            results = await self.course_indexes.search(
+                course_id,
+                query_embedding,
+                k=num_results * len(course_material_ids),
+                material_ids=course_material_ids,
+                query=query if settings.HYBRID_SEARCH_ENABLED else None,
+                lexical_weight=settings.HYBRID_LEXICAL_WEIGHT,
+                candidates=settings.HYBRID_CANDIDATES
+            )
+            print(f"DEBUG: Found {len(results)} documents for {len(course_material_ids)} materials in course {course_id}")
+            for doc, *_ in results:
+                # Course indexes copy chunks as the shared store had them
+                doc.metadata = self.source_metadata(doc.metadata["material_id"], doc.metadata)
+            hit_lists.append(results)
+            served.extend(course_material_ids)
+        
+        return hit_lists, served
+    
+    async def _search_store(
+        self,
+        vector_store: FAISS,
+        query: str,
+        query_embedding: List[float],
+        k: int
+    ) -> List[Tuple[Document, float]]:
+        """
+        Best chunks of one store
+        
+        Returns:
+            With hybrid search, (document, fused vector + BM25 score) pairs,
+            highest first; otherwise (document, L2 distance) pairs,
+            closest first
+        """
+        if settings.HYBRID_SEARCH_ENABLED:
+            return await self.query_executor.run(
+                hybrid_search,
+                vector_store,
+                query,
+                query_embedding,
+                k,
+                settings.HYBRID_LEXICAL_WEIGHT,
+                settings.HYBRID_CANDIDATES
+            )
+        return await self.query_executor.run(
+            vector_store.similarity_search_with_score_by_vector, query_embedding, k=k
+        )
+    
+    async def _search_store_candidates(
+        self,
+        vector_store: FAISS,
+        query: str,
+        query_embedding: List[float],
+        k: int
+    ) -> List[Tuple]:
+        """
+        Hits of one store to be ranked with other stores' hits
+        
+        Returns:
+            With hybrid search, unfused (document, cosine similarity, BM25
+            score) candidates (see lexical_index.fuse_hits); otherwise
+            (document, L2 distance) pairs, closest first
+        """
+        if settings.HYBRID_SEARCH_ENABLED:
+            return await self.query_executor.run(
+                hybrid_search_candidates,
+                vector_store,
+                query,
+                query_embedding,
+                k,
+                settings.HYBRID_LEXICAL_WEIGHT,
+                settings.HYBRID_CANDIDATES
+            )
+        return await self._search_store(vector_store, query, query_embedding, k)
+    
+    async def _search_store_batch(
+        self,
+        vector_store: FAISS,
+        queries: List[str],
+        query_embeddings: List[List[float]],
+        k: int
+    ) -> List[List[Tuple[Document, float]]]:
+        """_search_store for several questions, with one matrix search of the index"""
+        if settings.HYBRID_SEARCH_ENABLED:
+            return await self.query_executor.run(
+                hybrid_search_batch,
+                vector_store,
+                queries,
+                query_embeddings,
+                k,
+                settings.HYBRID_LEXICAL_WEIGHT,
+                settings.HYBRID_CANDIDATES
+            )
+        return await self.query_executor.run(self._vector_search_batch, vector_store, query_embeddings, k)
+    
+    @staticmethod
+    def _vector_search_batch(
+        vector_store: FAISS,
+        query_embeddings: List[List[float]],
+        k: int
+    ) -> List[List[Tuple[Document, float]]]:
+        """(document, L2 distance) pairs per question, closest first"""
+        if not query_embeddings:
+            return []
+        distances, positions = vector_store.index.search(np.asarray(query_embeddings, dtype=np.float32), k)
+        hit_lists = []
+        for row_distances, row_positions in zip(distances, positions):
+            hits = []
+            for distance, position in zip(row_distances, row_positions):
+                if position == -1:
+                    continue
+                doc = vector_store.docstore.search(vector_store.index_to_docstore_id[int(position)])
+                hits.append((Document(page_content=doc.page_content, metadata=dict(doc.metadata)), float(distance)))
+            hit_lists.append(hits)
+        return hit_lists
+    
+    def check_store_version(self, store_id: str) -> Optional[Tuple[int, int]]:
+        """
+        Drop the loaded copy of a store, and answers built from it, if
+        another worker has rewritten (or deleted) the store since
+        
+        Returns:
+            The store's version on disk
+        """
+        current = store_version(self._store_path(store_id))
+        if store_id in self.store_versions and self.store_versions[store_id] != current:
+            print(f"DEBUG: Vector store {store_id} changed on disk, reloading")
+            self.vector_stores.pop(store_id, None)
+            self.invalidate_answers([store_id])
+            del self.store_versions[store_id]
+        return current
+    
     async def get_vector_store(self, material_id: str) -> Optional[FAISS]:
         """
-        Get or load a vector store for a specific material
+        Get or load a vector store by store ID (see resolve_store_id)
         """
+        version = self.check_store_version(material_id)
+        
         # Check if already loaded in memory
-        if material_id in self.vector_stores:
-            return self.vector_stores[material_id]
+        vector_store = self.vector_stores.get(material_id)
+        if vector_store is not None:
+            return vector_store
         
         # Try to load from disk
         store_path = Path(self.vector_store_path) / f"{material_id}.faiss"
         print(f"DEBUG: Looking for vector store at: {store_path}")
         
-        if store_path.exists():
+        if version is not None:
             try:
-                vector_store = FAISS.load_local(
-                    str(store_path),
+                # Read-only from here on: memory-map the index and read
+                # chunk text only for search results
+                vector_store = await self.query_executor.run(
+                    load_vector_store,
+                    store_path,
                     self.embeddings,
-                    allow_dangerous_deserialization=True
+                    mmap=settings.VECTOR_STORE_MMAP,
+                    lazy_docstore=True
                 )
                 self.vector_stores[material_id] = vector_store
+                # Read before loading: a rewrite during the load shows up as a change next time
+                self.store_versions[material_id] = version
                 print(f"DEBUG: Successfully loaded vector store for {material_id}")
                 return vector_store
             except Exception as e:
@@ -194,12 +668,309 @@ class RAGService:
         
         return None
     
+    async def _prepare_material_query(
+        self,
+        material_id: str,
+        query: str,
+        num_results: int,
+        temperature: float
+    ) -> Dict[str, Any]:
+        """
+        Everything query_material does before calling the LLM
+        
+        Returns:
+            {"response": ...} if the query is already answered (error or
+            cached answer), otherwise the retrieved context (see _answer)
+        """
+        # Get vector store
+        store_id, vector_store = await self.get_material_store(material_id)
+        if vector_store is None:
+            return {"response": {
+                "success": False,
+                "error": "Material not found or not vectorized"
+            }}
+        
+        # Repeated questions skip retrieval and the LLM round trip
+        scope = ("material", material_id, num_results, temperature)
+        cached, query_embedding = await self._cached_answer(scope, query)
+        if cached is not None:
+            return {"response": cached}
+        
+        if query_embedding is None:
+            query_embedding = await self.query_executor.run(self.embeddings.embed_query, query)
+        hits = await self._search_store(vector_store, query, query_embedding, num_results)
+        return await self._material_context(material_id, store_id, scope, query_embedding, hits)
+    
+    async def _material_context(
+        self,
+        material_id: str,
+        store_id: str,
+        scope: Tuple,
+        query_embedding: List[float],
+        hits: List[Tuple[Document, float]]
+    ) -> Dict[str, Any]:
+        """Pack a material query's hits into the prepared query (see _answer)"""
+        packed, _ = await self.query_executor.run(self.context_packer.pack, hits)
+        documents = [doc for doc, _ in packed]
+        
+        # Extract source information
+        sources = []
+        for doc in documents:
+            sources.append({
+                "content": doc.page_content,
+                "metadata": self.source_metadata(material_id, doc.metadata)
+            })
+        
+        return {
+            "scope": scope,
+            "query_embedding": query_embedding,
+            "documents": documents,
+            "sources": sources,
+            "prompt_template": MATERIAL_PROMPT_TEMPLATE,
+            "fields": {"material_id": material_id},
+            "dependencies": [material_id, store_id]
+        }
+    
+    async def _prepare_multiple_query(
+        self,
+        material_ids: List[str],
+        query: str,
+        num_results: int,
+        temperature: float,
+        course_id: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        Everything query_multiple_materials does before calling the LLM
+        
+        Returns:
+            {"response": ...} if the query is already answered (error or
+            cached answer), otherwise the retrieved context (see _answer)
+        """
+        material_map = {}
+        missing_materials = []
+        
+        if course_id and not material_ids:
+            material_ids = list(await self.course_indexes.indexed_materials(course_id))
+        
+        print(f"DEBUG: Querying {len(material_ids)} materials: {material_ids}")
+        
+        # Answers cached from stores another worker has since updated are dropped first
+        for material_id in material_ids:
+            self.check_store_version(await self.resolve_store_id(material_id))
+        
+        # Repeated questions skip retrieval and the LLM round trip
+        scope = ("materials", tuple(sorted(set(material_ids))), num_results, temperature)
+        cached, query_embedding = await self._cached_answer(scope, query)
+        if cached is not None:
+            return {"response": cached}
+        
+        # Embed the question once; every store is searched with the same vector
+        if query_embedding is None:
+            query_embedding = await self.query_executor.run(self.embeddings.embed_query, query)
+        dependencies = list(material_ids)
+        
+        # Hits per search (see _search_store_candidates)
+        hit_lists: List[List[Tuple]] = []
+        
+        # Materials with a course index: one filtered search per course
+        served = []
+        if settings.COURSE_INDEX_ENABLED:
+            hit_lists, served = await self._search_course_indexes(
+                material_ids, query, query_embedding, num_results
+            )
+        
+        # Remaining materials: search their own stores
+        for material_id in material_ids:
+            if material_id in served:
+                continue
+            store_id, vector_store = await self.get_material_store(material_id)
+            dependencies.append(store_id)
+            if vector_store:
+                results = await self._search_store_candidates(vector_store, query, query_embedding, num_results)
+                print(f"DEBUG: Found {len(results)} documents in material {material_id}")
+                hit_lists.append([
+                    # Copy: the docstore may be shared by other materials
+                    (
+                        Document(
+                            page_content=doc.page_content,
+                            metadata=self.source_metadata(material_id, doc.metadata)
+                        ),
+                        *(float(score) for score in scores)
+                    )
+                    for doc, *scores in results
+                ])
+            else:
+                print(f"DEBUG: Vector store not found for material {material_id}")
+                missing_materials.append(material_id)
+        
+        # All stores share one embedding space, so distances and cosine
+        # similarities are comparable; BM25 scores are scaled by the best one
+        # across all stores before fusion (each store's own best would score 1)
+        if settings.HYBRID_SEARCH_ENABLED:
+            top_hits = fuse_hits(hit_lists, num_results * len(material_ids), settings.HYBRID_LEXICAL_WEIGHT)
+        else:
+            merged = heapq.merge(*hit_lists, key=lambda hit: hit[1])
+            top_hits = list(merged)[:num_results * len(material_ids)]
+        
+        # However many materials were selected, the prompt stays within the token budget
+        top_hits, packing = await self.query_executor.run(self.context_packer.pack, top_hits)
+        print(
+            f"DEBUG: Packed {packing['chunks_retrieved']} chunks into {packing['passages_packed']} passages "
+            f"({packing['context_tokens']} tokens, {packing['duplicates_dropped']} duplicates dropped)"
+        )
+        all_documents = [doc for doc, _ in top_hits]
+        for doc in all_documents:
+            material_map[doc.metadata["material_id"]] = True
+        
+        if not all_documents:
+            error_msg = f"No vectorized materials found. "
+            if missing_materials:
+                error_msg += f"Materials {', '.join(missing_materials[:3])} are not vectorized. "
+            error_msg += "Please ensure materials are uploaded with 'Vectorize for AI' enabled."
+            print(f"DEBUG: {error_msg}")
+            return {"response": {
+                "success": False,
+                "error": error_msg
+            }}
+        
+        # Check if Google API key is available
+        if not self.google_api_key:
+            return {"response": {
+                "success": False,
+                "error": "Google API key not configured. Please check server configuration."
+            }}
+        
+        # Extract source information
+        sources = []
+        for doc, score in top_hits:
+            sources.append({
+                "content": doc.page_content,
+                "metadata": doc.metadata,
+                "score": score
+            })
+        
+        return {
+            "scope": scope,
+            "query_embedding": query_embedding,
+            "documents": all_documents,
+            "sources": sources,
+            "prompt_template": MULTIPLE_PROMPT_TEMPLATE,
+            "fields": {
+                "material_ids": list(material_map.keys()),
+                "num_materials_searched": len(material_map)
+            },
+            "dependencies": dependencies
+        }
+    
+    def _answer_chain(self, prepared: Dict[str, Any], temperature: float) -> Runnable:
+        """Document combining chain for a prepared query (retrieval is already done)"""
+        prompt = self.llm_registry.get_prompt(prepared["prompt_template"])
+        return self.llm_registry.get_chain(
+            ("stuff", prepared["prompt_template"]),
+            self.model_name,
+            temperature,
+            MAX_OUTPUT_TOKENS,
+            lambda llm: create_stuff_documents_chain(llm, prompt)
+        )
+    
+    def _finish_answer(self, prepared: Dict[str, Any], query: str, answer: str) -> Dict[str, Any]:
+        """Build the response for a generated answer and cache it"""
+        response = {
+            "success": True,
+            "answer": answer,
+            "sources": prepared["sources"],
+            **prepared["fields"]
+        }
+        if self.answer_cache is not None:
+            self.answer_cache.put(
+                prepared["scope"],
+                query,
+                prepared["query_embedding"],
+                response,
+                prepared["dependencies"]
+            )
+        return response
+    
+    async def _answer(
+        self,
+        prepared: Dict[str, Any],
+        query: str,
+        temperature: float,
+        user_id: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        Generate the whole answer for a prepared query
+        
+        Raises:
+            GatewayOverloaded: Too many LLM calls queued (the caller should answer 429)
+        """
+        if "response" in prepared:
+            return prepared["response"]
+        combine_docs_chain = self._answer_chain(prepared, temperature)
+        async with self.llm_gateway.slot(user_id, "rag"):
+            # Native async call: the event loop keeps serving other requests meanwhile
+            answer = await combine_docs_chain.ainvoke({"context": prepared["documents"], "input": query})
+        return self._finish_answer(prepared, query, answer)
+    
+    async def _stream_answer(
+        self,
+        prepared: Dict[str, Any],
+        query: str,
+        temperature: float,
+        user_id: Optional[str]
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Stream a prepared query as (event, data) pairs
+        
+        Events: "sources" first, then "token" for each piece of the answer,
+        then "done" with the fields of the non-streaming response; "error"
+        instead if the query can't be answered (with "retry_after" if the
+        LLM gateway is overloaded). Closing the generator cancels the
+        upstream generation.
+        """
+        if "response" in prepared:
+            response = prepared["response"]
+            if not response["success"]:
+                yield "error", {"error": response["error"]}
+                return
+            # Cached answer: nothing to wait for, send it as one piece
+            fields = {key: value for key, value in response.items() if key not in ("answer", "sources")}
+            yield "sources", {"sources": response["sources"]}
+            yield "token", {"text": response["answer"]}
+            yield "done", {**fields, "cached": True}
+            return
+        
+        yield "sources", {"sources": prepared["sources"]}
+        
+        combine_docs_chain = self._answer_chain(prepared, temperature)
+        answer_parts = []
+        try:
+            # The slot is held until the stream ends or the client goes away
+            async with self.llm_gateway.slot(user_id, "rag"):
+                tokens = combine_docs_chain.astream({"context": prepared["documents"], "input": query})
+                try:
+                    async for text in tokens:
+                        answer_parts.append(text)
+                        yield "token", {"text": text}
+                finally:
+                    # Runs on client disconnect too: stops the Gemini stream
+                    await tokens.aclose()
+        except GatewayOverloaded as e:
+            yield "error", {"error": e.detail, "retry_after": e.retry_after}
+            return
+        
+        response = self._finish_answer(prepared, query, "".join(answer_parts))
+        yield "done", {
+            key: value for key, value in response.items() if key not in ("answer", "sources")
+        }
+    
     async def query_material(
         self,
         material_id: str,
         query: str,
         num_results: int = 5,
-        temperature: float = 0.3
+        temperature: float = 0.3,
+        user_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Query a specific material using RAG
@@ -209,77 +980,171 @@ class RAGService:
             query: User's question
             num_results: Number of relevant chunks to retrieve
             temperature: Creativity level (0.0 = precise, 1.0 = creative)
+            user_id: Requesting user, for fair queuing of LLM calls
             
         Returns:
             Dictionary with answer and source chunks
+            
+        Raises:
+            GatewayOverloaded: Too many LLM calls queued
+        """
+        try:
+            prepared = await self._prepare_material_query(material_id, query, num_results, temperature)
+            return await self._answer(prepared, query, temperature, user_id)
+            
+        except GatewayOverloaded:
+            raise
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Error querying material: {str(e)}"
+            }
+    
+    async def stream_query_material(
+        self,
+        material_id: str,
+        query: str,
+        num_results: int = 5,
+        temperature: float = 0.3,
+        user_id: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming variant of query_material: sources as soon as retrieval is
+        done, then the answer as it is generated (see _stream_answer)
         """
         try:
-            # Get vector store
-            vector_store = await self.get_vector_store(material_id)
+            prepared = await self._prepare_material_query(material_id, query, num_results, temperature)
+            async for event in self._stream_answer(prepared, query, temperature, user_id):
+                yield event
+        except Exception as e:
+            yield "error", {"error": f"Error querying material: {str(e)}"}
+    
+    async def query_batch(
+        self,
+        material_id: str,
+        queries: List[str],
+        num_results: int = 5,
+        temperature: float = 0.3,
+        user_id: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Answer many questions about one material (e.g. a review sheet)
+        
+        The store is loaded once, the questions are embedded in one pass
+        and searched with one matrix search; the LLM calls then run
+        concurrently, at most RAG_BATCH_CONCURRENCY at a time (each still
+        goes through the LLM gateway), and each answer is sent as soon as
+        it is ready. A question asked twice is answered once.
+        
+        Events: "batch" first, then a "result" per question in completion
+        order, with its "index" in queries, the "query" and the fields of
+        query_material's response ("retry_after" too if the LLM gateway
+        was overloaded), then "done" with totals; "error" instead if the
+        material can't be queried. Closing the generator cancels the
+        answers still pending.
+        """
+        started = time.perf_counter()
+        tasks: List[asyncio.Task] = []
+        try:
+            store_id, vector_store = await self.get_material_store(material_id)
             if vector_store is None:
-                return {
-                    "success": False,
-                    "error": "Material not found or not vectorized"
-                }
+                yield "error", {"error": "Material not found or not vectorized"}
+                return
+            yield "batch", {"material_id": material_id, "num_questions": len(queries)}
             
-            # Create LLM with custom temperature
-            llm = ChatGoogleGenerativeAI(
-                model=self.model_name,
-                google_api_key=self.google_api_key,
-                temperature=temperature,
-                max_output_tokens=2048,
-                convert_system_message_to_human=True
-            )
+            # Spellings of the same question -> their indexes in queries
+            groups: Dict[str, List[int]] = defaultdict(list)
+            for index, query in enumerate(queries):
+                groups[normalize_query(query)].append(index)
+            unique = [indexes[0] for indexes in groups.values()]
             
-            # Create custom prompt template
-            prompt_template = """Use the following pieces of context from the study material to answer the question at the end. 
-If you don't know the answer based on the context, just say that you don't know, don't try to make up an answer.
-Always provide specific references to the material when possible.
-
-Context:
-{context}
-
-Question: {input}"""
+            scope = ("material", material_id, num_results, temperature)
+            responses: Dict[int, Dict[str, Any]] = {}
+            if self.answer_cache is not None:
+                for index in unique:
+                    cached = self.answer_cache.get(scope, queries[index])
+                    if cached is not None:
+                        responses[index] = cached
             
-            prompt = ChatPromptTemplate.from_template(prompt_template)
+            pending = [index for index in unique if index not in responses]
+            embeddings: Dict[int, List[float]] = {}
+            if pending:
+                vectors = await self.query_executor.run(
+                    self.embeddings.embed_queries, [queries[index] for index in pending]
+                )
+                embeddings = dict(zip(pending, vectors))
+                if self.answer_cache is not None:
+                    for index in pending:
+                        cached = self.answer_cache.get_similar(scope, embeddings[index])
+                        if cached is not None:
+                            responses[index] = cached
+                    pending = [index for index in pending if index not in responses]
             
-            # Create document combining chain
-            combine_docs_chain = create_stuff_documents_chain(llm, prompt)
+            cached_count = 0
+            for index, response in responses.items():
+                for duplicate in groups[normalize_query(queries[index])]:
+                    cached_count += 1
+                    yield "result", {"index": duplicate, "query": queries[duplicate], **response, "cached": True}
             
-            # Create retrieval chain
-            retriever = vector_store.as_retriever(search_kwargs={"k": num_results})
-            qa_chain = create_retrieval_chain(retriever, combine_docs_chain)
+            hit_lists = await self._search_store_batch(
+                vector_store,
+                [queries[index] for index in pending],
+                [embeddings[index] for index in pending],
+                num_results
+            )
+            prepared_list = await asyncio.gather(*(
+                self._material_context(material_id, store_id, scope, embeddings[index], hits)
+                for index, hits in zip(pending, hit_lists)
+            ))
             
-            # Get answer
-            result = qa_chain.invoke({"input": query})
+            limit = asyncio.Semaphore(max(settings.RAG_BATCH_CONCURRENCY, 1))
             
-            # Extract source information
-            sources = []
-            for doc in result.get('context', []):
-                sources.append({
-                    "content": doc.page_content,
-                    "metadata": doc.metadata
-                })
+            async def answer(index: int, prepared: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+                async with limit:
+                    try:
+                        return index, await self._answer(prepared, queries[index], temperature, user_id)
+                    except GatewayOverloaded as e:
+                        return index, {"success": False, "error": e.detail, "retry_after": e.retry_after}
+                    except Exception as e:
+                        return index, {"success": False, "error": f"Error querying material: {str(e)}"}
             
-            return {
-                "success": True,
-                "answer": result['answer'],
-                "sources": sources,
-                "material_id": material_id
-            }
+            tasks = [
+                asyncio.create_task(answer(index, prepared))
+                for index, prepared in zip(pending, prepared_list)
+            ]
+            answered = failed = 0
+            for next_answer in asyncio.as_completed(tasks):
+                index, response = await next_answer
+                for duplicate in groups[normalize_query(queries[index])]:
+                    if response["success"]:
+                        answered += 1
+                    else:
+                        failed += 1
+                    yield "result", {"index": duplicate, "query": queries[duplicate], **response}
             
-        except Exception as e:
-            return {
-                "success": False,
-                "error": f"Error querying material: {str(e)}"
+            yield "done", {
+                "material_id": material_id,
+                "num_questions": len(queries),
+                "answered": answered + cached_count,
+                "cached": cached_count,
+                "failed": failed,
+                "seconds": round(time.perf_counter() - started, 3)
             }
+        except Exception as e:
+            yield "error", {"error": f"Error querying material: {str(e)}"}
+        finally:
+            # Client went away: stop the answers still queued or generating
+            for task in tasks:
+                task.cancel()
     
     async def query_multiple_materials(
         self,
         material_ids: List[str],
         query: str,
         num_results: int = 3,
-        temperature: float = 0.3
+        temperature: float = 0.3,
+        course_id: Optional[str] = None,
+        user_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Query multiple materials at once
@@ -289,126 +1154,102 @@ Question: {input}"""
             query: User's question
             num_results: Number of relevant chunks per material
             temperature: Creativity level (0.0 = precise, 1.0 = creative)
+            course_id: Query every indexed material of this course if material_ids is empty
+            user_id: Requesting user, for fair queuing of LLM calls
             
         Returns:
             Dictionary with combined answer and sources
+            
+        Raises:
+            GatewayOverloaded: Too many LLM calls queued
         """
         try:
-            all_documents = []
-            material_map = {}
-            missing_materials = []
-            
-            print(f"DEBUG: Querying {len(material_ids)} materials: {material_ids}")
-            
-            # Collect documents from all materials
-            for material_id in material_ids:
-                vector_store = await self.get_vector_store(material_id)
-                if vector_store:
-                    # Search this vector store
-                    docs = vector_store.similarity_search(query, k=num_results)
-                    print(f"DEBUG: Found {len(docs)} documents in material {material_id}")
-                    for doc in docs:
-                        doc.metadata['material_id'] = material_id
-                        all_documents.append(doc)
-                        material_map[material_id] = True
-                else:
-                    print(f"DEBUG: Vector store not found for material {material_id}")
-                    missing_materials.append(material_id)
-            
-            if not all_documents:
-                error_msg = f"No vectorized materials found. "
-                if missing_materials:
-                    error_msg += f"Materials {', '.join(missing_materials[:3])} are not vectorized. "
-                error_msg += "Please ensure materials are uploaded with 'Vectorize for AI' enabled."
-                print(f"DEBUG: {error_msg}")
-                return {
-                    "success": False,
-                    "error": error_msg
-                }
-            
-            # Create a temporary vector store with all documents
-            combined_store = FAISS.from_documents(all_documents, self.embeddings)
-            
-            # Check if Google API key is available
-            if not self.google_api_key:
-                return {
-                    "success": False,
-                    "error": "Google API key not configured. Please check server configuration."
-                }
-            
-            # Create LLM with custom temperature
-            llm = ChatGoogleGenerativeAI(
-                model=self.model_name,
-                google_api_key=self.google_api_key,
-                temperature=temperature,
-                max_output_tokens=2048,
-                convert_system_message_to_human=True
+            prepared = await self._prepare_multiple_query(
+                material_ids, query, num_results, temperature, course_id
             )
+            return await self._answer(prepared, query, temperature, user_id)
             
-            # Create QA chain with new API
-            prompt_template = """Use the following pieces of context from multiple study materials to answer the question.
-If you don't know the answer, just say so. When answering, try to reference which material the information comes from.
-
-Context:
-{context}
-
-Question: {input}"""
-            
-            prompt = ChatPromptTemplate.from_template(prompt_template)
-            
-            # Create document combining chain
-            combine_docs_chain = create_stuff_documents_chain(llm, prompt)
-            
-            # Create retrieval chain
-            retriever = combined_store.as_retriever(search_kwargs={"k": num_results * len(material_ids)})
-            qa_chain = create_retrieval_chain(retriever, combine_docs_chain)
-            
-            # Get answer
-            result = qa_chain.invoke({"input": query})
-            
-            # Extract source information
-            sources = []
-            for doc in result.get('context', []):
-                sources.append({
-                    "content": doc.page_content,
-                    "metadata": doc.metadata
-                })
-            
-            return {
-                "success": True,
-                "answer": result['answer'],
-                "sources": sources,
-                "material_ids": list(material_map.keys()),
-                "num_materials_searched": len(material_map)
-            }
-            
+        except GatewayOverloaded:
+            raise
         except Exception as e:
             return {
                 "success": False,
                 "error": f"Error querying materials: {str(e)}"
             }
     
+    async def stream_query_multiple_materials(
+        self,
+        material_ids: List[str],
+        query: str,
+        num_results: int = 3,
+        temperature: float = 0.3,
+        course_id: Optional[str] = None,
+        user_id: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Streaming variant of query_multiple_materials (see _stream_answer)"""
+        try:
+            prepared = await self._prepare_multiple_query(
+                material_ids, query, num_results, temperature, course_id
+            )
+            async for event in self._stream_answer(prepared, query, temperature, user_id):
+                yield event
+        except Exception as e:
+            yield "error", {"error": f"Error querying materials: {str(e)}"}
+    
+    def warm_up(self) -> float:
+        """
+        Run one embedding and one FAISS search so lazy initialization
+        (model weights, tokenizer, thread pools) happens before real traffic
+        
+        Returns:
+            Seconds taken
+        """
+        started = time.perf_counter()
+        vector = self.embeddings.embed_query("warm-up query")
+        self.embeddings.embed_documents(["warm-up document"])
+        
+        store = FAISS.from_embeddings([("warm-up document", vector)], self.embeddings)
+        store.similarity_search_by_vector(vector, k=1)
+        return time.perf_counter() - started
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache statistics for monitoring"""
+        return {
+            "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else None,
+            "query_embedding_cache": self.query_embedding_cache.stats() if self.query_embedding_cache else None,
+            "answer_cache": self.answer_cache.stats() if self.answer_cache else None,
+            "ingestion_process": get_ingestion_process().stats(),
+            "query_executor": self.query_executor.stats(),
+            "llm_registry": self.llm_registry.stats(),
+            "llm_gateway": self.llm_gateway.stats(),
+            "context_packer": self.context_packer.stats(),
+            "loaded_vector_stores": len(self.vector_stores),
+            "vector_store_cache": self.vector_stores.stats(),
+            "course_indexes": self.course_indexes.stats()
+        }
+    
     async def delete_material_vectors(self, material_id: str) -> bool:
         """
         Delete vector store for a material
         
         Args:
-            material_id: Unique identifier for the material
+            material_id: Vector store ID (the content hash for deduplicated uploads)
             
         Returns:
             True if deleted successfully
         """
         try:
             # Remove from cache
-            if material_id in self.vector_stores:
-                del self.vector_stores[material_id]
+            self.vector_stores.pop(material_id, None)
+            self.store_versions.pop(material_id, None)
+            self.invalidate_answers([material_id])
             
-            # Delete from disk
+            # Delete from disk (stores are directories of files)
             vector_store_file = self.vector_store_path / f"{material_id}.faiss"
-            if vector_store_file.exists():
-                # FAISS saves multiple files
-                for file in vector_store_file.parent.glob(f"{material_id}.faiss*"):
-                    file.unlink()
+            if vector_store_file.is_dir():
+                shutil.rmtree(vector_store_file)
+            elif vector_store_file.exists():
+                vector_store_file.unlink()
             
             return True
         except Exception as e:
@@ -418,10 +1259,14 @@ Question: {input}"""
 
 # Singleton instance
 _rag_service = None
+_rag_service_lock = threading.Lock()
 
 def get_rag_service() -> RAGService:
     """Get or create RAG service singleton"""
     global _rag_service
     if _rag_service is None:
-        _rag_service = RAGService()
+        # Startup warm-up builds the service in a thread while requests may arrive
+        with _rag_service_lock:
+            if _rag_service is None:
+                _rag_service = RAGService()
     return _rag_service
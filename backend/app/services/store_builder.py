@@ -0,0 +1,300 @@
+"""
+Store Builder
+Chunks, embeds and indexes extracted PDF pages into material vector stores, in a
+dedicated ingestion process so embedding and FAISS builds never run on an API worker
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+from datetime import datetime
+from multiprocessing.managers import BaseManager
+from pathlib import Path
+from typing import List, Dict, Optional, Any, Tuple
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.services.embedding_backends import create_embedding_backend
+from app.services.embedding_cache import EmbeddingCache, CachedEmbeddings
+from app.services.embedding_batcher import EmbeddingBatcher, BatchedEmbeddings
+from app.services.vector_store_io import load_vector_store, save_vector_store
+from app.services.ann_index import optimize_vector_store, to_flat_index
+from app.services.lexical_index import LexicalIndex
+
+
+# Written next to the index and docstore files in every store directory
+MANIFEST_FILE = "manifest.json"
+
+
+def make_chunk_id(page_number: int, text: str, occurrence: int = 0) -> str:
+    """Stable ID for a chunk, so unchanged chunks keep their ID across rebuilds"""
+    return hashlib.sha256(f"{page_number}:{occurrence}:{text}".encode("utf-8")).hexdigest()
+
+
+def read_manifest(store_path: Path) -> Optional[Dict[str, Any]]:
+    """Read a store's manifest, or None for stores built before manifests existed"""
+    manifest_path = store_path / MANIFEST_FILE
+    if not manifest_path.exists():
+        return None
+    with manifest_path.open() as f:
+        return json.load(f)
+
+
+def write_manifest(store_path: Path, manifest: Dict[str, Any]):
+    # Replaced, not rewritten: the new inode tells other workers the store changed
+    temp_path = store_path / f"{MANIFEST_FILE}.tmp"
+    with temp_path.open("w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(temp_path, store_path / MANIFEST_FILE)
+
+
+class StoreBuilder:
+    """
+    Turns (page_number, text) records into a saved vector store
+
+    Lives in the ingestion process, with its own embedding model. Concurrent
+    builds embed through one EmbeddingBatcher, so chunks from every
+    in-flight upload share batches.
+    """
+
+    def __init__(self):
+        self.vector_store_path = Path(settings.VECTOR_STORE_PATH)
+        self.chunk_size = settings.CHUNK_SIZE
+        self.chunk_overlap = settings.CHUNK_OVERLAP
+
+        embedding_backend = create_embedding_backend(
+            settings.EMBEDDING_BACKEND,
+            settings.EMBEDDING_MODEL,
+            batch_size=settings.EMBEDDING_BATCH_SIZE
+        )
+        self.embedding_id = embedding_backend.embedding_id
+
+        # Merge chunks from concurrent ingestions into shared batches
+        self.embedding_batcher = EmbeddingBatcher(
+            embedding_backend,
+            max_batch_size=settings.EMBEDDING_BATCH_SIZE,
+            max_wait=settings.EMBEDDING_BATCH_MAX_WAIT_MS / 1000
+        )
+        self.embeddings = BatchedEmbeddings(embedding_backend, self.embedding_batcher)
+
+        # Reuse chunk embeddings across re-vectorizations and rebuilds
+        # (SQLite, shared with the API workers)
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.embedding_cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH)
+            self.embeddings = CachedEmbeddings(
+                self.embeddings,
+                self.embedding_cache,
+                self.embedding_id
+            )
+
+        # Text splitter for chunking documents
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            length_function=len,
+            separators=["\n\n", "\n", " ", ""]
+        )
+
+    def chunk_pages(self, pages: List[Tuple[int, str]], metadata: Dict = None) -> List[Document]:
+        """
+        Split pages into chunks for embedding
+
+        Chunks never span a page break, so every chunk can cite its page.
+
+        Args:
+            pages: (page_number, text) records
+            metadata: Optional metadata to attach to chunks
+
+        Returns:
+            List of Document objects with chunks
+        """
+        documents = []
+        for page_number, text in pages:
+            occurrences: Dict[str, int] = {}
+            for chunk in self.text_splitter.split_text(text):
+                occurrence = occurrences.get(chunk, 0)
+                occurrences[chunk] = occurrence + 1
+                documents.append(
+                    Document(
+                        id=make_chunk_id(page_number, chunk, occurrence),
+                        page_content=chunk,
+                        metadata={**(metadata or {}), "page": page_number}
+                    )
+                )
+        return documents
+
+    def build(self, store_id: str, pages: List[Tuple[int, str]], metadata: Dict = None) -> Dict[str, Any]:
+        """
+        Chunk pages and bring the store on disk in line with the chunks
+
+        If a store built with the same embedding model exists, only the chunks
+        whose IDs changed are removed or embedded; otherwise the store is
+        rebuilt from scratch.
+
+        Returns:
+            Build statistics (num_chunks, incremental, chunks_added, ...)
+        """
+        documents = self.chunk_pages(pages, metadata)
+        store_path = self.vector_store_path / f"{store_id}.faiss"
+        manifest = read_manifest(store_path)
+
+        # Compressed vectors can't be decoded exactly, so those stores are
+        # re-embedded instead (mostly embedding cache hits) to avoid
+        # compounding quantization error on every update
+        if (
+            manifest
+            and manifest.get("embedding_model") == self.embedding_id
+            and manifest.get("index", {}).get("exact_vectors", True)
+        ):
+            # Private heap copy: this one gets modified (exact index while editing)
+            vector_store = load_vector_store(store_path, self.embeddings)
+            to_flat_index(vector_store)
+            new_documents = {doc.id: doc for doc in documents}
+            existing_ids = set(vector_store.index_to_docstore_id.values())
+
+            removed_ids = [chunk_id for chunk_id in existing_ids if chunk_id not in new_documents]
+            added = [doc for doc in documents if doc.id not in existing_ids]
+
+            if removed_ids:
+                vector_store.delete(ids=removed_ids)
+
+            # Kept chunks may still need fresh metadata (title, file path)
+            for chunk_id in existing_ids.difference(removed_ids):
+                vector_store.docstore.search(chunk_id).metadata = new_documents[chunk_id].metadata
+
+            if added:
+                vector_store.add_documents(added, ids=[doc.id for doc in added])
+
+            update_stats = {
+                "incremental": True,
+                "chunks_added": len(added),
+                "chunks_removed": len(removed_ids)
+            }
+        else:
+            vector_store = FAISS.from_documents(
+                documents,
+                self.embeddings,
+                ids=[doc.id for doc in documents]
+            )
+            update_stats = {
+                "incremental": False,
+                "chunks_added": len(documents),
+                "chunks_removed": 0
+            }
+
+        # Flat for typical PDFs; HNSW/IVF tuned to ANN_TARGET_RECALL for large stores
+        index_report = optimize_vector_store(
+            vector_store,
+            settings.ANN_TARGET_RECALL,
+            encoding=settings.VECTOR_STORE_ENCODING,
+            rerank=settings.VECTOR_STORE_RERANK
+        )
+        update_stats["index_type"] = index_report["type"]
+        update_stats["index_encoding"] = index_report["encoding"]
+
+        # BM25 postings for exact terms (course codes, acronyms), saved with the store
+        vector_store.lexical_index = LexicalIndex.from_store(vector_store)
+        update_stats["lexical_terms"] = len(vector_store.lexical_index.term_ids)
+        print(
+            f"📊 Index for {store_id}: {index_report['type']}/{index_report['encoding']} "
+            f"over {index_report['num_vectors']} vectors ({index_report['bytes_per_vector']} B each), "
+            f"recall@10 {index_report.get('recall_at_10', 1.0)}, "
+            f"{index_report.get('latency_ms', 0):.3f} ms/query "
+            f"(exact {index_report.get('flat_latency_ms', 0):.3f} ms)"
+        )
+
+        save_vector_store(vector_store, store_path)
+        write_manifest(store_path, {
+            "embedding_model": self.embedding_id,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "num_chunks": len(documents),
+            "index": index_report,
+            "updated_at": datetime.utcnow().isoformat()
+        })
+        return {"num_chunks": len(documents), **update_stats}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "embedding_batcher": self.embedding_batcher.stats(),
+            "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else None
+        }
+
+
+class _BuilderManager(BaseManager):
+    """
+    Serves one StoreBuilder from its own process
+
+    Every calling thread gets its own connection and server thread, so
+    concurrent jobs build concurrently (and share embedding batches).
+    """
+
+
+_BuilderManager.register("StoreBuilder", StoreBuilder)
+
+
+class IngestionProcess:
+    """Starts the ingestion process on first use and forwards builds to it"""
+
+    def __init__(self):
+        self._manager: Optional[_BuilderManager] = None
+        self._builder = None
+        self._lock = threading.Lock()
+
+    def _get_builder(self):
+        with self._lock:
+            if self._builder is None:
+                # Spawn (not fork) so the process doesn't inherit the event loop or model threads
+                manager = _BuilderManager(ctx=multiprocessing.get_context("spawn"))
+                manager.start()
+                self._manager = manager
+                self._builder = manager.StoreBuilder()
+            return self._builder
+
+    def build(self, store_id: str, pages: List[Tuple[int, str]], metadata: Dict = None) -> Dict[str, Any]:
+        """Build a store in the ingestion process (blocking; see StoreBuilder.build)"""
+        builder = self._get_builder()
+        try:
+            return builder.build(store_id, pages, metadata)
+        except (EOFError, ConnectionError) as e:
+            # The process died (e.g. OOM-killed); the next build starts a new one
+            self.shutdown()
+            raise Exception(f"Ingestion process exited: {str(e)}")
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        """Embedding throughput of the ingestion process, or None if it isn't running"""
+        with self._lock:
+            builder = self._builder
+        if builder is None:
+            return None
+        try:
+            return builder.stats()
+        except (EOFError, ConnectionError):
+            return None
+
+    def shutdown(self):
+        """Stop the ingestion process"""
+        with self._lock:
+            manager, self._manager, self._builder = self._manager, None, None
+        if manager is not None:
+            try:
+                manager.shutdown()
+            except Exception:
+                pass
+
+
+# Singleton instance
+_ingestion_process = None
+
+def get_ingestion_process() -> IngestionProcess:
+    """Get or create ingestion process singleton"""
+    global _ingestion_process
+    if _ingestion_process is None:
+        _ingestion_process = IngestionProcess()
+    return _ingestion_process
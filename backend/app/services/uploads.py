@@ -0,0 +1,99 @@
+"""
+Upload Streaming
+Non-blocking upload writer that validates, hashes and sizes files while copying
+"""
+
+import hashlib
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+
+from app.core.config import settings
+
+
+PDF_MAGIC = b"%PDF-"
+
+
+class UploadError(Exception):
+    """Upload rejected before it was stored"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+@dataclass
+class StreamedUpload:
+    path: Path  # Temporary file; move it with finalize() or discard() it
+    sha256: str
+    size: int
+
+    async def finalize(self, destination: Path) -> Path:
+        """Atomically move the upload to its final location"""
+        await aiofiles.os.replace(self.path, destination)
+        self.path = destination
+        return destination
+
+    async def discard(self):
+        """Delete the temporary file if it is still there"""
+        if await aiofiles.os.path.exists(self.path):
+            await aiofiles.os.remove(self.path)
+
+
+async def stream_pdf_upload(upload: UploadFile, directory: Path) -> StreamedUpload:
+    """
+    Copy an uploaded PDF to a temporary file in fixed-size chunks
+
+    The SHA-256 and byte count are computed during the copy, the PDF magic
+    bytes are checked on the first chunk, and the copy stops as soon as
+    MAX_UPLOAD_SIZE_MB is exceeded.
+
+    Args:
+        upload: The uploaded file
+        directory: Directory for the temporary file (same filesystem as the destination)
+
+    Returns:
+        The written upload, not yet moved into place
+
+    Raises:
+        UploadError: The file is not a PDF or is too large
+    """
+    max_bytes = settings.MAX_UPLOAD_SIZE_MB * 1024 * 1024
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadError(413, f"File exceeds the {settings.MAX_UPLOAD_SIZE_MB} MB upload limit")
+
+    directory.mkdir(parents=True, exist_ok=True)
+    temp_path = directory / f".upload-{uuid.uuid4().hex}.tmp"
+    hasher = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            while True:
+                chunk = await upload.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                if size == 0 and not chunk.startswith(PDF_MAGIC):
+                    raise UploadError(400, "File is not a valid PDF")
+
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(413, f"File exceeds the {settings.MAX_UPLOAD_SIZE_MB} MB upload limit")
+
+                hasher.update(chunk)
+                await buffer.write(chunk)
+
+        if size == 0:
+            raise UploadError(400, "File is empty")
+    except BaseException:
+        if await aiofiles.os.path.exists(temp_path):
+            await aiofiles.os.remove(temp_path)
+        raise
+
+    return StreamedUpload(path=temp_path, sha256=hasher.hexdigest(), size=size)
@@ -0,0 +1,152 @@
+"""
+Vector Store Cache
+LRU cache of loaded FAISS stores bounded by their estimated memory use
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from langchain_community.vectorstores import FAISS
+
+from app.services.ann_index import code_bytes_per_vector
+
+
+def estimate_store_bytes(vector_store: FAISS) -> int:
+    """
+    Approximate resident size of a loaded store: index codes, chunk text
+    and metadata held by the docstore, and the lexical index
+    """
+    size = 0
+    index = vector_store.index
+    if not getattr(vector_store, "memory_mapped", False):
+        # Mapped index codes are in the shared page cache, not this process's heap
+        size += index.ntotal * code_bytes_per_vector(index)
+
+    docstore = getattr(vector_store.docstore, "_dict", None)
+    if hasattr(vector_store.docstore, "resident_bytes"):
+        # Lazy docstore: chunk text stays on disk
+        size += vector_store.docstore.resident_bytes()
+    elif docstore is not None:
+        for doc in docstore.values():
+            size += len(doc.page_content.encode("utf-8"))
+            size += sum(len(str(key)) + len(str(value)) for key, value in doc.metadata.items())
+    lexical = getattr(vector_store, "lexical_index", None)
+    if lexical is not None:
+        size += lexical.nbytes
+    # index_to_docstore_id: one ID string per vector
+    size += sum(len(doc_id) for doc_id in vector_store.index_to_docstore_id.values())
+    return size
+
+
+class VectorStoreCache:
+    """
+    Thread-safe, dict-like LRU of vector stores with a byte budget
+
+    Least recently used stores are dropped once the estimated total exceeds
+    the budget; they are reloaded from disk on their next use.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._stores: "OrderedDict[str, Tuple[FAISS, int]]" = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def get(self, store_id: str) -> Optional[FAISS]:
+        with self._lock:
+            entry = self._stores.get(store_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._stores.move_to_end(store_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, store_id: str, vector_store: FAISS, size: Optional[int] = None):
+        """
+        Add or re-add a store (re-adding updates its charged size)
+
+        Args:
+            size: Bytes to charge (default: estimate_store_bytes), for
+                entries that wrap a store, such as course indexes
+        """
+        if size is None:
+            size = estimate_store_bytes(vector_store)
+        with self._lock:
+            self._remove(store_id)
+            if size > self.max_bytes:
+                # Larger than the whole budget: serve it, but don't keep it
+                print(f"⚠️  Vector store {store_id} ({size / 1024 / 1024:.1f} MB) exceeds the cache budget")
+                return
+
+            self._stores[store_id] = (vector_store, size)
+            self._size_bytes += size
+
+            while self._size_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._stores.popitem(last=False)
+                self._size_bytes -= evicted_size
+                self.evictions += 1
+                self.evicted_bytes += evicted_size
+
+    def pop(self, store_id: str, default=None) -> Optional[FAISS]:
+        with self._lock:
+            entry = self._remove(store_id)
+        return entry[0] if entry is not None else default
+
+    def _remove(self, store_id: str) -> Optional[Tuple[FAISS, int]]:
+        entry = self._stores.pop(store_id, None)
+        if entry is not None:
+            self._size_bytes -= entry[1]
+        return entry
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """Snapshot of the loaded (store ID, store) pairs, least recently used first"""
+        with self._lock:
+            return [(store_id, vector_store) for store_id, (vector_store, _) in self._stores.items()]
+
+    def __contains__(self, store_id: str) -> bool:
+        with self._lock:
+            return store_id in self._stores
+
+    def __getitem__(self, store_id: str) -> FAISS:
+        vector_store = self.get(store_id)
+        if vector_store is None:
+            raise KeyError(store_id)
+        return vector_store
+
+    def __setitem__(self, store_id: str, vector_store: FAISS):
+        self.put(store_id, vector_store)
+
+    def __delitem__(self, store_id: str):
+        if self.pop(store_id) is None:
+            raise KeyError(store_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._stores)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "loaded_stores": len(self._stores),
+                "size_bytes": self._size_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+                "largest_stores": [
+                    {"store_id": store_id, "size_bytes": size}
+                    for store_id, (_, size) in sorted(
+                        self._stores.items(), key=lambda item: item[1][1], reverse=True
+                    )[:10]
+                ]
+            }
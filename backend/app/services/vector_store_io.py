@@ -0,0 +1,137 @@
+"""
+Vector Store I/O
+Loading and saving FAISS stores, with memory-mapped, zero-copy index loading for queries
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+from pathlib import Path
+
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+from app.services.docstore import (
+    DOCSTORE_INDEX_FILE,
+    DOCSTORE_DATA_PATTERN,
+    LazyDocstore,
+    write_docstore
+)
+from app.services.lexical_index import LEXICAL_INDEX_FILE, LexicalIndex, ids_fingerprint
+
+
+INDEX_FILE = "index.faiss"
+# Pickled (docstore, index_to_docstore_id) written by FAISS.save_local before
+# the compact docstore; still read, replaced on the next save
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+# faiss >= 1.11 can map flat index codes straight from the file (IO_FLAG_MMAP_IFC);
+# older versions only map IVF lists, so fall back to IO_FLAG_MMAP there
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def load_vector_store(
+    store_path: Path,
+    embeddings: Embeddings,
+    mmap: bool = False,
+    lazy_docstore: bool = False
+) -> FAISS:
+    """
+    Load a store written by save_vector_store (or FAISS.save_local)
+
+    Args:
+        store_path: Store directory
+        embeddings: Embedding function for queries
+        mmap: Map the index file instead of reading it into the heap. The OS
+            page cache then holds the vectors once for every worker process
+            and loading is near-instant. A mapped index is read-only: never
+            add to or delete from it.
+        lazy_docstore: Read chunk text from disk only for search results
+            instead of loading every chunk. Also read-only.
+
+    The store's lexical index, if it has one for exactly these chunks, is
+    attached as vector_store.lexical_index.
+
+    Returns:
+        The vector store
+    """
+    for attempt in range(2):
+        try:
+            index = faiss.read_index(str(store_path / INDEX_FILE), MMAP_FLAGS if mmap else 0)
+            if (store_path / DOCSTORE_INDEX_FILE).exists():
+                lazy = LazyDocstore(store_path)
+                index_to_docstore_id = dict(enumerate(lazy.ids))
+                docstore = lazy if lazy_docstore else lazy.to_memory()
+            else:
+                with (store_path / LEGACY_DOCSTORE_FILE).open("rb") as f:
+                    docstore, index_to_docstore_id = pickle.load(f)
+        except FileNotFoundError:
+            # A save replaced the docstore between reading its index and data files
+            if attempt:
+                raise
+            continue
+
+        # The files are swapped one after the other; retry if a save slipped in between
+        if index.ntotal == len(index_to_docstore_id):
+            break
+
+    vector_store = FAISS(embeddings, index, docstore, index_to_docstore_id)
+    # Mapped pages live in the shared page cache, not this process's heap
+    vector_store.memory_mapped = mmap
+
+    lexical = LexicalIndex.load(store_path / LEXICAL_INDEX_FILE)
+    if lexical is not None and lexical.fingerprint != ids_fingerprint(
+        doc_id for _, doc_id in sorted(index_to_docstore_id.items())
+    ):
+        # Written for another version of the chunks
+        lexical = None
+    vector_store.lexical_index = lexical
+    return vector_store
+
+
+def save_vector_store(vector_store: FAISS, store_path: Path):
+    """
+    Write a store so that processes with the old files mapped keep working
+
+    Files are written to a temporary directory and swapped in with
+    os.replace: readers keep the old inode until they reload, instead of
+    seeing a file truncated under their mapping. The lexical index
+    (vector_store.lexical_index) is saved too if it matches the chunks.
+    """
+    store_path.mkdir(parents=True, exist_ok=True)
+    temp_dir = Path(tempfile.mkdtemp(prefix=".saving-", dir=store_path))
+    try:
+        faiss.write_index(vector_store.index, str(temp_dir / INDEX_FILE))
+        documents = [
+            (doc_id, vector_store.docstore.search(doc_id))
+            for _, doc_id in sorted(vector_store.index_to_docstore_id.items())
+        ]
+        data_file, docstore_index_file = write_docstore(
+            temp_dir,
+            documents,
+            compression=settings.DOCSTORE_COMPRESSION
+        )
+
+        files = [data_file, temp_dir / INDEX_FILE]
+        lexical = getattr(vector_store, "lexical_index", None)
+        if lexical is not None and lexical.fingerprint == ids_fingerprint(doc_id for doc_id, _ in documents):
+            lexical.save(temp_dir / LEXICAL_INDEX_FILE)
+            files.append(temp_dir / LEXICAL_INDEX_FILE)
+        else:
+            # Stale for the new chunks; loaders would ignore it anyway
+            (store_path / LEXICAL_INDEX_FILE).unlink(missing_ok=True)
+
+        # The docstore index names its own data file, so it goes last
+        for file in files + [docstore_index_file]:
+            os.replace(file, store_path / file.name)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    # Data files of earlier saves (readers that opened them keep their mapping)
+    for old_file in store_path.glob(DOCSTORE_DATA_PATTERN):
+        if old_file.name != data_file.name:
+            old_file.unlink(missing_ok=True)
+    (store_path / LEGACY_DOCSTORE_FILE).unlink(missing_ok=True)
@@ -0,0 +1,130 @@
+"""
+Embedding Backend Benchmark
+Compares throughput and agreement of the embedding backends on the uploaded PDFs.
+
+Usage:
+    python benchmark_embeddings.py
+    python benchmark_embeddings.py --backends sentence-transformers onnx-int8 --limit 2000
+
+Pick the winner with EMBEDDING_BACKEND in .env.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.core.config import settings
+from app.services.embedding_backends import create_embedding_backend, EMBEDDING_BACKENDS
+from app.services.pdf_extractor import count_pages, extract_page_range
+
+
+def load_corpus(uploads_dir: Path, limit: int) -> list:
+    """Extract and chunk every PDF in uploads_dir the same way vectorization does"""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=settings.CHUNK_SIZE,
+        chunk_overlap=settings.CHUNK_OVERLAP,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""]
+    )
+
+    chunks = []
+    pdf_files = sorted(uploads_dir.glob("*.pdf"))
+    for pdf_file in pdf_files:
+        try:
+            pages = extract_page_range(str(pdf_file), 0, count_pages(str(pdf_file)))
+        except Exception as e:
+            print(f"⚠️  Skipping {pdf_file.name}: {str(e)}")
+            continue
+        for _, text in pages:
+            chunks.extend(splitter.split_text(text))
+
+    print(f"📚 {len(chunks)} chunks from {len(pdf_files)} PDFs in {uploads_dir}")
+    return chunks[:limit] if limit else chunks
+
+
+def benchmark_backend(backend_name: str, chunks: list, batch_size: int, repeats: int) -> np.ndarray:
+    """Embed the corpus with one backend and print its throughput"""
+    print(f"\n⏳ {backend_name}")
+    started = time.perf_counter()
+    backend = create_embedding_backend(backend_name, settings.EMBEDDING_MODEL, batch_size)
+    print(f"   Load time: {time.perf_counter() - started:.2f}s")
+
+    # Warm-up (thread pools, lazy graph optimization)
+    backend.embed_documents(chunks[:batch_size])
+
+    timings = []
+    vectors = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        vectors = np.asarray(backend.embed_documents(chunks), dtype=np.float32)
+        timings.append(time.perf_counter() - started)
+
+    best = min(timings)
+    print(f"   Best of {repeats}: {best:.2f}s  ({len(chunks) / best:.1f} chunks/sec)")
+
+    started = time.perf_counter()
+    for chunk in chunks[:100]:
+        backend.embed_query(chunk[:200])
+    print(f"   Query latency: {(time.perf_counter() - started) / min(len(chunks), 100) * 1000:.1f} ms")
+    return vectors
+
+
+def compare(reference_name: str, reference: np.ndarray, name: str, vectors: np.ndarray, k: int):
+    """Print cosine agreement and nearest-neighbour overlap against the reference backend"""
+    cosine = np.sum(reference * vectors, axis=1)
+    print(f"\n📐 {name} vs {reference_name}")
+    print(f"   Cosine agreement: mean {cosine.mean():.4f}, p5 {np.percentile(cosine, 5):.4f}, min {cosine.min():.4f}")
+
+    # Do both backends retrieve the same neighbours for the same chunk?
+    sample = reference[: min(len(reference), 500)]
+    sample_other = vectors[: len(sample)]
+    reference_top = np.argsort(-(sample @ reference.T), axis=1)[:, 1:k + 1]
+    other_top = np.argsort(-(sample_other @ vectors.T), axis=1)[:, 1:k + 1]
+    overlap = np.mean([
+        len(set(a).intersection(b)) / k
+        for a, b in zip(reference_top, other_top)
+    ])
+    print(f"   Top-{k} neighbour overlap: {overlap:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--uploads", default=settings.UPLOAD_DIR, help="Directory of PDFs")
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--limit", type=int, default=0, help="Max chunks (0 = all)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("EMBEDDING BACKEND BENCHMARK")
+    print("=" * 60)
+    print(f"Model: {settings.EMBEDDING_MODEL}")
+
+    chunks = load_corpus(Path(args.uploads), args.limit)
+    if not chunks:
+        print("❌ No chunks found; upload some PDFs first")
+        return 1
+
+    results = {}
+    for backend_name in args.backends:
+        try:
+            results[backend_name] = benchmark_backend(backend_name, chunks, args.batch_size, args.repeats)
+        except Exception as e:
+            print(f"❌ {backend_name}: {str(e)}")
+
+    names = list(results)
+    for name in names[1:]:
+        compare(names[0], results[names[0]], name, results[name], args.k)
+
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
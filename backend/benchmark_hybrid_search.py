@@ -0,0 +1,133 @@
+"""
+Hybrid Search Benchmark
+Compares vector-only and hybrid (BM25 + vector) retrieval on exact-term
+questions about the materials already stored in VECTOR_STORE_PATH.
+
+Usage:
+    python benchmark_hybrid_search.py
+    python benchmark_hybrid_search.py --queries 300 --lexical-weight 0.5
+
+Questions are built from rare exact terms found in the chunks (course codes,
+acronyms, identifiers with digits); a question counts as answered at k if a
+chunk containing its term is among the top k. Tune HYBRID_LEXICAL_WEIGHT and
+HYBRID_CANDIDATES in .env.
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.embedding_backends import create_embedding_backend
+from app.services.lexical_index import LexicalIndex, hybrid_rank, store_lexical_index
+from app.services.vector_store_io import INDEX_FILE, load_vector_store
+
+
+# Codes and acronyms as written in the text: "22ADC09", "TCP/IP", "X.509", "DBMS"
+EXACT_TERM_PATTERN = re.compile(r"\b(?=[A-Za-z0-9./+-]*[0-9A-Z]{2})[A-Z0-9][A-Za-z0-9]*(?:[./+-][A-Za-z0-9]+)*\b")
+KS = [1, 3, 5, 10]
+
+
+def make_questions(vector_store, count: int, max_doc_freq: int, rng) -> list:
+    """(question, positions of chunks containing its term) for rare exact terms"""
+    lexical = store_lexical_index(vector_store)
+    terms = {}
+    for position, doc_id in sorted(vector_store.index_to_docstore_id.items()):
+        text = vector_store.docstore.search(doc_id).page_content
+        for match in EXACT_TERM_PATTERN.findall(text):
+            term = match.lower()
+            term_id = lexical.term_ids.get(term)
+            if term_id is None or term in terms:
+                continue
+            start, end = lexical.offsets[term_id], lexical.offsets[term_id + 1]
+            if end - start <= max_doc_freq:
+                terms[term] = (match, set(lexical.positions[start:end].tolist()))
+
+    chosen = list(terms.values())
+    rng.shuffle(chosen)
+    return [(f"What does the material say about {match}?", relevant) for match, relevant in chosen[:count]]
+
+
+def answered_at(found: list, relevant: set) -> list:
+    """For each k, whether a relevant position is in the top k"""
+    return [bool(relevant.intersection(found[:k])) for k in KS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hybrid retrieval on exact-term questions")
+    parser.add_argument("--vector-store", default=settings.VECTOR_STORE_PATH, help="Directory of stores")
+    parser.add_argument("--queries", type=int, default=200, help="Questions per store (at most)")
+    parser.add_argument("--max-doc-freq", type=int, default=3, help="Only terms in at most this many chunks")
+    parser.add_argument("--lexical-weight", type=float, default=settings.HYBRID_LEXICAL_WEIGHT)
+    parser.add_argument("--candidates", type=int, default=settings.HYBRID_CANDIDATES)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("HYBRID SEARCH BENCHMARK")
+    print("=" * 60)
+
+    embeddings = create_embedding_backend(
+        settings.EMBEDDING_BACKEND,
+        settings.EMBEDDING_MODEL,
+        batch_size=settings.EMBEDDING_BATCH_SIZE
+    )
+    rng = np.random.default_rng(1)
+
+    vector_hits, hybrid_hits = [], []
+    vector_seconds = hybrid_seconds = 0.0
+    store_dirs = sorted(path.parent for path in Path(args.vector_store).glob(f"*.faiss/{INDEX_FILE}"))
+    for store_dir in store_dirs:
+        vector_store = load_vector_store(store_dir, embeddings, mmap=True, lazy_docstore=True)
+        if store_lexical_index(vector_store) is None:
+            # Vectorized before lexical indexes existed
+            vector_store.lexical_index = LexicalIndex.from_store(vector_store)
+
+        questions = make_questions(vector_store, args.queries, args.max_doc_freq, rng)
+        if not questions:
+            continue
+        query_vectors = embeddings.embed_documents([question for question, _ in questions])
+        k = max(KS)
+        for (question, relevant), query_vector in zip(questions, query_vectors):
+            started = time.perf_counter()
+            _, positions = vector_store.index.search(np.asarray([query_vector], dtype=np.float32), k)
+            vector_seconds += time.perf_counter() - started
+            vector_hits.append(answered_at([int(position) for position in positions[0]], relevant))
+
+            started = time.perf_counter()
+            ranked = hybrid_rank(
+                vector_store, question, query_vector, k, args.lexical_weight, args.candidates
+            )
+            hybrid_seconds += time.perf_counter() - started
+            hybrid_hits.append(answered_at([position for position, _ in ranked], relevant))
+
+    if not vector_hits:
+        print("❌ No exact-term questions found; vectorize some materials first")
+        return 1
+
+    vector_recall = np.mean(vector_hits, axis=0)
+    hybrid_recall = np.mean(hybrid_hits, axis=0)
+    print(f"📚 {len(vector_hits)} questions from {len(store_dirs)} stores\n")
+    print(f"{'k':>4}{'vector':>10}{'hybrid':>10}")
+    for k, vector_value, hybrid_value in zip(KS, vector_recall, hybrid_recall):
+        print(f"{k:>4}{vector_value:>10.3f}{hybrid_value:>10.3f}")
+
+    best_vector = vector_recall[-1]
+    smallest_k = next((k for k, value in zip(KS, hybrid_recall) if value >= best_vector), None)
+    print(
+        f"\nLatency: vector {vector_seconds / len(vector_hits) * 1000:.3f} ms/query, "
+        f"hybrid {hybrid_seconds / len(hybrid_hits) * 1000:.3f} ms/query"
+    )
+    if smallest_k is not None:
+        print(f"✅ Hybrid matches vector-only recall@{max(KS)} ({best_vector:.3f}) at k={smallest_k}")
+    else:
+        print(f"ℹ️  Hybrid stays below vector-only recall@{max(KS)}; try a higher --lexical-weight")
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
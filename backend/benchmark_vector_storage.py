@@ -0,0 +1,155 @@
+"""
+Vector Storage Benchmark
+Compares the memory footprint and recall of the vector encodings on the
+vectors already stored in VECTOR_STORE_PATH (every vectorized material).
+
+Usage:
+    python benchmark_vector_storage.py
+    python benchmark_vector_storage.py --encodings float32 int8 pq --queries 1000
+
+Pick the encoding with VECTOR_STORE_ENCODING / VECTOR_STORE_RERANK in .env.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.services.ann_index import (
+    ENCODINGS,
+    PQ_MIN_VECTORS,
+    build_index,
+    has_exact_vectors,
+    reconstruct_vectors
+)
+from app.services.vector_store_io import INDEX_FILE
+
+
+def load_vectors(vector_store_dir: Path) -> np.ndarray:
+    """Read back the vectors of every material store (course indexes are copies, skipped)"""
+    parts = []
+    index_files = sorted(vector_store_dir.glob(f"*.faiss/{INDEX_FILE}"))
+    for index_file in index_files:
+        index = faiss.read_index(str(index_file))
+        if not has_exact_vectors(index):
+            print(f"⚠️  Skipping {index_file.parent.name}: stored compressed, vectors are approximate")
+            continue
+        parts.append(reconstruct_vectors(index))
+
+    total = sum(len(part) for part in parts)
+    print(f"📚 {total} vectors from {len(parts)} stores in {vector_store_dir}")
+    if not parts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.concatenate(parts)
+
+
+def make_queries(vectors: np.ndarray, count: int) -> np.ndarray:
+    """Held-out queries near the data (not the ones the index was tuned on)"""
+    rng = np.random.default_rng(1)
+    sample = vectors[rng.choice(len(vectors), size=min(count, len(vectors)), replace=False)]
+    queries = sample + rng.normal(scale=0.05, size=sample.shape).astype(np.float32)
+    queries /= np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+    return queries.astype(np.float32)
+
+
+def index_file_bytes(index: faiss.Index) -> int:
+    """Size of the index as written to disk (what gets mapped into memory)"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = Path(temp_dir) / INDEX_FILE
+        faiss.write_index(index, str(path))
+        return path.stat().st_size
+
+
+def benchmark_encoding(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    truth: np.ndarray,
+    encoding: str,
+    rerank: bool,
+    target_recall: float
+) -> dict:
+    """Build one encoding the way vectorization does and measure it on the held-out queries"""
+    index, report = build_index(vectors, target_recall, encoding, rerank)
+
+    k = truth.shape[1]
+    started = time.perf_counter()
+    _, found = index.search(queries, k)
+    latency_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    recall = np.mean([
+        len(set(found_row).intersection(truth_row)) / k
+        for found_row, truth_row in zip(found, truth)
+    ])
+
+    return {
+        "name": f"{encoding}{' + rerank' if rerank else ''}",
+        "report": report,
+        "file_bytes": index_file_bytes(index),
+        "recall": float(recall),
+        "latency_ms": latency_ms
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector storage encodings")
+    parser.add_argument("--vector-store", default=settings.VECTOR_STORE_PATH, help="Directory of stores")
+    parser.add_argument("--encodings", nargs="+", default=list(ENCODINGS))
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--target-recall", type=float, default=settings.ANN_TARGET_RECALL)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("VECTOR STORAGE BENCHMARK")
+    print("=" * 60)
+
+    vectors = load_vectors(Path(args.vector_store))
+    if len(vectors) == 0:
+        print("❌ No vectors found; vectorize some materials first")
+        return 1
+    if "pq" in args.encodings and len(vectors) < PQ_MIN_VECTORS:
+        print(f"ℹ️  Fewer than {PQ_MIN_VECTORS} vectors: pq falls back to int8, as it does for small stores")
+
+    k = min(args.k, len(vectors))
+    queries = make_queries(vectors, args.queries)
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    results = []
+    for encoding in args.encodings:
+        for rerank in ([False] if encoding == "float32" else [False, True]):
+            try:
+                results.append(
+                    benchmark_encoding(vectors, queries, truth, encoding, rerank, args.target_recall)
+                )
+            except Exception as e:
+                print(f"❌ {encoding}: {str(e)}")
+
+    if not results:
+        return 1
+    baseline = next((result for result in results if result["name"] == "float32"), results[0])
+
+    print(f"\n{'encoding':<16}{'type':<8}{'B/vector':>10}{'file MB':>10}{'saved':>8}"
+          f"{'recall@' + str(k):>11}{'ms/query':>10}{'k_factor':>10}")
+    for result in results:
+        report = result["report"]
+        saved = 1 - result["file_bytes"] / baseline["file_bytes"]
+        print(
+            f"{result['name']:<16}{report['type']:<8}{report['bytes_per_vector']:>10}"
+            f"{result['file_bytes'] / 1024 / 1024:>10.2f}{saved:>8.0%}"
+            f"{result['recall']:>11.4f}{result['latency_ms']:>10.3f}{str(report.get('k_factor', '-')):>10}"
+        )
+
+    print("\nWith VECTOR_STORE_MMAP the index file is what a worker keeps resident per store.")
+    print("Re-ranking keeps float32 copies on disk too, but only candidates' pages are read.")
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
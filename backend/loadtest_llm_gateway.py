@@ -0,0 +1,169 @@
+"""
+LLM Gateway Load Test
+Runs the admission-control gateway against a local fake LLM server (no
+Gemini quota used) and checks the concurrency cap, per-user fairness and
+load shedding.
+
+Usage:
+    python loadtest_llm_gateway.py
+    python loadtest_llm_gateway.py --concurrency 4 --max-queue-per-user 10 --latency 0.2
+
+A heavy user fires many requests at once alongside several light users.
+Light users should not wait behind the heavy user's whole backlog.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import numpy as np
+
+from app.services.llm_gateway import LLMGateway, GatewayOverloaded
+
+
+class FakeLLMServer:
+    """Minimal HTTP server that answers every request after a fixed latency"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.server = None
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        headers = await reader.readuntil(b"\r\n\r\n")
+        length = 0
+        for line in headers.decode().split("\r\n"):
+            if line.lower().startswith("content-length:"):
+                length = int(line.split(":", 1)[1])
+        await reader.readexactly(length)
+
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)  # "Generation"
+        finally:
+            self.in_flight -= 1
+
+        body = json.dumps({"text": "fake answer"}).encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+            + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+        writer.close()
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def call_fake_llm(port: int, prompt: str) -> dict:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps({"prompt": prompt}).encode()
+    writer.write(
+        b"POST /generate HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        + f"Content-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return json.loads(response.split(b"\r\n\r\n", 1)[1])
+
+
+async def user_request(gateway: LLMGateway, port: int, user: str, results: list):
+    started = time.perf_counter()
+    try:
+        async with gateway.slot(user, "loadtest"):
+            waited = time.perf_counter() - started
+            await call_fake_llm(port, f"question from {user}")
+        results.append((user, "ok", waited))
+    except GatewayOverloaded as e:
+        results.append((user, f"429 (Retry-After {e.retry_after}s)", time.perf_counter() - started))
+
+
+async def run(args) -> int:
+    server = FakeLLMServer(args.latency)
+    port = await server.start()
+    gateway = LLMGateway(
+        max_concurrency=args.concurrency,
+        max_queue=args.max_queue,
+        max_queue_per_user=args.max_queue_per_user,
+        queue_timeout=args.queue_timeout
+    )
+
+    results = []
+    tasks = [
+        asyncio.create_task(user_request(gateway, port, "heavy", results))
+        for _ in range(args.heavy_requests)
+    ]
+    # Light users arrive just after the heavy user's burst
+    await asyncio.sleep(0.01)
+    for i in range(args.light_users):
+        tasks.append(asyncio.create_task(user_request(gateway, port, f"light-{i}", results)))
+    await asyncio.gather(*tasks)
+    await server.stop()
+
+    def waits(prefix):
+        return [wait for user, status, wait in results if user.startswith(prefix) and status == "ok"]
+
+    heavy, light = waits("heavy"), waits("light")
+    rejected = [result for result in results if result[1] != "ok"]
+
+    print("=" * 60)
+    print("LLM GATEWAY LOAD TEST")
+    print("=" * 60)
+    print(f"Cap {args.concurrency}, queue {args.max_queue} ({args.max_queue_per_user} per user), fake latency {args.latency * 1000:.0f} ms")
+    print(f"Upstream calls: {server.requests}, peak upstream concurrency: {server.peak_in_flight}")
+    print(f"Rejected with 429: {len(rejected)}" + (f" (e.g. {rejected[0][1]})" if rejected else ""))
+    for name, values in (("heavy", heavy), ("light", light)):
+        if values:
+            print(
+                f"{name:>6} wait: p50 {np.percentile(values, 50) * 1000:.0f} ms, "
+                f"p95 {np.percentile(values, 95) * 1000:.0f} ms ({len(values)} served)"
+            )
+    print("\nWait time histogram:")
+    for bucket in gateway.stats()["wait_seconds"]["loadtest"]["buckets"]:
+        print(f"   le {bucket['le']:>6}: {bucket['count']}")
+
+    failures = []
+    if server.peak_in_flight > args.concurrency:
+        failures.append("upstream concurrency exceeded the cap")
+    if args.heavy_requests > args.concurrency + args.max_queue_per_user and not rejected:
+        failures.append("queue overflow was not rejected")
+    if heavy and light and np.percentile(light, 95) > np.percentile(heavy, 95):
+        failures.append("light users waited longer than the heavy user (unfair queuing)")
+
+    print()
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Cap respected, queue overflow shed with 429, light users served fairly")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the LLM gateway against a fake LLM server")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--max-queue", type=int, default=40)
+    parser.add_argument("--max-queue-per-user", type=int, default=20)
+    parser.add_argument("--queue-timeout", type=float, default=30.0)
+    parser.add_argument("--latency", type=float, default=0.1, help="Fake generation time in seconds")
+    parser.add_argument("--heavy-requests", type=int, default=60)
+    parser.add_argument("--light-users", type=int, default=8)
+    args = parser.parse_args()
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
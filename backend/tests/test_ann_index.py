@@ -0,0 +1,73 @@
+"""
+Filtered search (search_subset) on every index layout build_index produces,
+including compressed indexes wrapped for exact re-ranking
+"""
+
+import faiss
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import ann_index
+from app.services.ann_index import build_index, search_subset
+
+
+DIMENSION = 16
+K = 5
+
+
+@pytest.fixture(scope="module")
+def vectors() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((3000, DIMENSION)).astype(np.float32)
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def assert_subset_search(index: faiss.Index, vectors: np.ndarray):
+    allowed = np.arange(0, len(vectors), 2, dtype=np.int64)
+    query = vectors[1:2] + 0.01  # Nearest overall is position 1, which is filtered out
+
+    distances, positions = search_subset(index, query, K, allowed)
+
+    assert distances.shape == positions.shape == (1, K)
+    assert set(positions[0].tolist()) <= set(allowed.tolist())
+    exact = ((vectors[allowed] - query[0]) ** 2).sum(axis=1)
+    assert positions[0][0] == allowed[np.argmin(exact)]
+
+
+@pytest.mark.parametrize("encoding", ["float32", "fp16", "int8", "pq"])
+@pytest.mark.parametrize("rerank", [False, True])
+def test_flat_sized_store(vectors, monkeypatch, encoding, rerank):
+    # Let PQ train on this small store, with sub-quantizers that divide DIMENSION
+    monkeypatch.setattr(ann_index, "PQ_MIN_VECTORS", 1000)
+    monkeypatch.setattr(settings, "VECTOR_STORE_PQ_M", 4)
+    index, report = build_index(vectors, 0.95, encoding, rerank)
+    assert report["encoding"] == encoding
+    assert report["rerank"] == (rerank and encoding != "float32")
+    assert_subset_search(index, vectors)
+
+
+def hnsw(vectors: np.ndarray) -> faiss.Index:
+    return faiss.IndexHNSWFlat(DIMENSION, 16)
+
+
+def ivf(vectors: np.ndarray) -> faiss.Index:
+    index = faiss.IndexIVFScalarQuantizer(
+        faiss.IndexFlatL2(DIMENSION), DIMENSION, 16, faiss.ScalarQuantizer.QT_8bit
+    )
+    index.train(vectors)
+    index.nprobe = 16
+    return index
+
+
+@pytest.mark.parametrize("make_index", [hnsw, ivf])
+@pytest.mark.parametrize("rerank", [False, True])
+def test_ann_filtered_search(vectors, monkeypatch, make_index, rerank):
+    # Large subsets go through the index's own filtered search
+    monkeypatch.setattr(ann_index, "EXACT_SUBSET_MAX", 100)
+    index = make_index(vectors)
+    if rerank:
+        index = faiss.IndexRefineFlat(index)
+        index.k_factor = 4
+    index.add(vectors)
+    assert_subset_search(index, vectors)
@@ -119,10 +119,13 @@ export function ScoutAssistant() {
 
     try {
       // Call Gemini API through your backend
+      // Signed-in users are queued fairly by account rather than by network address
+      const token = localStorage.getItem('access_token')
       const response = await fetch('http://localhost:8000/api/scout/chat', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          ...(token ? { Authorization: `Bearer ${token}` } : {}),
         },
         body: JSON.stringify({ 
           message: userInput,